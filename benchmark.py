@@ -0,0 +1,343 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from packet import Packet, PacketStore
+from nada import NadaSender, NadaReceiver
+from link_simulator import LinkSimulator
+from link_realization import load_realization
+from capacity_trace import CapacityTrace
+from evaluation_tests import simulate_single_flow, RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS
+from bwe_utils import loss_ratio, global_loss_ratio, receiving_rate_kbps, average_bitrate_kbps, average_delay_ms
+from bwe_utils import SummaryAccumulator
+from history import NoHistory
+from bwe_utils import jain_fairness_index, LossRatioEstimator, ReceivingRateEstimator, MedianFilter, MinFilter
+
+"""
+Benchmark suite for the simulation hot paths, on two levels:
+-- Micro benchmarks: LinkSimulator.send_packet, NadaReceiver.receive_packet and get_feedback,
+   NadaSender.receive_feedback and bwe_utils functions, over realistic packet histories,
+   produced by a jittered link slightly above its capacity.
+-- Macro benchmarks: rmcat_evaluation_1 end to end, at each jitter intensity,
+   and at high bitrates, as packet trains.
+Each benchmark reports packets processed per second, best of a few repeats, and the peak
+memory allocated while running, traced on a separate run since tracing slows allocations down.
+Results can be saved, then used as a baseline: the suite fails if a benchmark gets slower,
+or allocates more, than the threshold.
+e.g. python benchmark.py -o baseline.json, later python benchmark.py -b baseline.json
+"""
+
+WINDOW_MS = 500.0
+SUMMARY_REPEATS = 20  # Whole history metrics are fast, they are repeated for stable timings.
+
+def realistic_packets(num_packets, seed=0):
+    """
+    Received packets of a 1100 kbps flow on a 1000 kbps link with RMCAT jitter.
+    """
+    link_simulator = LinkSimulator(1000.0, 2, seed)
+    packets = []
+    for i in range(1, num_packets + 1):
+        packet = Packet(i, i * 8.0 * NadaSender.PAYLOAD_SIZE_BYTES / 1100.0, NadaSender.PAYLOAD_SIZE_BYTES)
+        link_simulator.send_packet(packet)
+        if packet.arrival_time_ms is not None:
+            packets.append(packet)
+    return packets
+
+def realistic_feedbacks(packets):
+    receiver = NadaReceiver(True)
+    feedbacks = []
+    for packet in packets:
+        receiver.receive_packet(packet)
+        feedback = receiver.get_feedback()
+        if feedback is not None:
+            feedbacks.append(feedback)
+    return feedbacks
+
+# Benchmarks are set up by a function of the number of packets, returning a callable that
+# runs them and returns the number of packets processed. Setting up is neither timed nor traced.
+
+def send_packet(num_packets):
+    packets = [Packet(i, i * 8.0, NadaSender.PAYLOAD_SIZE_BYTES) for i in range(1, num_packets + 1)]
+    link_simulator = LinkSimulator(1000.0, 2, 0)
+    def run():
+        for packet in packets:
+            link_simulator.send_packet(packet)
+        return num_packets
+    return run
+
+# Same packets, on a replayed realization of the link: jitter is read instead of drawn.
+def send_packet_replay(num_packets):
+    packets = [Packet(i, i * 8.0, NadaSender.PAYLOAD_SIZE_BYTES) for i in range(1, num_packets + 1)]
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    link_simulator = LinkSimulator(1000.0, 2, 0)
+    link_simulator.record(path)
+    for packet in packets:
+        link_simulator.send_packet(Packet(packet.id, packet.send_time_ms, packet.payload_size_bytes))
+    link_simulator.stop_recording()
+    realization = load_realization(path)
+    os.remove(path)  # Still mapped until the realization is released.
+    link_simulator = LinkSimulator(None, 0)
+    link_simulator.replay(realization)
+    def run():
+        for packet in packets:
+            link_simulator.send_packet(packet)
+        return num_packets
+    return run
+
+# Same packets, on a link following a trace changing capacity every 0.1 ms.
+def send_packet_capacity_trace(num_packets):
+    packets = [Packet(i, i * 8.0, NadaSender.PAYLOAD_SIZE_BYTES) for i in range(1, num_packets + 1)]
+    times_ms = [0.1 * i for i in range(80 * num_packets)]
+    capacities_kbps = [1000.0 + 200.0 * (i % 3) for i in range(80 * num_packets)]
+    link_simulator = LinkSimulator(None, 2, 0, capacity_trace_=CapacityTrace(times_ms, capacities_kbps))
+    def run():
+        for packet in packets:
+            link_simulator.send_packet(packet)
+        return num_packets
+    return run
+
+def receive_packet(num_packets):
+    packets = realistic_packets(num_packets)
+    receiver = NadaReceiver(True)
+    def run():
+        for packet in packets:
+            receiver.receive_packet(packet)
+        return len(packets)
+    return run
+
+def get_feedback(num_packets):
+    receiver = NadaReceiver(True)
+    for packet in realistic_packets(1000):
+        receiver.receive_packet(packet)
+    def run():
+        for i in range(num_packets):
+            receiver.latest_feedback_ms = -NadaReceiver.FEEDBACK_INTERVAL_MS  # Feedback is due.
+            receiver.get_feedback()
+        return num_packets
+    return run
+
+def receive_feedback(original_mode):
+    def setup(num_packets):
+        feedbacks = realistic_feedbacks(realistic_packets(max(1000, num_packets // 10)))
+        sender = NadaSender(original_mode)
+        def run():
+            for i in range(num_packets):
+                sender.receive_feedback(feedbacks[i % len(feedbacks)])
+            return num_packets
+        return run
+    return setup
+
+# Windowed metrics, computed once per received packet, on the history received so far.
+def windowed_metric(metric):
+    def setup(num_packets):
+        packets = realistic_packets(num_packets)
+        def run():
+            history = []
+            for packet in packets:
+                history.append(packet)
+                metric(history, WINDOW_MS)
+            return len(packets)
+        return run
+    return setup
+
+def estimator(estimator_class, value):
+    def setup(num_packets):
+        packets = realistic_packets(num_packets)
+        def run():
+            windowed_estimator = estimator_class(WINDOW_MS)
+            for packet in packets:
+                windowed_estimator.add_packet(packet)
+                value(windowed_estimator)
+            return len(packets)
+        return run
+    return setup
+
+def delay_filter(filter_class, window_size):
+    def setup(num_packets):
+        delays_ms = [packet.arrival_time_ms - packet.send_time_ms for packet in realistic_packets(num_packets)]
+        def run():
+            filter_ = filter_class(window_size)
+            for delay_ms in delays_ms:
+                filter_.update(delay_ms)
+            return len(delays_ms)
+        return run
+    return setup
+
+# Whole simulation metrics, on the full history.
+def summary_metric(metric, columnar):
+    def setup(num_packets):
+        packets = realistic_packets(num_packets)
+        if columnar:
+            store = PacketStore()
+            for packet in packets:
+                store.append(packet)
+            packets = store
+        def run():
+            for i in range(SUMMARY_REPEATS):
+                metric(packets)
+            return SUMMARY_REPEATS * len(packets)
+        return run
+    return setup
+
+# Same metrics, and delay percentiles, accumulated per packet.
+def summary_accumulator(num_packets):
+    packets = realistic_packets(num_packets)
+    def run():
+        accumulator = SummaryAccumulator()
+        for packet in packets:
+            accumulator.add_packet(packet)
+        accumulator.delay_quantile_ms(0.99)
+        return len(packets)
+    return run
+
+def fairness_index(num_packets):
+    throughputs_kbps = [100.0 + (i % 50) for i in range(num_packets)]
+    def run():
+        for i in range(SUMMARY_REPEATS):
+            jain_fairness_index(throughputs_kbps)
+        return SUMMARY_REPEATS * num_packets
+    return run
+
+def rmcat_evaluation_1(jitter):
+    def setup(num_packets):
+        def run():
+            receiver = NadaReceiver(True)
+            simulate_single_flow(NadaSender(True), receiver, RMCAT_EVALUATION_1_TIMES_MS,
+                                 RMCAT_EVALUATION_1_CAPACITIES_KBPS, jitter, seed=0)
+            return len(receiver.packets)
+        return run
+    return setup
+
+# RMCAT Evaluation test 5.1 at 40 times its capacities, 24 to 100 Mbps, as 33.3 ms packet trains.
+def high_bitrate_trains(num_packets):
+    SCALE = 40.0
+    def run():
+        receiver = NadaReceiver(True, history_=NoHistory(), summary_=SummaryAccumulator())
+        simulate_single_flow(NadaSender(True, SCALE * NadaSender.MAX_BITRATE_KBPS), receiver,
+                             RMCAT_EVALUATION_1_TIMES_MS,
+                             [SCALE * capacity_kbps for capacity_kbps in RMCAT_EVALUATION_1_CAPACITIES_KBPS], 1,
+                             seed=0, train_duration_ms=33.3)
+        return receiver.summary.num_packets
+    return run
+
+MICRO_BENCHMARKS = OrderedDict([
+    ('send_packet', send_packet),
+    ('send_packet_replay', send_packet_replay),
+    ('send_packet_capacity_trace', send_packet_capacity_trace),
+    ('receive_packet', receive_packet),
+    ('get_feedback', get_feedback),
+    ('receive_feedback_original', receive_feedback(True)),
+    ('receive_feedback_modified', receive_feedback(False)),
+    ('loss_ratio', windowed_metric(loss_ratio)),
+    ('receiving_rate_kbps', windowed_metric(receiving_rate_kbps)),
+    ('loss_ratio_estimator', estimator(LossRatioEstimator, LossRatioEstimator.loss_ratio)),
+    ('receiving_rate_estimator', estimator(ReceivingRateEstimator, ReceivingRateEstimator.receiving_rate_kbps)),
+    ('median_filter', delay_filter(MedianFilter, NadaReceiver.K_MEDIAN)),
+    ('min_filter', delay_filter(MinFilter, NadaReceiver.K_MIN)),
+    ('global_loss_ratio', summary_metric(global_loss_ratio, False)),
+    ('average_bitrate_kbps', summary_metric(average_bitrate_kbps, False)),
+    ('average_delay_ms', summary_metric(average_delay_ms, False)),
+    ('global_loss_ratio_columnar', summary_metric(global_loss_ratio, True)),
+    ('average_bitrate_kbps_columnar', summary_metric(average_bitrate_kbps, True)),
+    ('average_delay_ms_columnar', summary_metric(average_delay_ms, True)),
+    ('summary_accumulator', summary_accumulator),
+    ('jain_fairness_index', fairness_index),
+])
+
+MACRO_BENCHMARKS = OrderedDict([('rmcat_evaluation_1_jitter_%d' % jitter, rmcat_evaluation_1(jitter))
+                                for jitter in range(3)])
+MACRO_BENCHMARKS['high_bitrate_trains'] = high_bitrate_trains
+
+def measure(setup, num_packets, num_repeats, with_memory=True):
+    """
+    Returns packets processed per second, best of num_repeats runs, and the peak memory, in bytes,
+    allocated by a separate traced run, or None.
+    """
+    best_packets_per_s = 0.0
+    for i in range(num_repeats):
+        run = setup(num_packets)
+        start_s = time.perf_counter()
+        num_processed_packets = run()
+        elapsed_s = time.perf_counter() - start_s
+        best_packets_per_s = max(best_packets_per_s, num_processed_packets / max(elapsed_s, 1e-9))
+    peak_memory_bytes = None
+    if with_memory:
+        run = setup(num_packets)
+        tracemalloc.start()
+        run()
+        peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best_packets_per_s, peak_memory_bytes
+
+def run_benchmarks(benchmarks, num_packets, num_repeats, with_memory=True):
+    results = OrderedDict()
+    for name, setup in benchmarks.items():
+        packets_per_s, peak_memory_bytes = measure(setup, num_packets, num_repeats, with_memory)
+        results[name] = {'packets_per_s': packets_per_s, 'peak_memory_bytes': peak_memory_bytes,
+                         'num_packets': num_packets}
+    return results
+
+def regressions(results, baseline, threshold):
+    """
+    Benchmarks slower, or allocating more, than baseline by more than threshold, as a ratio.
+    Only benchmarks run on as many packets as in the baseline are compared.
+    """
+    messages = []
+    for name, result in results.items():
+        if name not in baseline or baseline[name]['num_packets'] != result['num_packets']:
+            continue
+        ratio = baseline[name]['packets_per_s'] / result['packets_per_s']
+        if ratio > 1.0 + threshold:
+            messages.append("%s is %.2fx slower than baseline" % (name, ratio))
+        if result['peak_memory_bytes'] is not None and baseline[name]['peak_memory_bytes']:
+            ratio = float(result['peak_memory_bytes']) / baseline[name]['peak_memory_bytes']
+            if ratio > 1.0 + threshold:
+                messages.append("%s allocates %.2fx more than baseline" % (name, ratio))
+    return messages
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--levels", nargs="+", choices=['micro', 'macro'], default=['micro', 'macro'],
+                        help="Benchmark levels to run")
+    parser.add_argument("-k", "--filter", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("-n", "--num_packets", type=int, default=20000, help="Packets per micro benchmark")
+    parser.add_argument("-r", "--num_repeats", type=int, default=3, help="Repeats, the best one is kept")
+    parser.add_argument("-nm", "--no_memory", action="store_true", help="Use argument to skip memory tracing")
+    parser.add_argument("-o", "--output", help="JSON file to save the results to, e.g. as a baseline")
+    parser.add_argument("-b", "--baseline", help="JSON file of previous results, to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=0.3,
+                        help="Tolerated regression against the baseline, as a ratio")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    benchmarks = OrderedDict()
+    if 'micro' in args.levels:
+        benchmarks.update(MICRO_BENCHMARKS)
+    if 'macro' in args.levels:
+        benchmarks.update(MACRO_BENCHMARKS)
+    if args.filter is not None:
+        benchmarks = OrderedDict([(name, setup) for name, setup in benchmarks.items() if args.filter in name])
+
+    print("%36s %14s %16s" % ("benchmark", "packets/s", "peak memory (kB)"))
+    results = OrderedDict()
+    for name, setup in benchmarks.items():
+        results.update(run_benchmarks({name: setup}, args.num_packets, args.num_repeats, not args.no_memory))
+        peak_memory_bytes = results[name]['peak_memory_bytes']
+        print("%36s %14.0f %16s" % (name, results[name]['packets_per_s'],
+                                    "-" if peak_memory_bytes is None else "%.1f" % (peak_memory_bytes / 1024.0)))
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            messages = regressions(results, json.load(baseline_file), args.threshold)
+        for message in messages:
+            print(message)
+        sys.exit(1 if messages else 0)
@@ -0,0 +1,40 @@
+import unittest
+
+from benchmark import MICRO_BENCHMARKS, MACRO_BENCHMARKS, run_benchmarks, regressions
+
+"""
+Unittests for the benchmark suite, on small inputs.
+"""
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_micro_benchmarks(self):
+        results = run_benchmarks(MICRO_BENCHMARKS, 200, 1)
+        self.assertEqual(list(results.keys()), list(MICRO_BENCHMARKS.keys()))
+        for result in results.values():
+            self.assertTrue(result['packets_per_s'] > 0.0)
+            self.assertTrue(result['peak_memory_bytes'] >= 0)
+
+    def test_macro_benchmarks(self):
+        self.assertEqual(len(MACRO_BENCHMARKS), 4)
+        results = run_benchmarks({'rmcat_evaluation_1_jitter_2': MACRO_BENCHMARKS['rmcat_evaluation_1_jitter_2']},
+                                 0, 1, False)
+        self.assertTrue(results['rmcat_evaluation_1_jitter_2']['packets_per_s'] > 0.0)
+        self.assertEqual(results['rmcat_evaluation_1_jitter_2']['peak_memory_bytes'], None)
+
+    def test_regressions(self):
+        baseline = {'send_packet': {'packets_per_s': 1000.0, 'peak_memory_bytes': 1000, 'num_packets': 100}}
+        results = {'send_packet': {'packets_per_s': 900.0, 'peak_memory_bytes': 1100, 'num_packets': 100}}
+        self.assertEqual(regressions(results, baseline, 0.2), [])
+        results['send_packet']['packets_per_s'] = 800.0
+        self.assertEqual(len(regressions(results, baseline, 0.2)), 1)
+        results['send_packet']['peak_memory_bytes'] = 1300
+        self.assertEqual(len(regressions(results, baseline, 0.2)), 2)
+        # New benchmarks, or benchmarks on another number of packets, have no baseline.
+        self.assertEqual(regressions({'new': results['send_packet']}, baseline, 0.2), [])
+        results['send_packet']['num_packets'] = 200
+        self.assertEqual(regressions(results, baseline, 0.2), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,15 @@
+import math
+from bisect import bisect_left, insort
+from collections import deque
+
+from packet import PacketStore
+
 """
 Those methods can potentially be used by other congestion control algorithms.
 Hence they are put separately here in this file.
+Packets can be given as a list of Packets or as a PacketStore, whose columns are
+then used directly for whole simulation metrics.
+Incremental estimators also take packet.PacketTrains, as aggregated by the high bitrate mode.
 """
 
 def loss_ratio(packets, time_window_ms):
@@ -24,12 +33,119 @@ def loss_ratio(packets, time_window_ms):
 
     return 1.0 - float(packets_received)/(newest_id - oldest_id + 1)
 
+class LossRatioEstimator(object):
+    """
+    Incremental loss_ratio: packets are added one by one, sorted by arrival_time, and the
+    loss ratio in the previous time_window_ms is updated in amortized O(1).
+    Returns exactly what loss_ratio returns on the list of all added packets.
+    """
+
+    def __init__(self, time_window_ms):
+        self.time_window_ms = time_window_ms
+        self.__num_packets = 0
+        # (sequence number, arrival time, number of packets) of packets, or trains, within the time window.
+        self.__window = deque()
+        self.__num_window_packets = 0
+        # Monotonic deques of (sequence number, id), for window min and max ids.
+        self.__min_ids = deque()
+        self.__max_ids = deque()
+
+    def add_packet(self, packet):
+        self.__add(packet.id, packet.id, packet.arrival_time_ms, 1)
+
+    def add_train(self, train):
+        """
+        Adds the received packets of a packet.PacketTrain at once, as of the last one's arrival:
+        the train stays in the time window until it leaves it.
+        """
+        self.__add(train.first_id, train.last_id, train.last_arrival_time_ms, train.num_received)
+
+    def __add(self, first_id, last_id, arrival_time_ms, num_packets):
+        self.__num_packets += 1
+        self.__window.append((self.__num_packets, arrival_time_ms, num_packets))
+        self.__num_window_packets += num_packets
+        while self.__min_ids and self.__min_ids[-1][1] >= first_id:
+            self.__min_ids.pop()
+        self.__min_ids.append((self.__num_packets, first_id))
+        while self.__max_ids and self.__max_ids[-1][1] <= last_id:
+            self.__max_ids.pop()
+        self.__max_ids.append((self.__num_packets, last_id))
+
+        time_limit_ms = arrival_time_ms - self.time_window_ms
+        while self.__window[0][1] < time_limit_ms:
+            sequence_number, _, num_window_packets = self.__window.popleft()
+            self.__num_window_packets -= num_window_packets
+            if self.__min_ids[0][0] == sequence_number:
+                self.__min_ids.popleft()
+            if self.__max_ids[0][0] == sequence_number:
+                self.__max_ids.popleft()
+
+    def loss_ratio(self):
+        if self.__num_packets == 0:
+            return 0.0
+        newest_id = max(0, self.__max_ids[0][1])
+        oldest_id = self.__min_ids[0][1]
+        return 1.0 - float(self.__num_window_packets)/(newest_id - oldest_id + 1)
+
+class MedianFilter(object):
+    """
+    Running median of the latest window_size values, or of all of them while there are fewer.
+    Values are kept sorted, hence an update costs a binary search and an in-place list shift.
+    Returns the same values as numpy.median on the latest window_size values.
+    """
+
+    def __init__(self, window_size):
+        self.window_size = window_size
+        self.__num_values = 0
+        self.__values = [0.0] * window_size  # Ring buffer, oldest value is overwritten.
+        self.__sorted_values = []
+
+    def update(self, value):
+        index = self.__num_values % self.window_size
+        if self.__num_values >= self.window_size:
+            del self.__sorted_values[bisect_left(self.__sorted_values, self.__values[index])]
+        self.__values[index] = value
+        insort(self.__sorted_values, value)
+        self.__num_values += 1
+
+        middle = len(self.__sorted_values) // 2
+        if len(self.__sorted_values) % 2 == 1:
+            return self.__sorted_values[middle]
+        return (self.__sorted_values[middle - 1] + self.__sorted_values[middle]) / 2.0
+
+class MinFilter(object):
+    """
+    Running min of the latest window_size values, using a monotonic deque.
+    Returns the same values as min on the latest window_size values.
+    """
+
+    def __init__(self, window_size):
+        self.window_size = window_size
+        self.__num_values = 0
+        self.__values = [0.0] * window_size  # Ring buffer, oldest value is overwritten.
+        # Sequence numbers of increasing values, candidates to be the min.
+        self.__candidates = deque()
+
+    def update(self, value):
+        if self.__candidates and self.__candidates[0] <= self.__num_values - self.window_size:
+            self.__candidates.popleft()
+        while self.__candidates and self.__values[self.__candidates[-1] % self.window_size] >= value:
+            self.__candidates.pop()
+        self.__values[self.__num_values % self.window_size] = value
+        self.__candidates.append(self.__num_values)
+        self.__num_values += 1
+        return self.__values[self.__candidates[0] % self.window_size]
+
 def global_loss_ratio(packets):
     if packets is None or len(packets) == 0:
         return 0.0
     packets_received = len(packets)
-    newest_id = max([p.id for p in packets])
-    oldest_id = min([p.id for p in packets])
+    if isinstance(packets, PacketStore):
+        newest_id = max(packets.ids)
+        oldest_id = min(packets.ids)
+    else:
+        newest_id = max([p.id for p in packets])
+        oldest_id = min([p.id for p in packets])
     return 1.0 - float(packets_received)/(newest_id - oldest_id + 1)
 
 def receiving_rate_kbps(packets, time_window_ms):
@@ -58,6 +174,53 @@ def receiving_rate_kbps(packets, time_window_ms):
     return ((packets_counter - 1) * 8.0 * bytes_counter) \
            /(packets_counter * (newest_packet_ms - oldest_packet_ms))
 
+class ReceivingRateEstimator(object):
+    """
+    Incremental receiving_rate_kbps: packets are added one by one, sorted by arrival_time, and
+    the receiving rate in the previous time_window_ms is updated in amortized O(1).
+    Returns exactly what receiving_rate_kbps returns on the list of all added packets,
+    as long as payload sizes are whole numbers of bytes.
+    """
+
+    def __init__(self, time_window_ms):
+        self.time_window_ms = time_window_ms
+        # (arrival time, payload size, number of packets, first arrival time) of packets, or trains,
+        # within the time window, plus the latest one out of it, as counted by receiving_rate_kbps.
+        self.__window = deque()
+        self.__bytes_counter = 0.0
+        self.__packets_counter = 0
+
+    def add_packet(self, packet):
+        self.__add(packet.arrival_time_ms, packet.arrival_time_ms, packet.payload_size_bytes, 1)
+
+    def add_train(self, train):
+        """
+        Adds the received packets of a packet.PacketTrain at once. A train out of the time window
+        is counted whole, from its first arrival, as the packets of the latest one out of it.
+        """
+        self.__add(train.first_arrival_time_ms, train.last_arrival_time_ms, train.received_bytes, train.num_received)
+
+    def __add(self, first_arrival_time_ms, arrival_time_ms, payload_size_bytes, num_packets):
+        self.__window.append((arrival_time_ms, payload_size_bytes, num_packets, first_arrival_time_ms))
+        self.__bytes_counter += payload_size_bytes
+        self.__packets_counter += num_packets
+        time_limit_ms = arrival_time_ms - self.time_window_ms
+        while len(self.__window) > 1 and self.__window[1][0] < time_limit_ms:
+            _, payload_size_bytes, num_packets, _ = self.__window.popleft()
+            self.__bytes_counter -= payload_size_bytes
+            self.__packets_counter -= num_packets
+
+    def receiving_rate_kbps(self):
+        packets_counter = self.__packets_counter
+        if packets_counter == 0:
+            return 0.0
+        if packets_counter == 1:
+            return (8.0 * self.__bytes_counter) / self.time_window_ms
+        newest_packet_ms = self.__window[-1][0]
+        oldest_packet_ms = self.__window[0][3]
+        return ((packets_counter - 1) * 8.0 * self.__bytes_counter) \
+               /(packets_counter * (newest_packet_ms - oldest_packet_ms))
+
 def average_bitrate_kbps(packets):
     """
     Computes the average bitrate throughout the whole simulation.
@@ -68,7 +231,10 @@ def average_bitrate_kbps(packets):
     if len(packets) == 1:
         return 8.0 * packets[0].payload_size_bytes / packets[0].arrival_time_ms
 
-    total_received_bits = 8.0 * sum([packet.payload_size_bytes for packet in packets])
+    if isinstance(packets, PacketStore):
+        total_received_bits = 8.0 * sum(packets.payload_sizes_bytes)
+    else:
+        total_received_bits = 8.0 * sum([packet.payload_size_bytes for packet in packets])
     time_span_ms = packets[-1].arrival_time_ms - packets[0].arrival_time_ms
 
     # If n packets were received, we are counting only n-1 time gaps between them.
@@ -83,5 +249,167 @@ def average_delay_ms(packets):
     if packets is None or len(packets) == 0:
         return 0.0
 
-    sum_delays_ms = sum([packet.arrival_time_ms - packet.send_time_ms for packet in packets])
+    if isinstance(packets, PacketStore):
+        sum_delays_ms = sum([arrival_time_ms - send_time_ms for arrival_time_ms, send_time_ms
+                             in zip(packets.arrival_times_ms, packets.send_times_ms)])
+    else:
+        sum_delays_ms = sum([packet.arrival_time_ms - packet.send_time_ms for packet in packets])
     return sum_delays_ms / len(packets)
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with relative accuracy, as DDSketch: values are counted in buckets
+    of logarithmic width, so that any quantile is within relative_accuracy of the exact one.
+    Adding a value is O(1), and the number of buckets only grows with the log of the values' range.
+    Non positive values are counted as 0. Sketches of the same accuracy, e.g. of parallel runs,
+    are merged by adding their counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.zero_count = 0
+        self.min = float("inf")
+        self.max = float("-inf")
+        # Bucket i counts values within (gamma**(i-1), gamma**i].
+        self.counts = {}
+        self.__gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self.__log_gamma = math.log(self.__gamma)
+
+    def add(self, value, count=1):
+        self.count += count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value > 0.0:
+            index = int(math.ceil(math.log(value) / self.__log_gamma))
+            self.counts[index] = self.counts.get(index, 0) + count
+        else:
+            self.zero_count += count
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches of the same relative accuracy can be merged.")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    def quantile(self, q):
+        """
+        Value of rank q * (count - 1), q within [0, 1], nan if the sketch is empty.
+        """
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        if rank >= self.count - 1:  # The max is kept exactly.
+            return self.max
+        count = self.zero_count
+        if count > rank:
+            return max(self.min, 0.0)
+        for index in sorted(self.counts.keys()):
+            count += self.counts[index]
+            if count > rank:
+                # Middle of the bucket, in relative terms.
+                value = 2.0 * self.__gamma ** index / (self.__gamma + 1.0)
+                return min(self.max, max(self.min, value))
+        return self.max
+
+class SummaryAccumulator(object):
+    """
+    Online average_bitrate_kbps, average_delay_ms and global_loss_ratio: packets are added one by
+    one, in arrival order, updating running sums and the min and max ids in O(1), without being kept.
+    Returns what those functions return on the list of all added packets, as long as payload sizes
+    are whole numbers of bytes. Delays are also added to a QuantileSketch, for their percentiles.
+    """
+
+    TRAIN_DELAY_POINTS = 16
+
+    def __init__(self, relative_accuracy=0.01):
+        self.num_packets = 0
+        self.delay_sketch = QuantileSketch(relative_accuracy)
+        self.__payload_bytes = 0.0
+        self.__sum_delays_ms = 0.0
+        self.__first_arrival_time_ms = None
+        self.__latest_arrival_time_ms = None
+        self.__oldest_id = float("inf")
+        self.__newest_id = float("-inf")
+
+    def add_packet(self, packet):
+        if self.num_packets == 0:
+            self.__first_arrival_time_ms = packet.arrival_time_ms
+        self.num_packets += 1
+        self.__latest_arrival_time_ms = packet.arrival_time_ms
+        self.__payload_bytes += packet.payload_size_bytes
+        delay_ms = packet.arrival_time_ms - packet.send_time_ms
+        self.__sum_delays_ms += delay_ms
+        self.delay_sketch.add(delay_ms)
+        if packet.id < self.__oldest_id:
+            self.__oldest_id = packet.id
+        if packet.id > self.__newest_id:
+            self.__newest_id = packet.id
+
+    def add_train(self, train):
+        """
+        Adds the received packets of a packet.PacketTrain at once. Their delays are assumed to change
+        linearly from the first one to the last one: the sketch gets up to TRAIN_DELAY_POINTS of them,
+        each one weighted by the packets around it.
+        """
+        num_received = train.num_received
+        if self.num_packets == 0:
+            self.__first_arrival_time_ms = train.first_arrival_time_ms
+        self.num_packets += num_received
+        self.__latest_arrival_time_ms = train.last_arrival_time_ms
+        self.__payload_bytes += train.received_bytes
+        first_delay_ms = train.first_arrival_time_ms - train.first_send_time_ms
+        last_delay_ms = train.last_arrival_time_ms - train.last_send_time_ms
+        self.__sum_delays_ms += num_received * 0.5 * (first_delay_ms + last_delay_ms)
+        num_points = min(num_received, SummaryAccumulator.TRAIN_DELAY_POINTS)
+        for i in range(num_points):
+            count = (num_received * (i + 1)) // num_points - (num_received * i) // num_points
+            if num_points == num_received:  # One point per packet.
+                fraction = i / (num_points - 1.0) if num_points > 1 else 0.0
+            else:
+                fraction = (i + 0.5) / num_points
+            self.delay_sketch.add(first_delay_ms + fraction * (last_delay_ms - first_delay_ms), count)
+        if train.first_id < self.__oldest_id:
+            self.__oldest_id = train.first_id
+        if train.last_id > self.__newest_id:
+            self.__newest_id = train.last_id
+
+    def average_bitrate_kbps(self):
+        if self.num_packets == 0:
+            return 0.0
+        if self.num_packets == 1:
+            return 8.0 * self.__payload_bytes / self.__first_arrival_time_ms
+        time_span_ms = self.__latest_arrival_time_ms - self.__first_arrival_time_ms
+        correction_factor = float(self.num_packets - 1)/self.num_packets
+        return (8.0 * self.__payload_bytes / time_span_ms) * correction_factor
+
+    def average_delay_ms(self):
+        if self.num_packets == 0:
+            return 0.0
+        return self.__sum_delays_ms / self.num_packets
+
+    def global_loss_ratio(self):
+        if self.num_packets == 0:
+            return 0.0
+        return 1.0 - float(self.num_packets)/(self.__newest_id - self.__oldest_id + 1)
+
+    def delay_quantile_ms(self, q):
+        return self.delay_sketch.quantile(q)
+
+def jain_fairness_index(throughputs):
+    """
+    Jain's fairness index of the flows' throughputs: 1.0 when they are all equal,
+    down to 1/n when a single one of the n flows gets everything.
+    """
+    if throughputs is None or len(throughputs) == 0:
+        return 1.0
+    sum_squares = sum([throughput * throughput for throughput in throughputs])
+    if sum_squares == 0.0:
+        return 1.0
+    return sum(throughputs) ** 2 / (len(throughputs) * sum_squares)
@@ -1,9 +1,13 @@
 import unittest
 import random
+import numpy
 
-from packet import Packet
+from packet import Packet, PacketStore, PacketTrain
 from packet_source import PacketSource
 from bwe_utils import loss_ratio, global_loss_ratio, receiving_rate_kbps, average_bitrate_kbps, average_delay_ms
+from bwe_utils import jain_fairness_index
+from bwe_utils import LossRatioEstimator, ReceivingRateEstimator, MedianFilter, MinFilter
+from bwe_utils import QuantileSketch, SummaryAccumulator
 
 """
 Unittests for bwe_utils.
@@ -154,5 +158,170 @@ class TestBweUtils(unittest.TestCase):
                 packets[j].arrival_time_ms = packets[j].send_time_ms + delay_ms
             self.assertNear(average_delay_ms(packets), delay_ms, 0.001)
 
+    def random_packets(self, num_packets):
+        # Packets are sorted by arrival time, some of them are lost.
+        packets = []
+        id_ = 0
+        arrival_time_ms = 0.0
+        for i in range(num_packets):
+            id_ += random.choice([1, 1, 1, 2, 5])
+            arrival_time_ms += random.uniform(0.1, 50.0)
+            packet = Packet(id_, None, float(random.randint(0, 1500)))
+            packet.arrival_time_ms = arrival_time_ms
+            packets.append(packet)
+        return packets
+
+    def test_loss_ratio_estimator_no_packets(self):
+        self.assertEqual(LossRatioEstimator(50.0).loss_ratio(), 0.0)
+
+    def test_loss_ratio_estimator_matches_loss_ratio(self):
+        for i in range(10):
+            time_window_ms = random.uniform(0.0, 1000.0)
+            estimator = LossRatioEstimator(time_window_ms)
+            packets = self.random_packets(1000)
+            for j in range(len(packets)):
+                estimator.add_packet(packets[j])
+                self.assertEqual(estimator.loss_ratio(), loss_ratio(packets[:j+1], time_window_ms))
+
+    def test_receiving_rate_estimator_no_packets(self):
+        self.assertEqual(ReceivingRateEstimator(100.0).receiving_rate_kbps(), 0.0)
+
+    def test_receiving_rate_estimator_matches_receiving_rate(self):
+        for i in range(10):
+            time_window_ms = random.uniform(0.0, 1000.0)
+            estimator = ReceivingRateEstimator(time_window_ms)
+            packets = self.random_packets(1000)
+            for j in range(len(packets)):
+                estimator.add_packet(packets[j])
+                self.assertEqual(estimator.receiving_rate_kbps(), receiving_rate_kbps(packets[:j+1], time_window_ms))
+
+
+    def test_median_filter_matches_median(self):
+        for window_size in range(1, 12):
+            median_filter = MedianFilter(window_size)
+            # Repeated values are common on delay signals.
+            values = [random.choice([0.0, 1.0, random.uniform(0.0, 300.0)]) for i in range(1000)]
+            for i in range(len(values)):
+                self.assertEqual(median_filter.update(values[i]), numpy.median(values[max(0, i+1-window_size):i+1]))
+
+    def test_min_filter_matches_min(self):
+        for window_size in range(1, 12):
+            min_filter = MinFilter(window_size)
+            values = [random.choice([0.0, 1.0, random.uniform(0.0, 300.0)]) for i in range(1000)]
+            for i in range(len(values)):
+                self.assertEqual(min_filter.update(values[i]), min(values[max(0, i+1-window_size):i+1]))
+
+
+    def test_packet_store_metrics(self):
+        for i in range(10):
+            packets = self.random_packets(1000)
+            for packet in packets:
+                packet.send_time_ms = packet.arrival_time_ms - random.uniform(50.0, 300.0)
+            store = PacketStore()
+            for packet in packets:
+                store.append(packet)
+            self.assertEqual(global_loss_ratio(store), global_loss_ratio(packets))
+            self.assertEqual(average_bitrate_kbps(store), average_bitrate_kbps(packets))
+            self.assertEqual(average_delay_ms(store), average_delay_ms(packets))
+            time_window_ms = random.uniform(0.0, 1000.0)
+            self.assertEqual(loss_ratio(store, time_window_ms), loss_ratio(packets, time_window_ms))
+            self.assertEqual(receiving_rate_kbps(store, time_window_ms), receiving_rate_kbps(packets, time_window_ms))
+
+    def test_summary_accumulator(self):
+        self.assertEqual(SummaryAccumulator().average_bitrate_kbps(), 0.0)
+        for num_packets in [1, 2, 1000]:
+            packets = self.random_packets(num_packets)
+            accumulator = SummaryAccumulator()
+            for packet in packets:
+                packet.send_time_ms = packet.arrival_time_ms - random.uniform(50.0, 300.0)
+                accumulator.add_packet(packet)
+            self.assertEqual(accumulator.average_bitrate_kbps(), average_bitrate_kbps(packets))
+            self.assertAlmostEqual(accumulator.average_delay_ms(), average_delay_ms(packets))
+            self.assertEqual(accumulator.global_loss_ratio(), global_loss_ratio(packets))
+            delays_ms = sorted([packet.arrival_time_ms - packet.send_time_ms for packet in packets])
+            self.assertNear(accumulator.delay_quantile_ms(0.5), delays_ms[(num_packets - 1) // 2],
+                            0.01 * delays_ms[(num_packets - 1) // 2])
+
+    # Trains of a single packet are added as the packet.
+    def train(self, packet):
+        train = PacketTrain(packet.id, 1, packet.payload_size_bytes, packet.send_time_ms, packet.send_time_ms)
+        train.num_received = 1
+        train.first_arrival_time_ms = train.last_arrival_time_ms = packet.arrival_time_ms
+        return train
+
+    def test_estimators_add_trains(self):
+        for i in range(10):
+            time_window_ms = random.uniform(0.0, 1000.0)
+            packets = self.random_packets(1000)
+            estimators = [LossRatioEstimator(time_window_ms), ReceivingRateEstimator(time_window_ms),
+                          SummaryAccumulator()]
+            train_estimators = [LossRatioEstimator(time_window_ms), ReceivingRateEstimator(time_window_ms),
+                                SummaryAccumulator()]
+            for packet in packets:
+                packet.send_time_ms = packet.arrival_time_ms - random.uniform(50.0, 300.0)
+                for estimator, train_estimator in zip(estimators, train_estimators):
+                    estimator.add_packet(packet)
+                    train_estimator.add_train(self.train(packet))
+                self.assertEqual(estimators[0].loss_ratio(), train_estimators[0].loss_ratio())
+                self.assertEqual(estimators[1].receiving_rate_kbps(), train_estimators[1].receiving_rate_kbps())
+            self.assertEqual(estimators[2].average_bitrate_kbps(), train_estimators[2].average_bitrate_kbps())
+            self.assertEqual(estimators[2].average_delay_ms(), train_estimators[2].average_delay_ms())
+            self.assertEqual(estimators[2].delay_quantile_ms(0.95), train_estimators[2].delay_quantile_ms(0.95))
+
+    def test_summary_accumulator_trains(self):
+        accumulator = SummaryAccumulator()
+        # 100 packets sent every ms, with delays from 50 ms to 149 ms, then a train with losses.
+        train = PacketTrain(1, 100, 1000.0, 1.0, 100.0)
+        train.num_received = 100
+        train.first_arrival_time_ms, train.last_arrival_time_ms = 51.0, 249.0
+        accumulator.add_train(train)
+        self.assertEqual(accumulator.num_packets, 100)
+        self.assertNear(accumulator.average_delay_ms(), 99.5, 1e-9)
+        # Within the delays of a slice of the train.
+        self.assertNear(accumulator.delay_quantile_ms(0.5), 99.5, 99.0 / SummaryAccumulator.TRAIN_DELAY_POINTS)
+        self.assertNear(accumulator.average_bitrate_kbps(), 8.0 * 100000.0 / 198.0 * 0.99, 1e-9)
+        train = PacketTrain(101, 100, 1000.0, 101.0, 200.0)
+        train.num_received = 50
+        train.first_arrival_time_ms, train.last_arrival_time_ms = 251.0, 300.0
+        accumulator.add_train(train)
+        self.assertNear(accumulator.global_loss_ratio(), 0.25, 1e-9)
+
+    def test_quantile_sketch(self):
+        values = [random.lognormvariate(4.0, 1.5) for i in range(20000)] + [0.0] * 100
+        sketch = QuantileSketch(0.01)
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in [0.0, 0.01, 0.5, 0.95, 0.99, 0.999, 1.0]:
+            exact_value = values[int(q * (len(values) - 1))]
+            self.assertNear(sketch.quantile(q), exact_value, 0.01 * exact_value + 1e-12)
+        self.assertEqual(sketch.quantile(1.0), values[-1])
+        self.assertLess(len(sketch.counts), 2000)
+        self.assertTrue(QuantileSketch().quantile(0.5) != QuantileSketch().quantile(0.5))  # nan
+
+    def test_quantile_sketch_merge(self):
+        values = [random.uniform(50.0, 500.0) for i in range(5000)]
+        sketches = [QuantileSketch(), QuantileSketch(), QuantileSketch()]
+        for i, value in enumerate(values):
+            sketches[i % 2].add(value)
+            sketches[2].add(value)
+        sketches[0].merge(sketches[1])
+        self.assertEqual(sketches[0].counts, sketches[2].counts)
+        for q in [0.05, 0.5, 0.95, 0.99]:
+            self.assertEqual(sketches[0].quantile(q), sketches[2].quantile(q))
+        with self.assertRaises(ValueError):
+            sketches[0].merge(QuantileSketch(0.05))
+
+    def test_jain_fairness_index(self):
+        num_flows = random.randint(1, 100)
+        throughput = random.uniform(10.0, 1000.0)
+        self.assertAlmostEqual(jain_fairness_index([throughput] * num_flows), 1.0)
+        self.assertAlmostEqual(jain_fairness_index([throughput] + [0.0] * (num_flows - 1)), 1.0 / num_flows)
+        throughputs = [random.uniform(10.0, 1000.0) for i in range(num_flows)]
+        fairness_index = jain_fairness_index(throughputs)
+        self.assertTrue(1.0 / num_flows - 1e-9 <= fairness_index <= 1.0 + 1e-9)
+        self.assertEqual(jain_fairness_index([]), 1.0)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,200 @@
+import argparse
+import bisect
+
+import numpy
+
+"""
+Link capacity traces, e.g. bandwidth measured on cellular or Wi-Fi networks, with up to
+millions of change points: capacities_kbps[i] is available from times_ms[i] until times_ms[i+1].
+The last change point ends the trace, at end_time_ms, its capacity holds beyond.
+Traces are loaded from CSV files, rows of time (ms), capacity (kbps), or from binary .npy files,
+holding both columns as rows of a 2 x N float64 array. Binary traces are memory mapped:
+only the parts of the trace a simulation goes through are read, and validated: cursors check
+each window they load, validate() checks the whole trace, a chunk at a time. CSV traces are
+validated when loaded.
+Capacity is queried by binary search, or by a cursor, in constant time for increasing times.
+Capacity can be zero, e.g. during an outage.
+The following parameters can be specified on the command line, to convert a CSV trace to binary:
+csv file, npy file
+e.g. python capacity_trace.py trace.csv trace.npy
+"""
+
+class CapacityTrace(object):
+
+    VALIDATION_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, times_ms_, capacities_kbps_):
+        self.times_ms = numpy.asanyarray(times_ms_, dtype=float)
+        self.capacities_kbps = numpy.asanyarray(capacities_kbps_, dtype=float)
+        if self.times_ms.ndim != 1 or len(self.times_ms) == 0 or len(self.times_ms) != len(self.capacities_kbps):
+            raise ValueError("A capacity trace needs as many change times as capacities, at least one.")
+
+    def __len__(self):
+        return len(self.times_ms)
+
+    # Read only, hence shared by copies of the links and simulations following it, see snapshot.py.
+    def __deepcopy__(self, memo):
+        return self
+
+    @property
+    def end_time_ms(self):
+        return float(self.times_ms[-1])
+
+    def capacity_kbps(self, time_ms):
+        """
+        Capacity at time_ms, by binary search. The first capacity holds before the trace starts.
+        """
+        index = int(numpy.searchsorted(self.times_ms, time_ms, side='right')) - 1
+        return float(self.capacities_kbps[max(0, index)])
+
+    def cursor(self):
+        return TraceCursor(self)
+
+    def validate(self, start=0, end=None):
+        """
+        Checks that times increase and capacities are non negative, for change points start to end,
+        the whole trace by default, reading VALIDATION_CHUNK_SIZE of them at a time.
+        """
+        end = len(self) if end is None else end
+        for chunk_start in range(start, end, CapacityTrace.VALIDATION_CHUNK_SIZE):
+            chunk_end = min(chunk_start + CapacityTrace.VALIDATION_CHUNK_SIZE, end)
+            # Overlaps the next chunk by a time, to check the increase between chunks.
+            if numpy.any(numpy.diff(self.times_ms[chunk_start:chunk_end + 1]) <= 0.0) \
+               or numpy.any(self.capacities_kbps[chunk_start:chunk_end] < 0.0):
+                raise ValueError("Capacity trace times must increase, and capacities be non negative.")
+
+    def schedule(self):
+        """
+        The trace as a schedule of the evaluation tests: capacities_kbps[i] is used until times_ms[i].
+        """
+        if len(self) == 1:
+            return [self.end_time_ms], self.capacities_kbps.tolist()
+        return self.times_ms[1:].tolist(), self.capacities_kbps[:-1].tolist()
+
+def from_schedule(times_ms, capacities_kbps):
+    """
+    Capacity trace of a schedule of the evaluation tests, starting at time 0.
+    """
+    return CapacityTrace([0.0] + list(times_ms), list(capacities_kbps) + [capacities_kbps[-1]])
+
+def load_capacity_trace(path):
+    """
+    Loads a .npy trace memory mapped, any other file as CSV, whose first line may be a header.
+    """
+    if path.endswith('.npy'):
+        columns = numpy.load(path, mmap_mode='r')
+        if columns.ndim != 2 or columns.shape[0] != 2:
+            raise ValueError("%s is not a 2 x N capacity trace." % path)
+        return CapacityTrace(columns[0], columns[1])
+    with open(path) as trace_file:
+        header = trace_file.readline()
+    try:
+        [float(field) for field in header.split(',')]
+        skip_rows = 0
+    except ValueError:
+        skip_rows = 1
+    rows = numpy.loadtxt(path, delimiter=',', skiprows=skip_rows, ndmin=2)
+    capacity_trace = CapacityTrace(rows[:, 0], rows[:, 1])
+    capacity_trace.validate()
+    return capacity_trace
+
+def save_capacity_trace(path, capacity_trace):
+    """
+    Saves a binary trace, to be memory mapped by load_capacity_trace.
+    """
+    numpy.save(path, numpy.vstack([capacity_trace.times_ms, capacity_trace.capacities_kbps]))
+
+# Walks a capacity trace, through a window of its segments, as floats: queries at increasing
+# times, e.g. by a link, are constant time, or binary searches within the window. Others, and
+# the window, are binary searched in the trace, read in order when memory mapped.
+# Each window is validated when loaded, hence only the parts of the trace walked through.
+# Sending times integrate the capacity: the bits sent by each change point of the window are
+# searched, then the window slides if needed.
+class TraceCursor(object):
+
+    WINDOW_SIZE = 4096
+
+    def __init__(self, capacity_trace_):
+        self.capacity_trace = capacity_trace_
+        self.__load_window(0)
+        self.__move(0)
+
+    def capacity_kbps(self, time_ms):
+        if not self.__start_time_ms <= time_ms < self.__end_time_ms:
+            self.__seek(time_ms)
+        return self.__capacity_kbps
+
+    def departure_time_ms(self, start_time_ms, size_bytes, deadline_ms=float("inf")):
+        """
+        Time at which size_bytes, whose transmission starts at start_time_ms, are sent.
+        inf if the link never sends them. The search stops past deadline_ms, e.g. during a long
+        outage: a departure after deadline_ms may be inf too.
+        """
+        capacity_kbps = self.capacity_kbps(start_time_ms)
+        # Usually sent within the current segment, as on a constant capacity link.
+        if capacity_kbps > 0.0:
+            departure_time_ms = start_time_ms + (8 * size_bytes) / capacity_kbps
+            if departure_time_ms <= self.__end_time_ms:
+                return departure_time_ms
+        if size_bytes == 0.0:
+            return start_time_ms
+        index = self.__index - self.__window_start
+        target_bits = self.__window_bits[index] + capacity_kbps * (start_time_ms - self.__window_times_ms[index]) \
+                    + 8 * size_bytes
+        while True:
+            # First change point by which the target is sent.
+            end = bisect.bisect_left(self.__window_bits, target_bits)
+            if end < len(self.__window_bits):
+                self.__move(self.__window_start + end - 1)
+                return self.__window_times_ms[end - 1] + (target_bits - self.__window_bits[end - 1]) \
+                     / self.__window_capacities_kbps[end - 1]
+            if self.__window_times_ms[-1] == float("inf") or self.__window_times_ms[-1] >= deadline_ms:
+                return float("inf")
+            target_bits -= self.__window_bits[-1]
+            self.__load_window(self.__window_start + len(self.__window_capacities_kbps))
+            self.__move(self.__window_start)
+
+    def __seek(self, time_ms):
+        window_times_ms = self.__window_times_ms
+        if (window_times_ms[0] <= time_ms or self.__window_start == 0) and time_ms < window_times_ms[-1]:
+            index = self.__window_start + max(0, bisect.bisect_right(window_times_ms, time_ms) - 1)
+        else:
+            index = max(0, int(self.capacity_trace.times_ms.searchsorted(time_ms, side='right')) - 1)
+            self.__load_window(index)
+        self.__move(index)
+
+    # Moves to a segment of the window. The first segment extends back to -inf.
+    def __move(self, index):
+        window_index = index - self.__window_start
+        self.__index = index
+        self.__start_time_ms = self.__window_times_ms[window_index] if index > 0 else float("-inf")
+        self.__end_time_ms = self.__window_times_ms[window_index + 1]
+        self.__capacity_kbps = self.__window_capacities_kbps[window_index]
+
+    # Window of segments from index on, with the bits sent from its start to each change point.
+    # The last segment of the trace ends at inf.
+    def __load_window(self, index):
+        end = min(index + TraceCursor.WINDOW_SIZE, len(self.capacity_trace))
+        self.capacity_trace.validate(index, end)
+        times_ms = numpy.array(self.capacity_trace.times_ms[index:end + 1])
+        if end == len(self.capacity_trace):
+            times_ms = numpy.append(times_ms, float("inf"))
+        capacities_kbps = numpy.array(self.capacity_trace.capacities_kbps[index:end])
+        # No bits during an outage, even an endless one.
+        bits = numpy.zeros(len(capacities_kbps))
+        sending = capacities_kbps > 0.0
+        bits[sending] = capacities_kbps[sending] * numpy.diff(times_ms)[sending]
+        self.__window_start = index
+        self.__window_times_ms = times_ms.tolist()
+        self.__window_capacities_kbps = capacities_kbps.tolist()
+        self.__window_bits = [0.0] + numpy.cumsum(bits).tolist()
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv_file", help="CSV trace, rows of time (ms), capacity (kbps)")
+    parser.add_argument("npy_file", help="Binary trace to write, memory mapped when loaded")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    save_capacity_trace(args.npy_file, load_capacity_trace(args.csv_file))
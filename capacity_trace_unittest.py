@@ -0,0 +1,127 @@
+import unittest
+import bisect
+import os
+import random
+import shutil
+import tempfile
+
+import numpy
+
+from capacity_trace import CapacityTrace, TraceCursor, from_schedule, load_capacity_trace, save_capacity_trace
+
+"""
+Unittests for capacity traces.
+"""
+
+class TestCapacityTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Spans several cursor windows, with outages.
+    def random_trace(self, num_changes=3 * TraceCursor.WINDOW_SIZE):
+        times_ms = numpy.cumsum(numpy.random.uniform(0.1, 5.0, num_changes))
+        capacities_kbps = numpy.random.uniform(0.0, 2000.0, num_changes)
+        capacities_kbps[numpy.random.random(num_changes) < 0.2] = 0.0
+        return CapacityTrace(times_ms, capacities_kbps)
+
+    # Reference integration, one segment at a time.
+    def departure_time_ms(self, capacity_trace, start_time_ms, size_bytes):
+        times_ms = capacity_trace.times_ms.tolist() + [float("inf")]
+        capacities_kbps = capacity_trace.capacities_kbps.tolist()
+        index = max(0, int(numpy.searchsorted(capacity_trace.times_ms, start_time_ms, side='right')) - 1)
+        remaining_bits = 8 * size_bytes
+        time_ms = start_time_ms
+        while index < len(capacities_kbps):
+            if capacities_kbps[index] > 0.0:
+                if time_ms + remaining_bits / capacities_kbps[index] <= times_ms[index + 1]:
+                    return time_ms + remaining_bits / capacities_kbps[index]
+                remaining_bits -= (times_ms[index + 1] - time_ms) * capacities_kbps[index]
+            time_ms = times_ms[index + 1]
+            index += 1
+        return float("inf")
+
+    def test_load_csv_and_binary(self):
+        capacity_trace = self.random_trace(100)
+        rows = numpy.column_stack([capacity_trace.times_ms, capacity_trace.capacities_kbps])
+        for header in ['', 'time_ms,capacity_kbps']:
+            path = os.path.join(self.directory, 'trace.csv')
+            numpy.savetxt(path, rows, delimiter=',', header=header, comments='', fmt='%.17g')
+            loaded_trace = load_capacity_trace(path)
+            self.assertEqual(loaded_trace.times_ms.tolist(), capacity_trace.times_ms.tolist())
+            self.assertEqual(loaded_trace.capacities_kbps.tolist(), capacity_trace.capacities_kbps.tolist())
+        path = os.path.join(self.directory, 'trace.npy')
+        save_capacity_trace(path, loaded_trace)
+        loaded_trace = load_capacity_trace(path)
+        self.assertTrue(isinstance(loaded_trace.times_ms, numpy.memmap))
+        self.assertEqual(loaded_trace.capacities_kbps.tolist(), capacity_trace.capacities_kbps.tolist())
+
+    def test_invalid_trace(self):
+        with self.assertRaises(ValueError):
+            CapacityTrace([0.0, 2.0, 1.0], [100.0, 100.0, 100.0]).validate()
+        with self.assertRaises(ValueError):
+            CapacityTrace([0.0, 1.0], [100.0, -1.0]).validate()
+        with self.assertRaises(ValueError):
+            CapacityTrace([], [])
+        # Checked by chunks, and by the cursor as it loads windows, not when constructed.
+        times_ms = numpy.arange(3.0 * TraceCursor.WINDOW_SIZE)
+        invalid_index = 3 * TraceCursor.WINDOW_SIZE // 2
+        times_ms[invalid_index] = times_ms[invalid_index - 1]
+        capacity_trace = CapacityTrace(times_ms, numpy.full(len(times_ms), 1000.0))
+        cursor = capacity_trace.cursor()
+        self.assertEqual(cursor.capacity_kbps(10.0), 1000.0)
+        with self.assertRaises(ValueError):
+            cursor.capacity_kbps(times_ms[invalid_index - 10])
+        capacity_trace.validate(0, TraceCursor.WINDOW_SIZE)
+        chunk_size = CapacityTrace.VALIDATION_CHUNK_SIZE
+        try:
+            CapacityTrace.VALIDATION_CHUNK_SIZE = TraceCursor.WINDOW_SIZE
+            with self.assertRaises(ValueError):
+                capacity_trace.validate()
+        finally:
+            CapacityTrace.VALIDATION_CHUNK_SIZE = chunk_size
+
+    def test_schedule(self):
+        times_ms, capacities_kbps = [40000.0, 60000.0, 80000.0], [1000.0, 2500.0, 600.0]
+        capacity_trace = from_schedule(times_ms, capacities_kbps)
+        self.assertEqual(capacity_trace.schedule(), (times_ms, capacities_kbps))
+        self.assertEqual(capacity_trace.end_time_ms, 80000.0)
+        self.assertEqual(capacity_trace.capacity_kbps(39999.0), 1000.0)
+        self.assertEqual(capacity_trace.capacity_kbps(40000.0), 2500.0)
+
+    def test_cursor_capacity(self):
+        capacity_trace = self.random_trace()
+        cursor = capacity_trace.cursor()
+        # Increasing times, then random ones, within and around the trace.
+        queries_ms = sorted([random.uniform(-10.0, capacity_trace.end_time_ms + 10.0) for i in range(2000)])
+        queries_ms += [random.uniform(-10.0, capacity_trace.end_time_ms + 10.0) for i in range(200)]
+        times_ms = capacity_trace.times_ms.tolist()
+        for time_ms in queries_ms:
+            capacity_kbps = capacity_trace.capacities_kbps[max(0, bisect.bisect_right(times_ms, time_ms) - 1)]
+            self.assertEqual(capacity_trace.capacity_kbps(time_ms), capacity_kbps)
+            self.assertEqual(cursor.capacity_kbps(time_ms), capacity_kbps)
+
+    def test_departure_time(self):
+        capacity_trace = self.random_trace()
+        cursor = capacity_trace.cursor()
+        start_time_ms = 0.0
+        for i in range(2000):
+            start_time_ms += random.uniform(0.0, 20.0)
+            size_bytes = random.choice([100.0, 1200.0, 20000.0])
+            departure_time_ms = cursor.departure_time_ms(start_time_ms, size_bytes)
+            expected_time_ms = self.departure_time_ms(capacity_trace, start_time_ms, size_bytes)
+            self.assertTrue(abs(departure_time_ms - expected_time_ms) < 1e-6 * max(1.0, expected_time_ms))
+        # Not sent by the deadline, beyond the cursor window.
+        times_ms = [0.0, 10.0] + [10.0 + i for i in range(1, 2 * TraceCursor.WINDOW_SIZE)]
+        capacities_kbps = [1000.0] + [0.0] * (len(times_ms) - 2) + [1000.0]
+        capacity_trace = CapacityTrace(times_ms, capacities_kbps)
+        self.assertEqual(capacity_trace.cursor().departure_time_ms(9.0, 1200.0, 100.0), float("inf"))
+        self.assertAlmostEqual(capacity_trace.cursor().departure_time_ms(9.0, 1200.0), times_ms[-1] + 8.6)
+        self.assertEqual(CapacityTrace([0.0], [0.0]).cursor().departure_time_ms(0.0, 1.0), float("inf"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Controller agnostic interface of congestion controllers, as the simulation loops use them:
+-- A Sender creates its packets, one at a time, at its current bitrate, and reacts to feedback.
+-- A Receiver is given the packets the link delivers, in arrival order, and returns a feedback,
+   of any type its sender understands, or None, once per packet.
+NadaSender and NadaReceiver implement it. The per packet loops, the discrete-event simulator,
+streaming and paired evaluations only rely on it. Packet train runs need more,
+see NadaSender.create_train and NadaReceiver.receive_train.
+A Controller names a sender and receiver pair, created afresh for each run, e.g. in a worker.
+"""
+
+class Sender(object):
+
+    def create_packet(self):
+        """
+        Returns the next packet.Packet, with its id and send time.
+        """
+        raise NotImplementedError
+
+    def receive_feedback(self, feedback):
+        raise NotImplementedError
+
+class Receiver(object):
+
+    # Time of the latest feedback, in ms: how far a run is, e.g. to run several in turns.
+    latest_feedback_ms = 0.0
+    # A bwe_utils.SummaryAccumulator the receiver adds all the packets it is given to, if not None.
+    summary = None
+
+    def receive_packet(self, packet):
+        raise NotImplementedError
+
+    def get_feedback(self):
+        """
+        Returns a feedback for the sender, or None, after each packet.
+        """
+        raise NotImplementedError
+
+class Controller(object):
+
+    # create_sender_ and create_receiver_ take no argument, and are picklable when runs use a
+    # process pool: classes, module level functions, or functools.partial of them.
+    def __init__(self, name_, create_sender_, create_receiver_):
+        self.name = name_
+        self.create_sender = create_sender_
+        self.create_receiver = create_receiver_
+
+    def create(self):
+        return self.create_sender(), self.create_receiver()
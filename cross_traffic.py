@@ -0,0 +1,159 @@
+import math
+
+"""
+Cross traffic, sharing the bottleneck queue with the simulated flows.
+Sources are rate processes, whose bitrate is constant during steps of step_ms, aligned on
+multiples of step_ms. The link hands its queue to the cross traffic before each packet:
+-- FluidCrossTraffic adds the sources' load to the queue as a fluid, without packets.
+   Each step, the load is admitted up to the queue size, the excess is lost, then the
+   queue is served for the step duration.
+-- PacketCrossTraffic sends the same load as actual packets, through the same choke rule as
+   the LinkSimulator, as a per packet reference for the fluid model.
+The queue is given and returned as the time at which it drains, i.e. the last choke time.
+The fluid fills up a saturated queue to its brim, leaving no room between cross traffic
+packets: the flows' losses and delays are then slightly pessimistic, see cross_traffic_unittest.
+"""
+
+class ConstantBitrateSource(object):
+
+    def __init__(self, bitrate_kbps_):
+        self.BITRATE_KBPS = bitrate_kbps_
+
+    def bitrate_kbps(self, time_ms):
+        return self.BITRATE_KBPS
+
+    def update(self, time_ms, overflowed):
+        pass
+
+class OnOffSource(object):
+
+    # Sends at bitrate_kbps_ during on periods, and nothing during off periods, starting on.
+    # Periods last on_duration_ms_ and off_duration_ms_, or are exponentially distributed
+    # with those means if exponential_ is set.
+    def __init__(self, bitrate_kbps_, on_duration_ms_, off_duration_ms_, exponential_=False, seed_=None):
+        self.BITRATE_KBPS = bitrate_kbps_
+        self.ON_DURATION_MS = on_duration_ms_
+        self.OFF_DURATION_MS = off_duration_ms_
+        self.EXPONENTIAL = exponential_
+        self.__rng = None
+        if self.EXPONENTIAL:
+            import numpy
+            self.__rng = numpy.random.default_rng(seed_)
+        self.__on = True
+        self.__switch_time_ms = self.__duration_ms(on_duration_ms_)
+
+    # Times are non decreasing.
+    def bitrate_kbps(self, time_ms):
+        while time_ms >= self.__switch_time_ms:
+            self.__on = not self.__on
+            self.__switch_time_ms += self.__duration_ms(self.ON_DURATION_MS if self.__on else self.OFF_DURATION_MS)
+        return self.BITRATE_KBPS if self.__on else 0.0
+
+    def update(self, time_ms, overflowed):
+        pass
+
+    def __duration_ms(self, mean_duration_ms):
+        if self.EXPONENTIAL:
+            return self.__rng.exponential(mean_duration_ms)
+        return mean_duration_ms
+
+class AimdSource(object):
+
+    # TCP-like: the bitrate grows by additive_increase_kbps_ every rtt_ms_, and is multiplied
+    # by decrease_factor_ when the queue overflows, at most once per rtt_ms_.
+    def __init__(self, initial_bitrate_kbps_, additive_increase_kbps_, rtt_ms_, decrease_factor_=0.5,
+                 min_bitrate_kbps_=10.0):
+        self.ADDITIVE_INCREASE_KBPS = additive_increase_kbps_
+        self.RTT_MS = rtt_ms_
+        self.DECREASE_FACTOR = decrease_factor_
+        self.MIN_BITRATE_KBPS = min_bitrate_kbps_
+        self.__bitrate_kbps = initial_bitrate_kbps_
+        self.__time_ms = 0.0
+        self.__latest_decrease_ms = -float("inf")
+
+    def bitrate_kbps(self, time_ms):
+        return self.__bitrate_kbps
+
+    def update(self, time_ms, overflowed):
+        if overflowed and time_ms - self.__latest_decrease_ms >= self.RTT_MS:
+            self.__bitrate_kbps = max(self.MIN_BITRATE_KBPS, self.DECREASE_FACTOR * self.__bitrate_kbps)
+            self.__latest_decrease_ms = time_ms
+        else:
+            self.__bitrate_kbps += self.ADDITIVE_INCREASE_KBPS * (time_ms - self.__time_ms) / self.RTT_MS
+        self.__time_ms = time_ms
+
+class CrossTraffic(object):
+
+    def __init__(self, sources_, step_ms_=1.0):
+        self.sources = sources_
+        self.STEP_MS = step_ms_
+        self.time_ms = 0.0
+
+    def drain_time_ms(self, last_choke_time_ms, time_ms, capacity_kbps, queue_size_ms):
+        """
+        Adds the cross traffic sent since the previous call, up to time_ms, to a queue
+        draining at last_choke_time_ms. Returns the time at which the queue now drains.
+        Times are non decreasing.
+        """
+        while self.time_ms < time_ms:
+            cell_start_ms = self.STEP_MS * math.floor(self.time_ms / self.STEP_MS)
+            end_time_ms = min(time_ms, cell_start_ms + self.STEP_MS)
+            bitrates_kbps = [source.bitrate_kbps(cell_start_ms) for source in self.sources]
+            last_choke_time_ms, overflowed = self.step(last_choke_time_ms, end_time_ms, bitrates_kbps,
+                                                       capacity_kbps, queue_size_ms)
+            self.time_ms = end_time_ms
+            for source in self.sources:
+                source.update(end_time_ms, overflowed)
+        return last_choke_time_ms
+
+    # Sends bitrates_kbps from self.time_ms to end_time_ms.
+    # Returns the new last choke time, and whether the queue overflowed.
+    def step(self, last_choke_time_ms, end_time_ms, bitrates_kbps, capacity_kbps, queue_size_ms):
+        raise NotImplementedError()
+
+class FluidCrossTraffic(CrossTraffic):
+
+    def step(self, last_choke_time_ms, end_time_ms, bitrates_kbps, capacity_kbps, queue_size_ms):
+        step_ms = end_time_ms - self.time_ms
+        backlog_ms = max(0.0, last_choke_time_ms - self.time_ms)
+        # The load of the step is admitted as long as the queue is not full, then served.
+        backlog_ms += sum(bitrates_kbps) * step_ms / capacity_kbps
+        overflowed = backlog_ms > queue_size_ms
+        backlog_ms = max(0.0, min(backlog_ms, queue_size_ms) - step_ms)
+        return end_time_ms + backlog_ms, overflowed
+
+class PacketCrossTraffic(CrossTraffic):
+
+    def __init__(self, sources_, packet_size_bytes_=1500.0, step_ms_=1.0):
+        super(PacketCrossTraffic, self).__init__(sources_, step_ms_)
+        self.PACKET_SIZE_BYTES = packet_size_bytes_
+        self.num_sent_packets = 0
+        self.num_lost_packets = 0
+        # Bits sent by each source, since its latest packet.
+        self.__pending_bits = [0.0] * len(sources_)
+
+    def step(self, last_choke_time_ms, end_time_ms, bitrates_kbps, capacity_kbps, queue_size_ms):
+        packet_bits = 8 * self.PACKET_SIZE_BYTES
+        send_times_ms = []
+        for i in range(len(bitrates_kbps)):
+            if bitrates_kbps[i] <= 0.0:
+                continue
+            sent_bits = self.__pending_bits[i] + bitrates_kbps[i] * (end_time_ms - self.time_ms)
+            num_packets = int(sent_bits // packet_bits)
+            # A packet is sent once all its bits are, at a constant bitrate during the step.
+            for j in range(1, num_packets + 1):
+                send_times_ms.append(self.time_ms + (j * packet_bits - self.__pending_bits[i]) / bitrates_kbps[i])
+            self.__pending_bits[i] = sent_bits - num_packets * packet_bits
+
+        travel_time_ms = packet_bits / capacity_kbps
+        overflowed = False
+        for send_time_ms in sorted(send_times_ms):
+            # Same as LinkSimulator choke filter.
+            updated_arrival_time_ms = max(last_choke_time_ms, send_time_ms) + travel_time_ms
+            self.num_sent_packets += 1
+            if updated_arrival_time_ms - send_time_ms < queue_size_ms:
+                last_choke_time_ms = updated_arrival_time_ms
+            else:
+                self.num_lost_packets += 1
+                overflowed = True
+        return last_choke_time_ms, overflowed
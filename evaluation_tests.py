@@ -1,48 +1,108 @@
-import matplotlib.pyplot as plt
+import time
 
-from link_simulator import LinkSimulator
-from bwe_utils import global_loss_ratio, average_bitrate_kbps, average_delay_ms
+from link_simulator import LinkSimulator, SharedBottleneckLink
+from event_simulator import simulate_flows
+from history import FullHistory
+from bwe_utils import global_loss_ratio, average_bitrate_kbps, average_delay_ms, jain_fairness_index
+from bwe_utils import SummaryAccumulator
 
 """
 Evaluation tests for congestion control algorithms.
+Results are printed, then plotted unless plot is False, and exported to trace_path if given.
+Per stage times and counters are printed too if stats, an instrumentation.SimulationStats, is given.
+Link realizations can be recorded, then replayed to compare senders on an identical path.
+Plotting and trace modules are imported only when used, matplotlib being slow to load.
 """
 
-def __plot(receiver, times_ms, capacities_kbps):
-    """
-    Plot results, called at the end of a simulation.
-    """
-    plt.subplot(311)
-    plt.plot([time_ms/1000.0 for time_ms in receiver.time_ms], receiver.receiving_rates_kbps, label='receiving rate')
-    plt.plot([time_ms/1000.0 for time_ms in [0.0]+times_ms], capacities_kbps[0:1]+capacities_kbps,
-             label='link capacity', drawstyle='steps')
-    plt.ylabel('bitrate (kbps)', fontsize=16)
-
-    plt.subplot(312)
-    plt.plot([time_ms/1000.0 for time_ms in receiver.time_ms], receiver.delay_signals_ms, 0, 350, label='delay signal')
-    plt.ylabel('delay (ms)', fontsize=16)
-
-    plt.subplot(313)
-    plt.plot([time_ms/1000.0 for time_ms in receiver.time_ms], [100.0*ratio for ratio in receiver.loss_ratios], 0, 100,
-             label='loss ratio')
-    plt.ylabel('packet loss %', fontsize=16)
-    plt.xlabel('time (s)', fontsize=16)
-    plt.show()
+# Link capacity schedules: capacities_kbps[i] is used until times_ms[i].
+RMCAT_EVALUATION_1_CAPACITIES_KBPS = [1000.0, 2500.0, 600.0, 1000.0]
+RMCAT_EVALUATION_1_TIMES_MS = [40000.0, 60000.0, 80000.0, 99000.0]
+DELAY_PERCENTILES = [50, 95, 99]
 
 def __print(receiver):
     """
     Output results:
-    Global packet loss and Average Metrics: bitrate and delay.
+    Global packet loss and Average Metrics: bitrate and delay, and delay percentiles.
+    Computed on all packets if the receiver has a summary, on the packets it retained otherwise.
     """
+    summary = getattr(receiver, 'summary', None)
+    if summary is not None:
+        print("Average bitrate (kbps)  =", summary.average_bitrate_kbps())
+        print("Average delay (ms)      =", summary.average_delay_ms())
+        print("Global packet loss      =", summary.global_loss_ratio())
+        for percentile in DELAY_PERCENTILES:
+            print("%-24s=" % ("p%d delay (ms)" % percentile), summary.delay_quantile_ms(percentile / 100.0))
+        return
+    if not isinstance(receiver.history, FullHistory):
+        print("Averages over the retained history only:")
     print("Average bitrate (kbps)  =", average_bitrate_kbps(receiver.packets))
     print("Average delay (ms)      =", average_delay_ms(receiver.packets))
     print("Global packet loss      =", global_loss_ratio(receiver.packets))
 
 
-def __test_single_flow(sender, receiver, times_ms, capacities_kbps, jitter):
+def simulate_single_flow(sender, receiver, times_ms, capacities_kbps, jitter, *, seed=None, reverse_path=None,
+                         cross_traffic=None, stats=None, record_path=None, realization=None, capacity_trace=None,
+                         train_duration_ms=None):
     """
     Simulates a RMCAT single flow on a variable capacity link.
+    Results are kept by the receiver. The seed sets the link's jitter.
+    Feedback reaches the sender immediately, unless a reverse_path is given: the flow is
+    then run by the discrete-event simulator.
+    cross_traffic, a cross_traffic.CrossTraffic, loads the bottleneck queue.
+    stats, an instrumentation.SimulationStats, records per stage times and event counters.
+    The link realization is recorded to record_path if given. A link_realization.LinkRealization
+    given as realization is replayed instead of drawing jitter: jitter and seed are then ignored.
+    A capacity_trace.CapacityTrace given as capacity_trace drives the link capacity, also within
+    packets' sending times: capacities_kbps is then ignored, and times_ms only sets the duration.
+    If train_duration_ms is given, packets sent within each train_duration_ms are simulated as a single
+    packet.PacketTrain, e.g. a video frame, for high bitrates. Trains aren't kept, hence the receiver
+    is given a bwe_utils.SummaryAccumulator if it has none. See the README for the drift from the
+    per packet simulation.
+    """
+    if train_duration_ms is not None and (reverse_path is not None or cross_traffic is not None
+                                          or capacity_trace is not None or record_path is not None
+                                          or realization is not None):
+        raise ValueError("Packet trains require immediate feedback, a constant capacity between trains, "
+                         "and a live link, without cross traffic.")
+    if capacity_trace is not None:
+        # A single scenario step, instead of as many as the trace has change points.
+        times_ms, capacities_kbps = times_ms[-1:], [None]
+    link_simulator = LinkSimulator(None, jitter, seed, cross_traffic_=cross_traffic, capacity_trace_=capacity_trace)
+    if record_path is not None:
+        link_simulator.record(record_path)
+    if realization is not None:
+        link_simulator.replay(realization)
+    if stats is not None:
+        from instrumentation import instrument
+        instrument(stats, sender, receiver, link_simulator)
+        start_s = time.perf_counter()
+
+    if train_duration_ms is not None:
+        if receiver.summary is None:
+            receiver.summary = SummaryAccumulator()
+        __simulate_single_flow_aggregated(sender, receiver, times_ms, capacities_kbps, link_simulator,
+                                          train_duration_ms)
+    elif reverse_path is not None:
+        simulate_flows([(sender, receiver)], link_simulator, times_ms, capacities_kbps, [reverse_path])
+    else:
+        __simulate_single_flow(sender, receiver, times_ms, capacities_kbps, link_simulator)
+
+    if stats is not None:
+        stats.add_call('total', time.perf_counter() - start_s)
+    if record_path is not None:
+        link_simulator.stop_recording()
+
+
+def __simulate_single_flow(sender, receiver, times_ms, capacities_kbps, link_simulator):
+    for feedback in feedback_loop(sender, receiver, times_ms, capacities_kbps, link_simulator):
+        pass
+
+
+def feedback_loop(sender, receiver, times_ms, capacities_kbps, link_simulator):
+    """
+    Per packet simulation loop, as a generator of the feedbacks, once the sender received them.
+    Nothing is kept besides the sender, receiver and link states, see streaming.py.
     """
-    link_simulator = LinkSimulator(None, jitter)
     now_ms = 0.0
 
     for i in range(len(capacities_kbps)):
@@ -56,24 +116,136 @@ def __test_single_flow(sender, receiver, times_ms, capacities_kbps, jitter):
             feedback = receiver.get_feedback()
             if feedback is not None:
                 sender.receive_feedback(feedback)
+                yield feedback
             now_ms = packet.send_time_ms
 
+
+def __simulate_single_flow_aggregated(sender, receiver, times_ms, capacities_kbps, link_simulator,
+                                      train_duration_ms):
+    """
+    Per train simulation loop. Trains don't span capacity changes: the last train before one is cut short.
+    """
+    now_ms = 0.0
+
+    for i in range(len(capacities_kbps)):
+        link_simulator.capacity_kbps = capacities_kbps[i]
+        end_time_ms = times_ms[i]
+        while now_ms < end_time_ms:
+            train = sender.create_train(min(train_duration_ms, end_time_ms - now_ms))
+            link_simulator.send_train(train)
+            if train.num_received > 0:
+                receiver.receive_train(train)
+                feedback = receiver.get_feedback()
+                if feedback is not None:
+                    sender.receive_feedback(feedback)
+            now_ms = train.last_send_time_ms
+
+
+def __test_single_flow(test_name, sender, receiver, times_ms, capacities_kbps, jitter, *, seed=None,
+                       reverse_path=None, cross_traffic=None, trace_path=None, plot=True, stats=None,
+                       record_path=None, realization=None, capacity_trace=None, train_duration_ms=None):
+    simulate_single_flow(sender, receiver, times_ms, capacities_kbps, jitter, seed=seed, reverse_path=reverse_path,
+                         cross_traffic=cross_traffic, stats=stats, record_path=record_path, realization=realization,
+                         capacity_trace=capacity_trace, train_duration_ms=train_duration_ms)
     __print(receiver)
-    __plot(receiver, times_ms, capacities_kbps)
+    if stats is not None:
+        stats.print_stats()
+    if trace_path is not None:
+        from traces import save_traces
+        metadata = {'test': test_name, 'sender': type(sender).__name__, 'receiver': type(receiver).__name__,
+                    'original_mode': getattr(sender, 'original_mode', None),
+                    'use_median_filter': getattr(receiver, 'use_median_filter', None),
+                    'history': type(receiver.history).__name__, 'jitter': jitter, 'seed': seed,
+                    'reverse_path': reverse_path is not None,
+                    'cross_traffic': None if cross_traffic is None else type(cross_traffic).__name__,
+                    'realization': None if realization is None else realization.path,
+                    'train_duration_ms': train_duration_ms,
+                    'average_bitrate_kbps': average_bitrate_kbps(receiver.packets),
+                    'average_delay_ms': average_delay_ms(receiver.packets),
+                    'global_loss_ratio': global_loss_ratio(receiver.packets)}
+        summary = getattr(receiver, 'summary', None)
+        if summary is not None:
+            metadata.update([('average_bitrate_kbps', summary.average_bitrate_kbps()),
+                             ('average_delay_ms', summary.average_delay_ms()),
+                             ('global_loss_ratio', summary.global_loss_ratio())])
+            metadata.update([('p%d_delay_ms' % percentile, summary.delay_quantile_ms(percentile / 100.0))
+                             for percentile in DELAY_PERCENTILES])
+        save_traces(trace_path, receiver, times_ms, capacities_kbps, metadata)
+    if plot:
+        from plot_traces import plot_traces
+        plot_traces(receiver, times_ms, capacities_kbps)
 
 
-def rmcat_evaluation_1(sender, receiver, jitter):
+def rmcat_evaluation_1(sender, receiver, jitter, *, seed=None, reverse_path=None, cross_traffic=None,
+                       trace_path=None, plot=True, stats=None, record_path=None, realization=None,
+                       train_duration_ms=None):
     """
     RMCAT Evaluation test 5.1, available here:
     https://tools.ietf.org/html/draft-ietf-rmcat-eval-test-02#section-5.1
     """
-    capacities_kbps = [1000.0, 2500.0, 600.0, 1000.0]
-    times_ms =  [40000.0, 60000.0, 80000.0, 99000.0]
-    __test_single_flow(sender, receiver, times_ms, capacities_kbps, jitter)
+    __test_single_flow('rmcat_evaluation_1', sender, receiver, RMCAT_EVALUATION_1_TIMES_MS,
+                       RMCAT_EVALUATION_1_CAPACITIES_KBPS, jitter, seed=seed, reverse_path=reverse_path,
+                       cross_traffic=cross_traffic, trace_path=trace_path, plot=plot, stats=stats,
+                       record_path=record_path, realization=realization, train_duration_ms=train_duration_ms)
 
 
-def test_constant_capacity(sender, receiver, duration_s, capacity_kbps, jitter):
+def test_constant_capacity(sender, receiver, duration_s, capacity_kbps, jitter, *, seed=None,
+                           reverse_path=None, cross_traffic=None, trace_path=None, plot=True, stats=None,
+                           record_path=None, realization=None, train_duration_ms=None):
     """
     Simple test for a single flow on a constant capacity testbed.
     """
-    __test_single_flow(sender, receiver, [duration_s * 1000.0], [capacity_kbps], jitter)
+    __test_single_flow('constant_capacity', sender, receiver, [duration_s * 1000.0], [capacity_kbps], jitter,
+                       seed=seed, reverse_path=reverse_path, cross_traffic=cross_traffic, trace_path=trace_path,
+                       plot=plot, stats=stats, record_path=record_path, realization=realization,
+                       train_duration_ms=train_duration_ms)
+
+
+def test_capacity_trace(sender, receiver, capacity_trace, jitter, *, seed=None, reverse_path=None, trace_path=None,
+                        plot=True, stats=None, record_path=None, realization=None):
+    """
+    Single flow on a link following a capacity trace, e.g. measured on a cellular network,
+    until the end of the trace.
+    """
+    times_ms, capacities_kbps = capacity_trace.schedule()
+    __test_single_flow('capacity_trace', sender, receiver, times_ms, capacities_kbps, jitter, seed=seed,
+                       reverse_path=reverse_path, trace_path=trace_path, plot=plot, stats=stats,
+                       record_path=record_path, realization=realization, capacity_trace=capacity_trace)
+
+
+def simulate_competing_flows(flows, times_ms, capacities_kbps, jitter, seed=None, queue_size_bytes=None,
+                             reverse_paths=None, cross_traffic=None):
+    """
+    Simulates flows, a list of (sender, receiver) pairs, competing for a variable capacity
+    bottleneck, through a single FIFO queue limited in time, or in bytes if queue_size_bytes is given.
+    Returns the SharedBottleneckLink, holding per flow throughput, delay and losses.
+    """
+    shared_link = SharedBottleneckLink(LinkSimulator(None, jitter, seed, queue_size_bytes, cross_traffic),
+                                       len(flows))
+    simulate_flows(flows, shared_link, times_ms, capacities_kbps, reverse_paths)
+    return shared_link
+
+
+def __print_flows(shared_link):
+    """
+    Output per flow average bitrate, delay and loss ratio, and the bitrates fairness.
+    """
+    print("%6s %22s %22s %22s" % ("flow", "Average bitrate (kbps)", "Average delay (ms)", "Packet loss"))
+    for flow_id in range(shared_link.num_flows):
+        print("%6d %22.2f %22.2f %22.4f" % (flow_id, shared_link.average_bitrate_kbps(flow_id),
+                                            shared_link.average_delay_ms(flow_id),
+                                            shared_link.loss_ratio(flow_id)))
+    bitrates_kbps = [shared_link.average_bitrate_kbps(flow_id) for flow_id in range(shared_link.num_flows)]
+    print("Jain fairness index     =", jain_fairness_index(bitrates_kbps))
+
+
+def test_competing_flows(flows, times_ms, capacities_kbps, jitter, seed=None, queue_size_bytes=None,
+                         reverse_paths=None, cross_traffic=None):
+    """
+    Several RMCAT flows sharing a bottleneck, as in RMCAT Evaluation test 5.2 and following:
+    https://tools.ietf.org/html/draft-ietf-rmcat-eval-test-02#section-5.2
+    All flows start at the same time.
+    """
+    shared_link = simulate_competing_flows(flows, times_ms, capacities_kbps, jitter, seed, queue_size_bytes,
+                                           reverse_paths, cross_traffic)
+    __print_flows(shared_link)
@@ -0,0 +1,87 @@
+import unittest
+import os
+import random
+import tempfile
+
+from nada import NadaSender, NadaReceiver
+from history import RecentHistory, DecimatedHistory, NoHistory
+from bwe_utils import SummaryAccumulator
+from evaluation_tests import simulate_single_flow, RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS
+from link_realization import load_realization
+from capacity_trace import from_schedule
+
+"""
+Unittests for the evaluation tests simulation loop.
+"""
+
+class TestEvaluationTests(unittest.TestCase):
+
+    def assertNear(self, x, y, precision):
+        self.assertTrue(abs(x-y) < precision)
+
+    def simulate(self, seed, original_mode, use_median_filter, jitter):
+        sender = NadaSender(original_mode)
+        receiver = NadaReceiver(use_median_filter)
+        simulate_single_flow(sender, receiver, [5000.0, 10000.0], [1500.0, 500.0], jitter, seed=seed)
+        return receiver
+
+    # Feedback doesn't depend on the retained history.
+    def test_bounded_history(self):
+        for history in [RecentHistory(1.0), DecimatedHistory(100.0), DecimatedHistory(100.0, columnar=True)]:
+            seed = random.randint(0, 10**6)
+            receiver = self.simulate(seed, True, True, 2)
+            bounded_receiver = NadaReceiver(True, history_=history)
+            simulate_single_flow(NadaSender(True), bounded_receiver, [5000.0, 10000.0], [1500.0, 500.0], 2,
+                                 seed=seed)
+            # Retained values are a subset of the full history.
+            rates_kbps = dict(zip([p.id for p in receiver.packets], receiver.receiving_rates_kbps))
+            for packet, rate_kbps in zip(bounded_receiver.packets, bounded_receiver.receiving_rates_kbps):
+                self.assertEqual(rates_kbps[packet.id], rate_kbps)
+            self.assertTrue(len(bounded_receiver.packets) < len(receiver.packets) / 5)
+            self.assertEqual(len(bounded_receiver.packets), len(bounded_receiver.congestion_signals_ms))
+
+    def test_replayed_realization(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        seed = random.randint(0, 10**6)
+        receiver = NadaReceiver(True)
+        simulate_single_flow(NadaSender(True), receiver, [5000.0, 10000.0], [1500.0, 500.0], 2, seed=seed,
+                             record_path=path)
+        realization = load_realization(path)
+        replay_receiver = NadaReceiver(True)
+        simulate_single_flow(NadaSender(True), replay_receiver, [5000.0, 10000.0], [1500.0, 500.0], 0,
+                             realization=realization)
+        self.assertEqual([p.id for p in receiver.packets], [p.id for p in replay_receiver.packets])
+        for time_ms, replay_time_ms in zip(receiver.time_ms, replay_receiver.time_ms):
+            self.assertNear(time_ms, replay_time_ms, 1e-6)
+        # Another sender on the same path.
+        simulate_single_flow(NadaSender(False), NadaReceiver(True), [5000.0, 10000.0], [1500.0, 500.0], 0,
+                             realization=realization)
+        del realization
+        os.remove(path)
+
+    # Drift of the whole run metrics of packet trains, from the per packet simulation, at 10 times the
+    # RMCAT Evaluation test 5.1 capacities. See the README for the modified sender with jitter.
+    def test_packet_trains_drift(self):
+        SCALE = 10.0
+        capacities_kbps = [SCALE * capacity_kbps for capacity_kbps in RMCAT_EVALUATION_1_CAPACITIES_KBPS]
+        for original_mode, jitter in [(True, 0), (True, 1), (False, 0)]:
+            seed = random.randint(0, 10**6)
+            summaries = []
+            for train_duration_ms in [None, 33.3]:
+                receiver = NadaReceiver(True, history_=NoHistory(), summary_=SummaryAccumulator())
+                simulate_single_flow(NadaSender(original_mode, SCALE * NadaSender.MAX_BITRATE_KBPS), receiver,
+                                     RMCAT_EVALUATION_1_TIMES_MS, capacities_kbps, jitter, seed=seed,
+                                     train_duration_ms=train_duration_ms)
+                summaries.append(receiver.summary)
+            summary, train_summary = summaries
+            self.assertNear(train_summary.average_bitrate_kbps() / summary.average_bitrate_kbps(), 1.0, 0.05)
+            self.assertNear(train_summary.average_delay_ms(), summary.average_delay_ms(), 10.0)
+            self.assertNear(train_summary.global_loss_ratio(), summary.global_loss_ratio(), 0.01)
+        with self.assertRaises(ValueError):
+            simulate_single_flow(NadaSender(True), NadaReceiver(True), [1000.0], [1000.0], 1,
+                                 capacity_trace=from_schedule([1000.0], [1000.0]), train_duration_ms=33.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
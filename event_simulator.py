@@ -0,0 +1,112 @@
+import heapq
+
+from link_simulator import SharedBottleneckLink
+
+"""
+Discrete-event simulation core.
+Events are kept in a heap, ordered by time, and the clock jumps straight to
+the next one. Simultaneous events run in the order they were scheduled.
+Senders, links and receivers are scheduled entities:
+-- A FlowSource sends its sender's packets through the link at their send times.
+-- A FlowSink delivers packets to its receiver at their arrival times, and sends
+   feedback back to the sender through a ReversePath, with its own delay, loss and jitter.
+The link computes arrival times when packets are sent, hence it is driven by the sources,
+in send time order, even with several flows sharing it.
+The heap holds a few events per flow, hence each packet costs O(log N) with N flows.
+"""
+
+class EventScheduler(object):
+
+    def __init__(self):
+        self.now_ms = 0.0
+        self.num_processed_events = 0
+        self.__events = []
+        self.__num_scheduled_events = 0  # Breaks ties between simultaneous events.
+
+    def schedule(self, time_ms, callback, argument=None):
+        heapq.heappush(self.__events, (time_ms, self.__num_scheduled_events, callback, argument))
+        self.__num_scheduled_events += 1
+
+    def run(self):
+        events = self.__events
+        heappop = heapq.heappop
+        while events:
+            time_ms, _, callback, argument = heappop(events)
+            self.now_ms = time_ms
+            callback(argument)
+            self.num_processed_events += 1
+
+class FlowSource(object):
+
+    # Packets are created when the previous one is sent, with the bitrate at that time.
+    def __init__(self, scheduler_, sender_, link_simulator_, sink_, end_time_ms_):
+        self.scheduler = scheduler_
+        self.sender = sender_
+        self.link_simulator = link_simulator_
+        self.sink = sink_
+        self.end_time_ms = end_time_ms_
+
+    def start(self):
+        packet = self.sender.create_packet()
+        self.scheduler.schedule(packet.send_time_ms, self.send_packet, packet)
+
+    def send_packet(self, packet):
+        self.link_simulator.send_packet(packet)
+        if packet.arrival_time_ms is not None:
+            self.scheduler.schedule(packet.arrival_time_ms, self.sink.receive_packet, packet)
+        if packet.send_time_ms < self.end_time_ms:
+            next_packet = self.sender.create_packet()
+            self.scheduler.schedule(next_packet.send_time_ms, self.send_packet, next_packet)
+
+    def receive_feedback(self, feedback):
+        self.sender.receive_feedback(feedback)
+
+class FlowSink(object):
+
+    # A None reverse_path delivers feedback to the source without delay.
+    def __init__(self, scheduler_, receiver_, reverse_path_):
+        self.scheduler = scheduler_
+        self.receiver = receiver_
+        self.reverse_path = reverse_path_
+        self.source = None
+
+    def receive_packet(self, packet):
+        self.receiver.receive_packet(packet)
+        feedback = self.receiver.get_feedback()
+        if feedback is None:
+            return
+        if self.reverse_path is None:
+            self.source.receive_feedback(feedback)
+            return
+        arrival_time_ms = self.reverse_path.send_feedback(self.scheduler.now_ms)
+        if arrival_time_ms is not None:
+            self.scheduler.schedule(arrival_time_ms, self.source.receive_feedback, feedback)
+
+def simulate_flows(flows, link_simulator, times_ms, capacities_kbps, reverse_paths=None, scheduler=None):
+    """
+    Simulates flows, a list of (sender, receiver) pairs, sharing link_simulator, whose
+    capacity is capacities_kbps[i] until times_ms[i]. reverse_paths holds a ReversePath,
+    or None, per flow. Results are kept by the receivers.
+    link_simulator may be a SharedBottleneckLink, for per flow accounting, flows are then
+    numbered in order.
+    Returns the scheduler, e.g. for its number of processed events.
+    """
+    scheduler = scheduler or EventScheduler()
+    link_simulator.capacity_kbps = capacities_kbps[0]
+    for i in range(1, len(capacities_kbps)):
+        scheduler.schedule(times_ms[i-1], __set_capacity, (link_simulator, capacities_kbps[i]))
+
+    for i in range(len(flows)):
+        sender, receiver = flows[i]
+        sink = FlowSink(scheduler, receiver, None if reverse_paths is None else reverse_paths[i])
+        link = link_simulator.port(i) if isinstance(link_simulator, SharedBottleneckLink) else link_simulator
+        source = FlowSource(scheduler, sender, link, sink, times_ms[-1])
+        sink.source = source
+        source.start()
+
+    scheduler.run()
+    return scheduler
+
+def __set_capacity(argument):
+    link_simulator, capacity_kbps = argument
+    link_simulator.capacity_kbps = capacity_kbps
@@ -0,0 +1,94 @@
+import unittest
+import random
+
+from nada import NadaSender, NadaReceiver
+from link_simulator import LinkSimulator, ReversePath, SharedBottleneckLink
+from bwe_utils import average_bitrate_kbps, average_delay_ms, jain_fairness_index
+from event_simulator import EventScheduler, simulate_flows
+
+"""
+Unittests for the discrete-event simulator.
+"""
+
+class TestEventSimulator(unittest.TestCase):
+
+    def test_events_order(self):
+        scheduler = EventScheduler()
+        processed = []
+        times_ms = [random.choice([1.0, 2.0, random.uniform(0.0, 10.0)]) for i in range(1000)]
+        for i in range(len(times_ms)):
+            scheduler.schedule(times_ms[i], processed.append, (times_ms[i], i))
+        scheduler.run()
+        # Sorted by time, then by scheduling order.
+        self.assertEqual(processed, sorted(processed))
+        self.assertEqual(scheduler.num_processed_events, len(times_ms))
+        self.assertEqual(scheduler.now_ms, max(times_ms))
+
+    def test_events_scheduled_while_running(self):
+        scheduler = EventScheduler()
+        processed_times_ms = []
+        def callback(count):
+            processed_times_ms.append(scheduler.now_ms)
+            if count > 0:
+                scheduler.schedule(scheduler.now_ms + 10.0, callback, count - 1)
+        scheduler.schedule(0.0, callback, 5)
+        scheduler.run()
+        self.assertEqual(processed_times_ms, [0.0, 10.0, 20.0, 30.0, 40.0, 50.0])
+
+    def test_feedback_path_delay(self):
+        feedback_delay_ms = random.uniform(10.0, 100.0)
+        seed = random.randint(0, 10**6)
+        scheduler = EventScheduler()
+        sender = NadaSender(True)
+        receiver = NadaReceiver(True)
+        generated_times_ms = []
+        received_times_ms = []
+        # Record when feedback is generated by the receiver, and when it reaches the sender.
+        get_feedback = receiver.get_feedback
+        def recorded_get_feedback():
+            feedback = get_feedback()
+            if feedback is not None:
+                generated_times_ms.append(receiver.latest_feedback_ms)
+            return feedback
+        receiver.get_feedback = recorded_get_feedback
+        receive_feedback = sender.receive_feedback
+        def recorded_receive_feedback(feedback):
+            received_times_ms.append(scheduler.now_ms)
+            receive_feedback(feedback)
+        sender.receive_feedback = recorded_receive_feedback
+
+        simulate_flows([(sender, receiver)], LinkSimulator(None, 1, seed), [5000.0], [1000.0],
+                       [ReversePath(feedback_delay_ms, 0.0, 0)], scheduler)
+        self.assertTrue(len(received_times_ms) > 10)
+        for generated_time_ms, received_time_ms in zip(generated_times_ms, received_times_ms):
+            self.assertAlmostEqual(received_time_ms - generated_time_ms, feedback_delay_ms)
+        # Last feedback might still be on its way.
+        self.assertTrue(len(generated_times_ms) - len(received_times_ms) <= 1)
+
+    def test_feedback_path_loss(self):
+        sender = NadaSender(True)
+        receiver = NadaReceiver(True)
+        simulate_flows([(sender, receiver)], LinkSimulator(None, 0), [5000.0], [1000.0],
+                       [ReversePath(10.0, 1.0, 0)])
+        # Without feedback, the sender keeps its initial bitrate.
+        self.assertEqual(sender.bitrate_kbps, 300.0)
+
+    def test_shared_bottleneck(self):
+        num_flows = 4
+        flows = [(NadaSender(True), NadaReceiver(True)) for i in range(num_flows)]
+        shared_link = SharedBottleneckLink(LinkSimulator(None, 1, random.randint(0, 10**6)), num_flows)
+        simulate_flows(flows, shared_link, [30000.0], [num_flows * 1000.0])
+        bitrates_kbps = []
+        for flow_id in range(num_flows):
+            packets = flows[flow_id][1].packets
+            self.assertEqual(shared_link.num_sent_packets[flow_id] - shared_link.num_lost_packets[flow_id],
+                             len(packets))
+            self.assertAlmostEqual(shared_link.average_bitrate_kbps(flow_id), average_bitrate_kbps(packets))
+            self.assertAlmostEqual(shared_link.average_delay_ms(flow_id), average_delay_ms(packets))
+            bitrates_kbps.append(shared_link.average_bitrate_kbps(flow_id))
+        self.assertTrue(sum(bitrates_kbps) <= num_flows * 1000.0)
+        self.assertTrue(1.0 / num_flows <= jain_fairness_index(bitrates_kbps) <= 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+from array import array
+from collections import deque
+
+from packet import PacketStore
+
+"""
+Retention policies for the values a receiver stores to be printed and plotted
+at the end of a simulation. Estimators only need their own time windows, hence
+long simulations can keep a bounded history:
+-- FullHistory keeps every value.
+-- RecentHistory keeps the values of the latest duration_s seconds, in ring buffers.
+-- DecimatedHistory keeps one value every sample_interval_ms.
+-- NoHistory keeps no value, e.g. for streaming simulations, see streaming.py.
+Columnar histories store values in typed arrays and packets in a PacketStore,
+instead of lists of Python objects.
+"""
+
+class FullHistory(object):
+
+    def __init__(self, columnar=False):
+        self.columnar = columnar
+
+    def new_series(self):
+        return array('d') if self.columnar else []
+
+    def new_packet_series(self):
+        return PacketStore() if self.columnar else []
+
+    def should_record(self, time_ms):
+        return True
+
+    def evict(self, time_series_ms, all_series, time_ms):
+        pass
+
+class RecentHistory(object):
+
+    def __init__(self, duration_s):
+        self.duration_ms = 1000.0 * duration_s
+
+    def new_series(self):
+        return deque()
+
+    def new_packet_series(self):
+        return deque()
+
+    def should_record(self, time_ms):
+        return True
+
+    # time_series_ms holds the timestamps, all series are evicted in lockstep.
+    def evict(self, time_series_ms, all_series, time_ms):
+        time_limit_ms = time_ms - self.duration_ms
+        while time_series_ms and time_series_ms[0] < time_limit_ms:
+            for series in all_series:
+                series.popleft()
+
+class DecimatedHistory(object):
+
+    def __init__(self, sample_interval_ms, columnar=False):
+        self.sample_interval_ms = sample_interval_ms
+        self.columnar = columnar
+        self.__latest_sample_ms = None
+
+    def new_series(self):
+        return array('d') if self.columnar else []
+
+    def new_packet_series(self):
+        return PacketStore() if self.columnar else []
+
+    def should_record(self, time_ms):
+        if self.__latest_sample_ms is not None \
+           and time_ms - self.__latest_sample_ms < self.sample_interval_ms:
+            return False
+        self.__latest_sample_ms = time_ms
+        return True
+
+    def evict(self, time_series_ms, all_series, time_ms):
+        pass
+
+class NoHistory(object):
+
+    def new_series(self):
+        return []
+
+    def new_packet_series(self):
+        return []
+
+    def should_record(self, time_ms):
+        return False
+
+    def evict(self, time_series_ms, all_series, time_ms):
+        pass
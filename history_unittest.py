@@ -0,0 +1,45 @@
+import unittest
+
+from history import FullHistory, RecentHistory, DecimatedHistory, NoHistory
+
+"""
+Unittests for the history retention policies.
+"""
+
+class TestHistory(unittest.TestCase):
+
+    def record(self, history, times_ms):
+        time_series_ms = history.new_series()
+        values = history.new_series()
+        for time_ms in times_ms:
+            if history.should_record(time_ms):
+                time_series_ms.append(time_ms)
+                values.append(-time_ms)
+                history.evict(time_series_ms, [time_series_ms, values], time_ms)
+        return list(time_series_ms), list(values)
+
+    def test_full_history(self):
+        times_ms = [0.5 * i for i in range(1000)]
+        time_series_ms, values = self.record(FullHistory(), times_ms)
+        self.assertEqual(time_series_ms, times_ms)
+        self.assertEqual(values, [-time_ms for time_ms in times_ms])
+
+    def test_recent_history(self):
+        times_ms = [0.5 * i for i in range(10000)]
+        time_series_ms, values = self.record(RecentHistory(1.0), times_ms)
+        self.assertEqual(time_series_ms, [time_ms for time_ms in times_ms if time_ms >= times_ms[-1] - 1000.0])
+        self.assertEqual(values, [-time_ms for time_ms in time_series_ms])
+
+    def test_decimated_history(self):
+        times_ms = [0.5 * i for i in range(10000)]
+        time_series_ms, values = self.record(DecimatedHistory(100.0), times_ms)
+        self.assertEqual(time_series_ms, [100.0 * i for i in range(50)])
+        self.assertEqual(values, [-time_ms for time_ms in time_series_ms])
+
+    def test_no_history(self):
+        times_ms = [0.5 * i for i in range(1000)]
+        self.assertEqual(self.record(NoHistory(), times_ms), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
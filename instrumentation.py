@@ -0,0 +1,102 @@
+import json
+import time
+from collections import OrderedDict
+
+from nada import NadaSender, NadaReceiver
+
+"""
+Optional instrumentation of a simulation: per stage cumulative time and call counts,
+and event counters, e.g. packets dropped by the choke filter, feedbacks and NADA sender branches.
+Instrumenting replaces methods of the given sender, receiver and link instances by timed
+wrappers, private stages included. Classes are left untouched: without instrumentation,
+a simulation runs the exact same code, at no cost.
+"""
+
+class SimulationStats(object):
+
+    def __init__(self):
+        self.stage_times_s = OrderedDict()
+        self.call_counts = OrderedDict()
+        self.counters = OrderedDict()
+
+    def add_call(self, stage, elapsed_s):
+        if stage not in self.call_counts:
+            self.stage_times_s[stage] = 0.0
+            self.call_counts[stage] = 0
+        self.stage_times_s[stage] += elapsed_s
+        self.call_counts[stage] += 1
+
+    def increment(self, counter, count=1):
+        self.counters[counter] = self.counters.get(counter, 0) + count
+
+    def to_dict(self):
+        return {'stage_times_s': self.stage_times_s, 'call_counts': self.call_counts, 'counters': self.counters}
+
+    def dump(self, path):
+        with open(path, 'w') as stats_file:
+            json.dump(self.to_dict(), stats_file, indent=2)
+
+    def print_stats(self):
+        """
+        Stages are nested, e.g. receiver filters run within receiver.receive_packet.
+        """
+        print("%36s %12s %12s %14s" % ("stage", "time (s)", "calls", "us/call"))
+        for stage, time_s in self.stage_times_s.items():
+            num_calls = self.call_counts[stage]
+            print("%36s %12.3f %12d %14.2f" % (stage, time_s, num_calls, 1e6 * time_s / max(1, num_calls)))
+        for counter, count in self.counters.items():
+            print("%36s %12d" % (counter, count))
+
+def instrument(stats, sender=None, receiver=None, link_simulator=None):
+    """
+    Records the stages and counters of the given instances into stats.
+    """
+    if link_simulator is not None:
+        __wrap(stats, link_simulator, 'send_packet', 'link.send_packet', __count_choke_drop)
+    if isinstance(receiver, NadaReceiver):
+        __wrap(stats, receiver, 'receive_packet', 'receiver.receive_packet', __count_received_packet)
+        __wrap(stats, receiver, 'get_feedback', 'receiver.get_feedback', __count_feedback)
+        __wrap(stats, receiver, '_NadaReceiver__median_filter', 'receiver.delay_filter')
+        __wrap(stats, receiver, '_NadaReceiver__exp_smoothing_filter', 'receiver.exp_smoothing_filter')
+        __wrap(stats, receiver, '_NadaReceiver__non_linear_warping', 'receiver.non_linear_warping')
+        __wrap(stats, receiver, '_NadaReceiver__compute_loss_ratio', 'receiver.loss_ratio')
+        __wrap(stats, receiver, '_NadaReceiver__compute_receiving_rate_kbps', 'receiver.receiving_rate')
+    if isinstance(sender, NadaSender):
+        __wrap(stats, sender, 'create_packet', 'sender.create_packet')
+        __wrap(stats, sender, 'receive_feedback', 'sender.receive_feedback')
+        __wrap(stats, sender, '_NadaSender__accelerated_ramp_up', 'sender.accelerated_ramp_up',
+               __counter('accelerated_ramp_up'))
+        __wrap(stats, sender, '_NadaSender__accelerated_ramp_down', 'sender.accelerated_ramp_down',
+               __counter('accelerated_ramp_down'))
+        __wrap(stats, sender, '_NadaSender__gradual_rate_update', 'sender.gradual_rate_update',
+               __counter('gradual_rate_update'))
+
+# Replaces instance.name by a wrapper timing it, and calling count(stats, args, result) if given.
+def __wrap(stats, instance, name, stage, count=None):
+    method = getattr(instance, name)
+    perf_counter = time.perf_counter
+    def timed_method(*args):
+        start_s = perf_counter()
+        result = method(*args)
+        stats.add_call(stage, perf_counter() - start_s)
+        if count is not None:
+            count(stats, args, result)
+        return result
+    setattr(instance, name, timed_method)
+
+def __counter(counter):
+    def count(stats, args, result):
+        stats.increment(counter)
+    return count
+
+def __count_choke_drop(stats, args, result):
+    stats.increment('packets_sent')
+    if args[0].arrival_time_ms is None:
+        stats.increment('choke_drops')
+
+def __count_received_packet(stats, args, result):
+    stats.increment('packets_received')
+
+def __count_feedback(stats, args, result):
+    if result is not None:
+        stats.increment('feedbacks')
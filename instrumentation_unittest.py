@@ -0,0 +1,55 @@
+import unittest
+import random
+
+from nada import NadaSender, NadaReceiver
+from evaluation_tests import simulate_single_flow
+from instrumentation import SimulationStats
+
+"""
+Unittests for simulation instrumentation.
+"""
+
+TIMES_MS = [2000.0, 4000.0]
+CAPACITIES_KBPS = [1500.0, 500.0]
+
+class TestInstrumentation(unittest.TestCase):
+
+    def simulate(self, seed, stats=None):
+        sender = NadaSender(True)
+        receiver = NadaReceiver(True)
+        simulate_single_flow(sender, receiver, TIMES_MS, CAPACITIES_KBPS, 1, seed=seed, stats=stats)
+        return sender, receiver
+
+    def test_counters(self):
+        stats = SimulationStats()
+        sender, receiver = self.simulate(random.randint(0, 10**6), stats)
+        counters = stats.counters
+        self.assertEqual(counters['packets_received'], len(receiver.packets))
+        self.assertEqual(counters['packets_sent'] - counters.get('choke_drops', 0), len(receiver.packets))
+        self.assertEqual(counters['feedbacks'], stats.call_counts['sender.receive_feedback'])
+        num_updates = sum([counters.get(branch, 0) for branch in
+                           ['accelerated_ramp_up', 'accelerated_ramp_down', 'gradual_rate_update']])
+        self.assertEqual(num_updates, counters['feedbacks'])
+        self.assertEqual(stats.call_counts['receiver.delay_filter'], len(receiver.packets))
+        self.assertEqual(stats.call_counts['total'], 1)
+        for stage, time_s in stats.stage_times_s.items():
+            self.assertGreaterEqual(time_s, 0.0)
+            self.assertLessEqual(time_s, stats.stage_times_s['total'])
+
+    def test_same_results(self):
+        seed = random.randint(0, 10**6)
+        _, receiver = self.simulate(seed)
+        _, instrumented_receiver = self.simulate(seed, SimulationStats())
+        self.assertEqual(list(instrumented_receiver.receiving_rates_kbps), list(receiver.receiving_rates_kbps))
+        self.assertEqual(list(instrumented_receiver.delay_signals_ms), list(receiver.delay_signals_ms))
+
+    def test_classes_untouched(self):
+        self.simulate(0, SimulationStats())
+        sender, receiver = NadaSender(True), NadaReceiver(True)
+        self.assertNotIn('create_packet', vars(sender))
+        self.assertNotIn('receive_packet', vars(receiver))
+        self.assertEqual(NadaSender.create_packet.__name__, 'create_packet')
+
+
+if __name__ == '__main__':
+    unittest.main()
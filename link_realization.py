@@ -0,0 +1,86 @@
+import json
+import struct
+
+import numpy
+
+"""
+Link realizations: the jitter samples drawn by a link and its capacity timeline, recorded
+to a file so that the exact same network conditions can be replayed, e.g. to compare two
+sender variants on an identical path. Losses follow, the queue being deterministic.
+A realization file is a fixed size header, then little endian float64 arrays, and JSON metadata:
+    magic | num jitter samples | num capacities | metadata size | padding
+    jitter samples (ms) | capacity times (ms) | capacities (kbps) | metadata
+Jitter samples are written block by block while recording. Replays memory map the arrays:
+nothing is read before being used, and several links can replay a single file.
+e.g. LinkSimulator.record(path), later LinkSimulator.replay(load_realization(path))
+"""
+
+MAGIC = b'LINKREAL'
+HEADER = struct.Struct('<8sqqq')
+HEADER_SIZE_BYTES = 64
+SAMPLE_DTYPE = '<f8'
+SAMPLE_SIZE_BYTES = 8
+
+class LinkRecorder(object):
+
+    # metadata is a dict describing the link, non JSON values are saved as strings.
+    def __init__(self, path_, metadata_):
+        self.path = path_
+        self.metadata = metadata_
+        self.num_jitter_samples = 0
+        self.capacity_times_ms = []
+        self.capacities_kbps = []
+        self.__file = open(path_, 'wb')
+        self.__file.write(b'\0' * HEADER_SIZE_BYTES)  # Written on close, once sizes are known.
+
+    def add_jitter_samples(self, samples_ms):
+        numpy.asarray(samples_ms, dtype=SAMPLE_DTYPE).tofile(self.__file)
+        self.num_jitter_samples += len(samples_ms)
+
+    # capacity_kbps is used for packets sent at or after time_ms.
+    def add_capacity(self, time_ms, capacity_kbps):
+        self.capacity_times_ms.append(time_ms)
+        self.capacities_kbps.append(capacity_kbps)
+
+    def close(self):
+        numpy.asarray(self.capacity_times_ms, dtype=SAMPLE_DTYPE).tofile(self.__file)
+        numpy.asarray(self.capacities_kbps, dtype=SAMPLE_DTYPE).tofile(self.__file)
+        metadata = json.dumps(self.metadata, sort_keys=True, default=str).encode('utf-8')
+        self.__file.write(metadata)
+        self.__file.seek(0)
+        self.__file.write(HEADER.pack(MAGIC, self.num_jitter_samples, len(self.capacities_kbps), len(metadata)))
+        self.__file.close()
+
+class LinkRealization(object):
+
+    # Arrays are read only memory maps of the realization file.
+    def __init__(self, path_):
+        with open(path_, 'rb') as realization_file:
+            magic, num_jitter_samples, num_capacities, metadata_size = \
+                HEADER.unpack(realization_file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("%s is not a link realization file." % path_)
+            realization_file.seek(HEADER_SIZE_BYTES + SAMPLE_SIZE_BYTES * (num_jitter_samples + 2 * num_capacities))
+            self.metadata = json.loads(realization_file.read(metadata_size).decode('utf-8'))
+        self.path = path_
+        self.jitter_samples_ms = self.__array(num_jitter_samples, 0)
+        self.capacity_times_ms = self.__array(num_capacities, num_jitter_samples)
+        self.capacities_kbps = self.__array(num_capacities, num_jitter_samples + num_capacities)
+
+    # Read only, hence shared by copies of the links replaying it, and pickled as its path,
+    # to be memory mapped again, e.g. by a worker restoring a snapshot, see snapshot.py.
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (LinkRealization, (self.path,))
+
+    # numpy.memmap doesn't support empty arrays.
+    def __array(self, num_samples, first_sample):
+        if num_samples == 0:
+            return numpy.zeros(0, dtype=SAMPLE_DTYPE)
+        return numpy.memmap(self.path, dtype=SAMPLE_DTYPE, mode='r', shape=(num_samples,),
+                            offset=HEADER_SIZE_BYTES + SAMPLE_SIZE_BYTES * first_sample)
+
+def load_realization(path):
+    return LinkRealization(path)
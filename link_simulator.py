@@ -1,32 +1,161 @@
-import random
+import math
+from collections import deque
 
 """
 Simulates a network link.
 The arrival time is computed based on the send_time and three factors:
 -- The one-way-path-delay, the minimum trip time from one end to another.
 -- The sending time, corresponding to the payload_size divided by the link capacity.
+   Capacity is set between packets, or follows a capacity trace, within packets' sending times too,
+   on the bottleneck's clock: after the one-way-path-delay.
+   Packets wait in a FIFO bottleneck queue, limited either in time (queuing delay)
+   or in bytes, and are lost when it overflows. Cross traffic may load the queue too.
 -- Jitter, simulated as a truncated right sided Gaussian distribution.
+Each link owns its random generator, seeded explicitly for reproducible runs.
+Jitter samples are generated in blocks, and consumed one per received packet.
+High bitrates can be simulated per packet train instead, see send_train.
+numpy is imported lazily, by jitter generation: runs without jitter don't load it.
+A link realization, its jitter samples and capacity timeline, can be recorded to a file,
+then replayed instead of drawing jitter: see link_realization.
+Several links can share a JitterStream instead, in a single process, e.g. to run controllers
+on common random numbers, see paired_evaluation.
 """
 
+def jitter_parameters_ms(jitter_intensity):
+    """
+    Returns max jitter and jitter sigma, in ms, for a jitter intensity.
+    """
+    if jitter_intensity == 0:   # No jitter
+        return 0.0, 0.0
+    elif jitter_intensity == 1: # Gentle jitter
+        return 15.0, 5.0
+    else:                       # Default RMCAT jitter
+        return 30.0, 15.0
+
+def spawn_seeds(seed, num_streams):
+    """
+    Independent seeds for num_streams links, e.g. one per worker, derived from a single seed.
+    The i-th one is also numpy.random.SeedSequence(seed, spawn_key=(i,)).
+    """
+    import numpy
+    return numpy.random.SeedSequence(seed).spawn(num_streams)
+
 class LinkSimulator(object):
 
-    def __init__(self, capacity_kbps_, jitter_intensity):
+    JITTER_BLOCK_SIZE = 4096
+
+    # seed_ is an int or a numpy.random.SeedSequence, None for fresh entropy.
+    # The queue is limited to BOTTLENECK_QUEUE_SIZE_MS of queuing delay, unless
+    # queue_size_bytes_ is given: it then holds at most that many bytes.
+    # cross_traffic_ is a cross_traffic.CrossTraffic, sharing a time limited queue.
+    # capacity_trace_ is a capacity_trace.CapacityTrace, then followed instead of capacity_kbps.
+    def __init__(self, capacity_kbps_, jitter_intensity, seed_=None, queue_size_bytes_=None, cross_traffic_=None,
+                 capacity_trace_=None):
+        if queue_size_bytes_ is not None and cross_traffic_ is not None:
+            raise ValueError("Cross traffic requires a time limited queue.")
+        if capacity_trace_ is not None and cross_traffic_ is not None:
+            raise ValueError("Cross traffic requires a capacity constant between packets.")
         self.ONE_WAY_PATH_DELAY_MS = 50.0
         self.BOTTLENECK_QUEUE_SIZE_MS = 300.0
+        self.BOTTLENECK_QUEUE_SIZE_BYTES = queue_size_bytes_
+        self.cross_traffic = cross_traffic_
         self.capacity_kbps = capacity_kbps_
+        self.capacity_trace = capacity_trace_
+        self.__trace_cursor = None if capacity_trace_ is None else capacity_trace_.cursor()
         # Last timestamp independent for Choke and Jitter filters,
         # as on the Chrome repository C++ simulation framework.
         self.__last_choke_time_ms = 0.0
         self.__last_jitter_time_ms = 0.0
-        if jitter_intensity == 0:   # No jitter
-            self.MAX_JITTER_MS = 0.0
-            self.JITTER_SIGMA_MS = 0.0
-        elif jitter_intensity == 1: # Gentle jitter
-            self.MAX_JITTER_MS = 15.0
-            self.JITTER_SIGMA_MS = 5.0
-        else:                       # Default RMCAT jitter
-            self.MAX_JITTER_MS = 30.0
-            self.JITTER_SIGMA_MS = 15.0
+        self.MAX_JITTER_MS, self.JITTER_SIGMA_MS = jitter_parameters_ms(jitter_intensity)
+        self.__seed = seed_
+        self.__rng = None  # Created with the first jitter samples.
+        self.__jitter_samples = []
+        self.__jitter_cursor = 0
+        # Byte limited queue: (departure time, size) of queued packets, and their total size.
+        self.__queued_packets = deque()
+        self.__queued_bytes = 0.0
+        self.__recorder = None
+        self.__realization = None
+        self.__jitter_stream = None
+
+    # Links are copied, and pickled, without the jitter samples they consumed, e.g. by snapshot.py.
+    # The samples they will consume and the generator state are kept, hence copies draw the same jitter.
+    def __getstate__(self):
+        if self.__recorder is not None:
+            raise ValueError("A recording link can't be copied.")
+        state = self.__dict__.copy()
+        state['_LinkSimulator__jitter_samples'] = self.__jitter_samples[self.__jitter_cursor:]
+        state['_LinkSimulator__jitter_cursor'] = 0
+        # Replay methods are set again on load, their private names can't be pickled.
+        state.pop('send_packet', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.__realization is not None:
+            self.send_packet = self.__replay_send_packet
+
+    def record(self, path):
+        """
+        Records the link realization to path, until stop_recording: jitter samples, as drawn,
+        and capacity changes, timestamped halfway between the send times of the last packet sent at
+        the former capacity and the first one at the new capacity, robust to rounding on replay.
+        Cross traffic isn't recorded. Must be called before sending packets.
+        """
+        from link_realization import LinkRecorder
+        self.__recorder = LinkRecorder(path, {
+            'one_way_path_delay_ms': self.ONE_WAY_PATH_DELAY_MS,
+            'bottleneck_queue_size_ms': self.BOTTLENECK_QUEUE_SIZE_MS,
+            'bottleneck_queue_size_bytes': self.BOTTLENECK_QUEUE_SIZE_BYTES,
+            'max_jitter_ms': self.MAX_JITTER_MS, 'jitter_sigma_ms': self.JITTER_SIGMA_MS, 'seed': self.__seed})
+        self.__recorded_capacity_kbps = None
+        self.__latest_send_time_ms = None
+        # Live links run the plain methods, only recording and replaying links pay for it.
+        self.send_packet = self.__record_send_packet
+
+    def stop_recording(self):
+        """
+        Completes the recording with as many jitter samples as consumed so far, so that
+        a sender variant receiving up to twice as many packets can be replayed.
+        """
+        num_consumed_samples = self.__recorder.num_jitter_samples - (len(self.__jitter_samples) - self.__jitter_cursor)
+        self.__generate_jitter_samples(max(1, num_consumed_samples))
+        self.__recorder.close()
+        self.__recorder = None
+        del self.send_packet
+
+    def replay(self, realization):
+        """
+        Replays a link_realization.LinkRealization: jitter samples are read from it instead of drawn,
+        and capacity follows its timeline, whatever capacity_kbps is set to. Link parameters are
+        the recorded ones. Packets must be sent in send time order. Must be called before sending packets.
+        """
+        metadata = realization.metadata
+        self.ONE_WAY_PATH_DELAY_MS = metadata['one_way_path_delay_ms']
+        self.BOTTLENECK_QUEUE_SIZE_MS = metadata['bottleneck_queue_size_ms']
+        self.BOTTLENECK_QUEUE_SIZE_BYTES = metadata['bottleneck_queue_size_bytes']
+        self.MAX_JITTER_MS = metadata['max_jitter_ms']
+        self.JITTER_SIGMA_MS = metadata['jitter_sigma_ms']
+        self.__realization = realization
+        self.__replayed_samples = 0
+        # Small, hence read once.
+        self.__capacity_times_ms = realization.capacity_times_ms.tolist()
+        self.__capacities_kbps = realization.capacities_kbps.tolist()
+        self.__capacity_cursor = 0
+        self.__replayed_capacity_kbps = self.__capacities_kbps[0] if self.__capacities_kbps else self.capacity_kbps
+        self.__replay_capacity(float("-inf"))
+        self.send_packet = self.__replay_send_packet
+
+    def share_jitter(self, jitter_stream):
+        """
+        Reads jitter samples from jitter_stream, a JitterStream, instead of drawing them: the i-th
+        packet received by each link sharing it gets the same jitter, and jitter parameters are the
+        stream's. Must be called before sending packets.
+        """
+        self.MAX_JITTER_MS = jitter_stream.MAX_JITTER_MS
+        self.JITTER_SIGMA_MS = jitter_stream.JITTER_SIGMA_MS
+        self.__jitter_stream = jitter_stream
+        self.__jitter_reader = jitter_stream.add_reader()
 
     def send_packet(self, packet):
         packet.arrival_time_ms = packet.send_time_ms
@@ -36,36 +165,376 @@ class LinkSimulator(object):
         if packet.arrival_time_ms is not None:
             self.__add_jitter(packet)
 
+    def send_train(self, train):
+        """
+        Aggregated send_packet, for a packet.PacketTrain: the bottleneck queue is solved in closed
+        form for the train's evenly paced packets, at the current capacity. The first and last
+        received packets are then jittered, the latter by the running max of the jittered times of
+        the packets received right before it, as send_packet would. Sets how many packets of the
+        train are received, and when the first and last ones arrive.
+        Only time limited queues, without cross traffic nor capacity trace, are supported.
+        """
+        if self.BOTTLENECK_QUEUE_SIZE_BYTES is not None or self.cross_traffic is not None \
+           or self.capacity_trace is not None:
+            raise ValueError("Aggregated sending requires a time limited queue, without cross traffic nor capacity trace.")
+        departures = self.__train_departure_times_ms(train)
+        if departures is None:  # The whole train is lost.
+            train.num_received = 0
+            train.first_arrival_time_ms = train.last_arrival_time_ms = None
+            return
+        first_departure_ms, last_departure_ms, num_received = departures
+        self.__last_choke_time_ms = last_departure_ms
+        train.num_received = num_received
+        train.first_arrival_time_ms = self.__jitter_train_edge(first_departure_ms, 0.0, 1)
+        if num_received == 1:
+            train.last_arrival_time_ms = train.first_arrival_time_ms
+            return
+        # Earlier packets, sent over MAX_JITTER_MS before the last one, can't arrive after it.
+        spacing_ms = (last_departure_ms - first_departure_ms) / (num_received - 1)
+        num_samples = num_received - 1
+        if spacing_ms > 0.0:
+            num_samples = min(num_samples, int(self.MAX_JITTER_MS / spacing_ms) + 1)
+        train.last_arrival_time_ms = self.__jitter_train_edge(last_departure_ms, spacing_ms, num_samples)
+
+    def __record_send_packet(self, packet):
+        self.__record_capacity(packet.send_time_ms)
+        LinkSimulator.send_packet(self, packet)
+        self.__latest_send_time_ms = packet.send_time_ms
+
+    def __record_capacity(self, send_time_ms):
+        if self.capacity_kbps == self.__recorded_capacity_kbps:
+            return
+        if self.__latest_send_time_ms is not None:
+            send_time_ms = 0.5 * (self.__latest_send_time_ms + send_time_ms)
+        self.__recorder.add_capacity(send_time_ms, self.capacity_kbps)
+        self.__recorded_capacity_kbps = self.capacity_kbps
+
+    # Inlines send_packet, saving a call per packet.
+    def __replay_send_packet(self, packet):
+        if packet.send_time_ms >= self.__next_capacity_time_ms:
+            self.__replay_capacity(packet.send_time_ms)
+        self.capacity_kbps = self.__replayed_capacity_kbps
+        packet.arrival_time_ms = packet.send_time_ms
+        self.__add_path_delay(packet)
+        self.__add_sending_time(packet)
+        if packet.arrival_time_ms is not None:
+            self.__add_jitter(packet)
+
+    def __replay_capacity(self, send_time_ms):
+        capacity_times_ms = self.__capacity_times_ms
+        while self.__capacity_cursor + 1 < len(capacity_times_ms) \
+              and capacity_times_ms[self.__capacity_cursor + 1] <= send_time_ms:
+            self.__capacity_cursor += 1
+            self.__replayed_capacity_kbps = self.__capacities_kbps[self.__capacity_cursor]
+        next_cursor = self.__capacity_cursor + 1
+        self.__next_capacity_time_ms = capacity_times_ms[next_cursor] if next_cursor < len(capacity_times_ms) \
+                                       else float("inf")
+
     # Equivalent to bwe_simulation_framework DelayFilter.
     def __add_path_delay(self, packet):
         packet.arrival_time_ms += self.ONE_WAY_PATH_DELAY_MS
 
     # Equivalent to bwe_simulation_framework ChokeFilter.
     def __add_sending_time(self, packet):
-        travel_time_ms = (8 * packet.payload_size_bytes) / self.capacity_kbps
-        updated_arrival_time_ms = max(self.__last_choke_time_ms, packet.arrival_time_ms) \
-                                + travel_time_ms
+        if self.BOTTLENECK_QUEUE_SIZE_BYTES is not None:
+            self.__add_sending_time_byte_limited(packet)
+            return
+        if self.cross_traffic is not None:
+            self.__last_choke_time_ms = self.cross_traffic.drain_time_ms(
+                self.__last_choke_time_ms, packet.arrival_time_ms, self.capacity_kbps, self.BOTTLENECK_QUEUE_SIZE_MS)
+        updated_arrival_time_ms = self.__departure_time_ms(packet)
         if updated_arrival_time_ms - packet.arrival_time_ms < self.BOTTLENECK_QUEUE_SIZE_MS:
             packet.arrival_time_ms = updated_arrival_time_ms
             self.__last_choke_time_ms = updated_arrival_time_ms
         else:  # Packet is lost if queue is overflowed.
             packet.arrival_time_ms = None
 
+    # Packets enter the queue in send time order, hence those which have left it by
+    # now are at its front: amortized constant time per packet.
+    def __add_sending_time_byte_limited(self, packet):
+        queued_packets = self.__queued_packets
+        while queued_packets and queued_packets[0][0] <= packet.arrival_time_ms:
+            self.__queued_bytes -= queued_packets.popleft()[1]
+        if self.__queued_bytes + packet.payload_size_bytes > self.BOTTLENECK_QUEUE_SIZE_BYTES:
+            packet.arrival_time_ms = None  # Packet is lost if queue is overflowed.
+            return
+        updated_arrival_time_ms = self.__departure_time_ms(packet)
+        queued_packets.append((updated_arrival_time_ms, packet.payload_size_bytes))
+        self.__queued_bytes += packet.payload_size_bytes
+        packet.arrival_time_ms = updated_arrival_time_ms
+        self.__last_choke_time_ms = updated_arrival_time_ms
+
+    # The packet is sent once the queue ahead of it is, at the link capacity.
+    # On a capacity trace, packets which would overflow a time limited queue aren't followed further.
+    def __departure_time_ms(self, packet):
+        start_time_ms = max(self.__last_choke_time_ms, packet.arrival_time_ms)
+        if self.__trace_cursor is not None:
+            deadline_ms = float("inf")
+            if self.BOTTLENECK_QUEUE_SIZE_BYTES is None:
+                deadline_ms = packet.arrival_time_ms + self.BOTTLENECK_QUEUE_SIZE_MS
+            return self.__trace_cursor.departure_time_ms(start_time_ms, packet.payload_size_bytes, deadline_ms)
+        return start_time_ms + (8 * packet.payload_size_bytes) / self.capacity_kbps
+
+    # Closed form of __add_sending_time for the n packets of a train, entering the queue at
+    # e_i = e_0 + i*g, and each sent in t. Without losses, d_i = max(L + (i+1)*t, e_0 + t + i*max(g, t)),
+    # L being the last choke time.
+    # If the link is at least as fast as the train, t <= g, the queue drains: only its first packets
+    # can be lost, those entering it while the queuing delay L + t - e_i is too long.
+    # Otherwise, the queuing delay grows by t - g per packet, up to the queue size, at packet k. The
+    # link then sends one packet every t ms: the m-th one is the first entering the queue after
+    # L' + m*t - Q, L' being the departure of packet k-1, and Q the queue size.
+    # Returns the departure times of the first and last received packets, and how many are received,
+    # or None if they are all lost.
+    def __train_departure_times_ms(self, train):
+        num_packets = train.num_packets
+        gap_ms = train.gap_ms
+        travel_time_ms = (8 * train.payload_size_bytes) / self.capacity_kbps
+        queue_size_ms = self.BOTTLENECK_QUEUE_SIZE_MS
+        first_entry_ms = train.first_send_time_ms + self.ONE_WAY_PATH_DELAY_MS
+        last_choke_time_ms = self.__last_choke_time_ms
+        if travel_time_ms <= gap_ms or num_packets == 1:
+            if last_choke_time_ms + travel_time_ms - first_entry_ms < queue_size_ms:
+                num_lost = 0
+            elif num_packets == 1:
+                return None
+            else:
+                num_lost = min(num_packets, int(math.floor(
+                    (last_choke_time_ms + travel_time_ms - queue_size_ms - first_entry_ms) / gap_ms)) + 1)
+            if num_lost == num_packets:
+                return None
+            entry_ms = first_entry_ms + num_lost * gap_ms
+            num_received = num_packets - num_lost
+            last_departure_ms = max(last_choke_time_ms + num_received * travel_time_ms,
+                                    entry_ms + (num_received - 1) * gap_ms + travel_time_ms)
+            return max(last_choke_time_ms, entry_ms) + travel_time_ms, last_departure_ms, num_received
+
+        start_time_ms = max(last_choke_time_ms, first_entry_ms)
+        initial_queuing_delay_ms = start_time_ms - first_entry_ms + travel_time_ms
+        num_queued = max(0, int(math.ceil((queue_size_ms - initial_queuing_delay_ms) / (travel_time_ms - gap_ms))))
+        if num_queued >= num_packets:
+            return start_time_ms + travel_time_ms, start_time_ms + num_packets * travel_time_ms, num_packets
+        # The queue is full.
+        full_time_ms = start_time_ms + num_queued * travel_time_ms if num_queued > 0 else last_choke_time_ms
+        last_entry_ms = first_entry_ms + (num_packets - 1) * gap_ms
+        num_sent = max(0, int(math.ceil((last_entry_ms + queue_size_ms - full_time_ms) / travel_time_ms)) - 1)
+        num_received = num_queued + num_sent
+        if num_received == 0:
+            return None
+        first_departure_ms = start_time_ms + travel_time_ms if num_queued > 0 else full_time_ms + travel_time_ms
+        last_departure_ms = full_time_ms + num_sent * travel_time_ms
+        return first_departure_ms, last_departure_ms, num_received
+
+    # Jittered arrival of a train's packet departing at departure_time_ms: the running max of the
+    # jittered times of num_samples packets, departing every spacing_ms up to it, as __add_jitter.
+    def __jitter_train_edge(self, departure_time_ms, spacing_ms, num_samples):
+        if self.__jitter_cursor + num_samples > len(self.__jitter_samples):
+            self.__generate_jitter_samples(num_samples)
+        cursor = self.__jitter_cursor
+        arrival_time_ms = self.__last_jitter_time_ms
+        for i, jitter_ms in enumerate(self.__jitter_samples[cursor:cursor + num_samples]):
+            arrival_time_ms = max(arrival_time_ms, departure_time_ms - (num_samples - 1 - i) * spacing_ms + jitter_ms)
+        self.__jitter_cursor = cursor + num_samples
+        self.__last_jitter_time_ms = arrival_time_ms
+        return arrival_time_ms
+
     # Equivalent to bwe_simulation_framework JitterFilter.
     def __add_jitter(self, packet):
         # Random from positive truncated gaussian distribution.
-        jitter_ms = min(abs(random.gauss(0.0, self.JITTER_SIGMA_MS)), self.MAX_JITTER_MS)
+        if self.__jitter_cursor == len(self.__jitter_samples):
+            self.__generate_jitter_samples(1)
+        jitter_ms = self.__jitter_samples[self.__jitter_cursor]
+        self.__jitter_cursor += 1
         updated_arrival_time_ms = max(packet.arrival_time_ms + jitter_ms,
                                       self.__last_jitter_time_ms)
         packet.arrival_time_ms = updated_arrival_time_ms
         self.__last_jitter_time_ms = updated_arrival_time_ms
 
+    # Random from positive truncated gaussian distribution.
+    # Keeps unconsumed samples, and makes at least num_samples available.
+    def __generate_jitter_samples(self, num_samples):
+        num_blocks = -(-num_samples // LinkSimulator.JITTER_BLOCK_SIZE)
+        if self.__realization is not None:
+            samples_ms = self.__read_jitter_samples(num_blocks * LinkSimulator.JITTER_BLOCK_SIZE)
+        elif self.__jitter_stream is not None:
+            samples_ms = self.__jitter_stream.read(self.__jitter_reader, num_blocks * LinkSimulator.JITTER_BLOCK_SIZE)
+        elif self.JITTER_SIGMA_MS == 0.0:
+            samples_ms = [0.0] * (num_blocks * LinkSimulator.JITTER_BLOCK_SIZE)
+        else:
+            import numpy
+            if self.__rng is None:
+                self.__rng = numpy.random.default_rng(self.__seed)
+            samples_ms = self.__rng.normal(0.0, self.JITTER_SIGMA_MS, num_blocks * LinkSimulator.JITTER_BLOCK_SIZE)
+            samples_ms = numpy.minimum(numpy.abs(samples_ms), self.MAX_JITTER_MS).tolist()
+        if self.__recorder is not None:
+            self.__recorder.add_jitter_samples(samples_ms)
+        self.__jitter_samples = self.__jitter_samples[self.__jitter_cursor:] + samples_ms
+        self.__jitter_cursor = 0
+        if len(self.__jitter_samples) < num_samples:
+            raise ValueError("The link realization has no more jitter samples to replay.")
+
+    # Recorded samples were drawn in blocks too, only the last block can be short.
+    def __read_jitter_samples(self, num_samples):
+        jitter_samples_ms = self.__realization.jitter_samples_ms
+        samples_ms = jitter_samples_ms[self.__replayed_samples:self.__replayed_samples + num_samples].tolist()
+        self.__replayed_samples += len(samples_ms)
+        return samples_ms
+
+class JitterStream(object):
+    """
+    Jitter samples of a link, drawn block by block from a single generator, as a LinkSimulator seeded
+    with seed_ would draw them, and read by several links at their own pace: the i-th sample is the
+    same for all of them. Only the samples between the slowest and the fastest reader are kept.
+    """
+
+    def __init__(self, jitter_intensity, seed_=None):
+        self.MAX_JITTER_MS, self.JITTER_SIGMA_MS = jitter_parameters_ms(jitter_intensity)
+        self.seed = seed_
+        self.__rng = None
+        self.__samples = []
+        self.__first_sample = 0  # Index of __samples[0] in the stream.
+        self.__positions = []
+
+    def add_reader(self):
+        """
+        Returns the id of a new reader, starting from the first sample.
+        """
+        if self.__first_sample > 0:
+            raise ValueError("Readers must be added before reading samples.")
+        self.__positions.append(0)
+        return len(self.__positions) - 1
 
+    def read(self, reader, num_samples):
+        """
+        Returns the next num_samples samples of reader, as a list.
+        """
+        start = self.__positions[reader] - self.__first_sample
+        while len(self.__samples) < start + num_samples:
+            self.__samples.extend(self.__draw_block())
+        samples_ms = self.__samples[start:start + num_samples]
+        self.__positions[reader] += num_samples
+        num_read = min(self.__positions) - self.__first_sample
+        if num_read >= LinkSimulator.JITTER_BLOCK_SIZE:
+            del self.__samples[:num_read]
+            self.__first_sample += num_read
+        return samples_ms
 
+    def __len__(self):
+        return len(self.__samples)
 
+    # Same samples as LinkSimulator.__generate_jitter_samples.
+    def __draw_block(self):
+        if self.JITTER_SIGMA_MS == 0.0:
+            return [0.0] * LinkSimulator.JITTER_BLOCK_SIZE
+        import numpy
+        if self.__rng is None:
+            self.__rng = numpy.random.default_rng(self.seed)
+        samples_ms = self.__rng.normal(0.0, self.JITTER_SIGMA_MS, LinkSimulator.JITTER_BLOCK_SIZE)
+        return numpy.minimum(numpy.abs(samples_ms), self.MAX_JITTER_MS).tolist()
 
+"""
+Simulates the reverse path, carrying feedback from a receiver back to its sender.
+Feedback messages are small, hence there is no bottleneck queue: each one gets a
+one way delay and a jitter, as packets on the forward link, and is lost with a
+given probability. Feedback order is preserved.
+"""
+
+class ReversePath(object):
 
+    def __init__(self, one_way_delay_ms_, loss_probability_, jitter_intensity, seed_=None):
+        self.ONE_WAY_DELAY_MS = one_way_delay_ms_
+        self.LOSS_PROBABILITY = loss_probability_
+        self.MAX_JITTER_MS, self.JITTER_SIGMA_MS = jitter_parameters_ms(jitter_intensity)
+        self.__rng = None
+        if self.LOSS_PROBABILITY > 0.0 or self.JITTER_SIGMA_MS > 0.0:
+            import numpy
+            self.__rng = numpy.random.default_rng(seed_)
+        self.__last_arrival_time_ms = 0.0
 
+    # Returns the feedback arrival time, or None if it is lost.
+    def send_feedback(self, send_time_ms):
+        if self.LOSS_PROBABILITY > 0.0 and self.__rng.random() < self.LOSS_PROBABILITY:
+            return None
+        jitter_ms = 0.0
+        if self.JITTER_SIGMA_MS > 0.0:
+            jitter_ms = min(abs(self.__rng.normal(0.0, self.JITTER_SIGMA_MS)), self.MAX_JITTER_MS)
+        arrival_time_ms = max(send_time_ms + self.ONE_WAY_DELAY_MS + jitter_ms, self.__last_arrival_time_ms)
+        self.__last_arrival_time_ms = arrival_time_ms
+        return arrival_time_ms
+
+"""
+A bottleneck link shared by several flows, through the FIFO queue of a single LinkSimulator.
+Packets of all flows go through it interleaved, in send time order, and are accounted per flow:
+packets sent and lost, bytes received, and delays. Accounting is constant time per packet.
+"""
 
+class SharedBottleneckLink(object):
 
+    def __init__(self, link_simulator_, num_flows):
+        self.link_simulator = link_simulator_
+        self.num_sent_packets = [0] * num_flows
+        self.num_lost_packets = [0] * num_flows
+        self.received_bytes = [0.0] * num_flows
+        self.sum_delays_ms = [0.0] * num_flows
+        self.first_arrival_times_ms = [None] * num_flows
+        self.last_arrival_times_ms = [None] * num_flows
 
+    @property
+    def num_flows(self):
+        return len(self.num_sent_packets)
+
+    @property
+    def capacity_kbps(self):
+        return self.link_simulator.capacity_kbps
+
+    @capacity_kbps.setter
+    def capacity_kbps(self, capacity_kbps):
+        self.link_simulator.capacity_kbps = capacity_kbps
+
+    def send_packet(self, packet, flow_id):
+        self.link_simulator.send_packet(packet)
+        self.num_sent_packets[flow_id] += 1
+        if packet.arrival_time_ms is None:
+            self.num_lost_packets[flow_id] += 1
+            return
+        self.received_bytes[flow_id] += packet.payload_size_bytes
+        self.sum_delays_ms[flow_id] += packet.arrival_time_ms - packet.send_time_ms
+        if self.first_arrival_times_ms[flow_id] is None:
+            self.first_arrival_times_ms[flow_id] = packet.arrival_time_ms
+        self.last_arrival_times_ms[flow_id] = packet.arrival_time_ms
+
+    def port(self, flow_id):
+        """
+        The link as seen by a single flow: send_packet(packet) accounts it to flow_id.
+        """
+        return FlowPort(self, flow_id)
+
+    # Same definition as bwe_utils.average_bitrate_kbps, on the flow's received packets.
+    def average_bitrate_kbps(self, flow_id):
+        num_received_packets = self.num_sent_packets[flow_id] - self.num_lost_packets[flow_id]
+        if num_received_packets == 0:
+            return 0.0
+        if num_received_packets == 1:
+            return 8.0 * self.received_bytes[flow_id] / self.first_arrival_times_ms[flow_id]
+        duration_ms = self.last_arrival_times_ms[flow_id] - self.first_arrival_times_ms[flow_id]
+        correction_factor = float(num_received_packets - 1) / num_received_packets
+        return (8.0 * self.received_bytes[flow_id] / duration_ms) * correction_factor
+
+    def average_delay_ms(self, flow_id):
+        num_received_packets = self.num_sent_packets[flow_id] - self.num_lost_packets[flow_id]
+        if num_received_packets == 0:
+            return 0.0
+        return self.sum_delays_ms[flow_id] / num_received_packets
+
+    def loss_ratio(self, flow_id):
+        if self.num_sent_packets[flow_id] == 0:
+            return 0.0
+        return float(self.num_lost_packets[flow_id]) / self.num_sent_packets[flow_id]
+
+class FlowPort(object):
+
+    def __init__(self, shared_link_, flow_id_):
+        self.shared_link = shared_link_
+        self.flow_id = flow_id_
+
+    def send_packet(self, packet):
+        self.shared_link.send_packet(packet, self.flow_id)
@@ -1,9 +1,15 @@
 import unittest
+import os
 import random
+import tempfile
 import matplotlib.pyplot as plot
 
-from packet import Packet
-from link_simulator import LinkSimulator
+from packet import Packet, PacketTrain
+from packet_source import PacketSource
+from bwe_utils import average_bitrate_kbps, average_delay_ms
+from link_simulator import LinkSimulator, SharedBottleneckLink, JitterStream, spawn_seeds
+from link_realization import load_realization
+from capacity_trace import CapacityTrace
 
 """
 Unittests for the LinkSimulator class. Plot can be useful for visualizing jitter, a random distribution.
@@ -13,6 +19,9 @@ class TestLinkSimulator(unittest.TestCase):
 
     PLOT = True
 
+    def assertNear(self, x, y, precision):
+        self.assertTrue(abs(x-y) < precision)
+
     def assertBetween(self, x, m, M, precision):
         self.assertTrue(x >= m - precision and x <= M + precision)
 
@@ -93,5 +102,204 @@ class TestLinkSimulator(unittest.TestCase):
                 plot.show()
 
 
+    def send_packets_one_by_one(self, link_simulator, send_times_ms, payload_size_bytes):
+        arrival_times_ms = []
+        for i in range(len(send_times_ms)):
+            packet = Packet(i, send_times_ms[i], payload_size_bytes)
+            link_simulator.send_packet(packet)
+            arrival_times_ms.append(packet.arrival_time_ms)
+        return arrival_times_ms
+
+    # Without jitter, trains are received as their packets would be, one by one.
+    def test_send_train_matches_send_packet(self):
+        payload_size_bytes = 1200.0
+        packet_source = PacketSource(payload_size_bytes)
+        link_simulator = LinkSimulator(None, 0)
+        train_link_simulator = LinkSimulator(None, 0)
+        for i in range(200):
+            # Includes overflowed queues, and links faster than the trains.
+            capacity_kbps = random.uniform(300.0, 20000.0)
+            link_simulator.capacity_kbps = train_link_simulator.capacity_kbps = capacity_kbps
+            train = packet_source.create_train(random.uniform(200.0, 30000.0), random.uniform(1.0, 80.0))
+            packets = [Packet(train.first_id + j, train.first_send_time_ms + j * train.gap_ms, payload_size_bytes)
+                       for j in range(train.num_packets)]
+            for packet in packets:
+                link_simulator.send_packet(packet)
+            train_link_simulator.send_train(train)
+            received_packets = [packet for packet in packets if packet.arrival_time_ms is not None]
+            self.assertEqual(train.num_received, len(received_packets))
+            if received_packets:
+                self.assertNear(train.first_arrival_time_ms, received_packets[0].arrival_time_ms, 1e-6)
+                self.assertNear(train.last_arrival_time_ms, received_packets[-1].arrival_time_ms, 1e-6)
+            else:
+                self.assertIsNone(train.first_arrival_time_ms)
+
+    def test_send_train_jitter(self):
+        packet_source = PacketSource(1200.0)
+        link_simulator = LinkSimulator(10000.0, 2, random.randint(0, 10**6))
+        reference_link_simulator = LinkSimulator(10000.0, 0)
+        latest_arrival_time_ms = 0.0
+        for i in range(100):
+            train = packet_source.create_train(random.uniform(5000.0, 15000.0), 30.0)
+            reference_train = PacketTrain(train.first_id, train.num_packets, train.payload_size_bytes,
+                                          train.first_send_time_ms, train.last_send_time_ms)
+            link_simulator.send_train(train)
+            reference_link_simulator.send_train(reference_train)
+            self.assertEqual(train.num_received, reference_train.num_received)
+            if train.num_received == 0:
+                continue
+            self.assertTrue(latest_arrival_time_ms <= train.first_arrival_time_ms <= train.last_arrival_time_ms)
+            self.assertTrue(reference_train.last_arrival_time_ms <= train.last_arrival_time_ms
+                            <= reference_train.last_arrival_time_ms + link_simulator.MAX_JITTER_MS)
+            latest_arrival_time_ms = train.last_arrival_time_ms
+
+    def test_seeded_jitter_is_reproducible(self):
+        capacity_kbps = 1500.0
+        payload_size_bytes = 1200.0
+        send_times_ms = [j * 20.0 for j in range(1, 10001)]
+        seed = random.randint(0, 10**6)
+        arrival_times_ms = self.send_packets_one_by_one(LinkSimulator(capacity_kbps, 2, seed),
+                                                        send_times_ms, payload_size_bytes)
+        self.assertEqual(arrival_times_ms, self.send_packets_one_by_one(LinkSimulator(capacity_kbps, 2, seed),
+                                                                        send_times_ms, payload_size_bytes))
+        self.assertNotEqual(arrival_times_ms, self.send_packets_one_by_one(LinkSimulator(capacity_kbps, 2, seed + 1),
+                                                                           send_times_ms, payload_size_bytes))
+
+    def test_spawned_seeds_are_independent(self):
+        seeds = spawn_seeds(random.randint(0, 10**6), 3)
+        send_times_ms = [j * 20.0 for j in range(1, 101)]
+        arrival_times_ms = [self.send_packets_one_by_one(LinkSimulator(1500.0, 2, seed), send_times_ms, 1200.0)
+                            for seed in seeds]
+        self.assertNotEqual(arrival_times_ms[0], arrival_times_ms[1])
+        self.assertNotEqual(arrival_times_ms[1], arrival_times_ms[2])
+
+    def test_shared_jitter_stream(self):
+        # Links sharing a stream get the jitter of a link of their own, seeded as the stream.
+        seed = random.randint(0, 10**6)
+        jitter_stream = JitterStream(2, seed)
+        links = [LinkSimulator(1500.0, 0), LinkSimulator(500.0, 0)]
+        for link_simulator in links:
+            link_simulator.share_jitter(jitter_stream)
+        send_times_ms = [j * 5.0 for j in range(1, 20001)]
+        arrival_times_ms = [[], []]
+        max_stream_length = 0
+        for j in range(0, len(send_times_ms), 1000):
+            for link_simulator, link_arrival_times_ms in zip(links, arrival_times_ms):
+                link_arrival_times_ms.extend(self.send_packets_one_by_one(link_simulator, send_times_ms[j:j + 1000],
+                                                                          1200.0))
+            max_stream_length = max(max_stream_length, len(jitter_stream))
+        for capacity_kbps, link_arrival_times_ms in zip([1500.0, 500.0], arrival_times_ms):
+            self.assertEqual(link_arrival_times_ms, self.send_packets_one_by_one(LinkSimulator(capacity_kbps, 2, seed),
+                                                                                 send_times_ms, 1200.0))
+        # Only the samples between the slowest and the fastest link are kept.
+        self.assertLessEqual(max_stream_length, 3 * LinkSimulator.JITTER_BLOCK_SIZE)
+        with self.assertRaises(ValueError):
+            jitter_stream.add_reader()
+
+    def test_byte_limited_queue(self):
+        capacity_kbps = random.uniform(150.0, 2500.0)
+        queue_size_bytes = 10 * 1200.0
+        link_simulator = LinkSimulator(capacity_kbps, 0, queue_size_bytes_=queue_size_bytes)
+        # A burst sent at once: the queue holds 10 packets, the following ones are lost.
+        packets = [Packet(j, 0.0, 1200.0) for j in range(1, 16)]
+        for packet in packets:
+            link_simulator.send_packet(packet)
+        self.assertTrue(all([packet.arrival_time_ms is not None for packet in packets[:10]]))
+        self.assertTrue(all([packet.arrival_time_ms is None for packet in packets[10:]]))
+        # Once the first packet has left the queue, there is room for another one.
+        travel_time_ms = (8 * 1200.0) / capacity_kbps
+        packet = Packet(16, travel_time_ms, 1200.0)
+        link_simulator.send_packet(packet)
+        self.assertNear(packet.arrival_time_ms,
+                        link_simulator.ONE_WAY_PATH_DELAY_MS + 11 * travel_time_ms, 0.001)
+
+    def test_shared_link_accounting(self):
+        seed = random.randint(0, 10**6)
+        shared_link = SharedBottleneckLink(LinkSimulator(1000.0, 2, seed), 4)
+        reference_link = LinkSimulator(1000.0, 2, seed)
+        sent_packets = [[], [], [], []]
+        # Three flows, 500 kbps on average each, interleaved in send time order through a 1000 kbps link,
+        # and a fourth one sending a single packet, first.
+        for j in range(1, 3001):
+            flow_id = random.randint(0, 2) if j > 1 else 3
+            payload_size_bytes = random.choice([500.0, 1500.0, 2500.0])
+            packet = Packet(j, j * 8.0, payload_size_bytes)
+            reference_packet = Packet(j, j * 8.0, payload_size_bytes)
+            shared_link.port(flow_id).send_packet(packet)
+            reference_link.send_packet(reference_packet)
+            # A single FIFO queue: same arrivals as a single flow with all packets.
+            self.assertEqual(packet.arrival_time_ms, reference_packet.arrival_time_ms)
+            sent_packets[flow_id].append(packet)
+        for flow_id in range(4):
+            received = [packet for packet in sent_packets[flow_id] if packet.arrival_time_ms is not None]
+            self.assertEqual(shared_link.num_sent_packets[flow_id], len(sent_packets[flow_id]))
+            self.assertEqual(shared_link.num_lost_packets[flow_id], len(sent_packets[flow_id]) - len(received))
+            self.assertAlmostEqual(shared_link.average_bitrate_kbps(flow_id), average_bitrate_kbps(received))
+            self.assertAlmostEqual(shared_link.average_delay_ms(flow_id), average_delay_ms(received))
+        self.assertTrue(sum(shared_link.num_lost_packets) > 0)
+        self.assertGreater(shared_link.average_bitrate_kbps(3), 0.0)
+
+    def test_capacity_trace(self):
+        capacity_kbps = random.uniform(150.0, 2500.0)
+        # Includes overflowed queues.
+        packet_gap_ms = random.uniform(0.5, 1.5) * (8 * 1200.0) / capacity_kbps
+        send_times_ms = [j * packet_gap_ms for j in range(1, 2001)]
+        seed = random.randint(0, 10**6)
+        # A constant trace is a constant capacity.
+        arrival_times_ms = self.send_packets_one_by_one(LinkSimulator(capacity_kbps, 2, seed), send_times_ms, 1200.0)
+        link_simulator = LinkSimulator(None, 2, seed, capacity_trace_=CapacityTrace([0.0], [capacity_kbps]))
+        self.assertEqual(self.send_packets_one_by_one(link_simulator, send_times_ms, 1200.0), arrival_times_ms)
+        # Capacity changes within a packet's sending time, at the bottleneck: half of it is sent at each capacity.
+        link_simulator = LinkSimulator(None, 0, capacity_trace_=CapacityTrace([0.0, 54.0], [1200.0, 600.0]))
+        packet = Packet(1, 0.0, 1200.0)
+        link_simulator.send_packet(packet)
+        self.assertNear(packet.arrival_time_ms, link_simulator.ONE_WAY_PATH_DELAY_MS + 4.0 + 8.0, 1e-9)
+        # An outage overflows the queue.
+        link_simulator = LinkSimulator(None, 0, capacity_trace_=CapacityTrace([0.0, 40.0, 1000.0], [1200.0, 0.0, 1200.0]))
+        packets = [Packet(j, j * 10.0, 1200.0) for j in range(1, 101)]
+        for packet in packets:
+            link_simulator.send_packet(packet)
+        # Reaching the bottleneck 500 ms after the outage began, then after it.
+        self.assertIs(packets[44].arrival_time_ms, None)
+        self.assertTrue(packets[-1].arrival_time_ms is not None)
+
+    def test_record_and_replay(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        payload_size_bytes = 1200.0
+        capacities_kbps = [random.uniform(500.0, 1500.0) for i in range(3)]
+        # Includes overflowed queues.
+        packet_gap_ms = random.uniform(5.0, 12.0)
+        send_times_ms = [j * packet_gap_ms for j in range(1, 3001)]
+        seed = random.randint(0, 10**6)
+        link_simulator = LinkSimulator(None, 2, seed)
+        link_simulator.record(path)
+        arrival_times_ms = []
+        for i in range(3):
+            link_simulator.capacity_kbps = capacities_kbps[i]
+            arrival_times_ms += self.send_packets_one_by_one(link_simulator, send_times_ms[1000 * i:1000 * (i + 1)],
+                                                             payload_size_bytes)
+        link_simulator.stop_recording()
+
+        realization = load_realization(path)
+        self.assertEqual(realization.capacities_kbps.tolist(), capacities_kbps)
+        self.assertEqual(realization.capacity_times_ms.tolist(),
+                         [send_times_ms[0], 0.5 * (send_times_ms[999] + send_times_ms[1000]),
+                          0.5 * (send_times_ms[1999] + send_times_ms[2000])])
+        self.assertEqual(realization.metadata['seed'], seed)
+        # Capacity follows the timeline, whatever it is set to, and jitter doesn't depend on the seed.
+        link_simulator = LinkSimulator(100.0, 0, seed + 1)
+        link_simulator.replay(realization)
+        self.assertEqual(self.send_packets_one_by_one(link_simulator, send_times_ms, payload_size_bytes),
+                         arrival_times_ms)
+        # Twice as many packets can be replayed, not more.
+        link_simulator = LinkSimulator(None, 0)
+        link_simulator.replay(realization)
+        with self.assertRaises(ValueError):
+            self.send_packets_one_by_one(link_simulator, [j * 100.0 for j in range(1, 10**5)], payload_size_bytes)
+        del realization
+        os.remove(path)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
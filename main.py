@@ -1,15 +1,29 @@
 import argparse
 
 from nada import NadaSender, NadaReceiver
-from evaluation_tests import rmcat_evaluation_1, test_constant_capacity
+from bwe_utils import SummaryAccumulator
+from link_simulator import ReversePath, spawn_seeds
+from cross_traffic import FluidCrossTraffic, ConstantBitrateSource, OnOffSource, AimdSource
+from evaluation_tests import rmcat_evaluation_1, test_constant_capacity, test_competing_flows, test_capacity_trace
+from evaluation_tests import RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS
 
 """
 main method runs an evalution test for NADA congestion control algorithm.
 The following parameters can be optionally specified on the command line:
---jitter, --modified_sender, --modified_filter
+--jitter, --modified_sender, --modified_filter, --seed,
+--feedback_delay, --feedback_loss, --num_flows, --cross_traffic, --output, --no_plot, --stats,
+--record, --replay, --capacity_trace, --constant_capacity, --train_duration
 e.g. python main.py -j 2 -mf -ms runs modified NADA sender with min filter and high jitter.
+e.g. python main.py -cc 50000 -td 33.3 runs NADA on a 50 Mbps link, simulating 33.3 ms packet trains.
 """
 
+# Fluid cross traffic profiles, for the RMCAT Evaluation test 5.1 capacities.
+CROSS_TRAFFIC_PROFILES = {
+    'cbr': lambda seed: [ConstantBitrateSource(200.0)],
+    'onoff': lambda seed: [OnOffSource(400.0, 2000.0, 3000.0, True, seed)],
+    'aimd': lambda seed: [AimdSource(100.0, 10.0, 100.0)],
+}
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("-ms", "--modified_sender", action="store_true",
@@ -18,15 +32,90 @@ def parse_args():
                         help="Use argument to use min filter instead of median filter on NADA receiver")
     parser.add_argument("-j", "--jitter", type=int, choices=[0, 1, 2],
                         help="Jitter Intensity: 0=no jitter; 1=gentle jitter; 2=high jitter")
+    parser.add_argument("-s", "--seed", type=int,
+                        help="Seed for the link's jitter, a random one is used and printed if not specified")
+    parser.add_argument("-fd", "--feedback_delay", type=float,
+                        help="One way delay, in ms, of the feedback path. Feedback is immediate if not specified")
+    parser.add_argument("-fl", "--feedback_loss", type=float, default=0.0,
+                        help="Loss probability of the feedback path")
+    parser.add_argument("-nf", "--num_flows", type=int, default=1,
+                        help="Number of flows sharing the bottleneck, whose capacity is scaled accordingly")
+    parser.add_argument("-ct", "--cross_traffic", choices=sorted(CROSS_TRAFFIC_PROFILES.keys()),
+                        help="Fluid cross traffic sharing the bottleneck")
+    parser.add_argument("-o", "--output", help="Trace file to export the results to, see plot_traces.py")
+    parser.add_argument("-np", "--no_plot", action="store_true", help="Use argument to skip plotting, e.g. headless")
+    parser.add_argument("-st", "--stats", help="JSON file to save per stage times and counters to, printed too")
+    parser.add_argument("-rec", "--record", help="File to record the link realization to, see link_realization.py")
+    parser.add_argument("-rep", "--replay", help="Recorded link realization to replay, instead of drawing jitter")
+    parser.add_argument("-tr", "--capacity_trace",
+                        help="Capacity trace, CSV or .npy, to run a single flow on, see capacity_trace.py")
+    parser.add_argument("-cc", "--constant_capacity", type=float,
+                        help="Capacity, in kbps, of a constant capacity test instead, raising the sender's max bitrate")
+    parser.add_argument("-td", "--train_duration", type=float,
+                        help="Simulate packets sent within each train duration, in ms, as a single packet train")
     args = parser.parse_args()
     original_mode = not args.modified_sender
     use_median_filter = not args.modified_filter
     jitter_intensity = args.jitter or 1
-    return [original_mode, use_median_filter, jitter_intensity]
+    seed = args.seed
+    if seed is None:
+        import numpy
+        seed = numpy.random.SeedSequence().entropy
+        print("Seed                    =", seed)
+    reverse_paths = [None] * args.num_flows
+    if args.feedback_delay is not None or args.feedback_loss > 0.0:
+        reverse_paths = [ReversePath(args.feedback_delay or 0.0, args.feedback_loss, jitter_intensity, path_seed)
+                         for path_seed in spawn_seeds(seed, args.num_flows)]
+    cross_traffic = None
+    if args.cross_traffic is not None:
+        cross_traffic = FluidCrossTraffic(CROSS_TRAFFIC_PROFILES[args.cross_traffic](seed))
+    if args.capacity_trace is not None and (args.num_flows > 1 or cross_traffic is not None):
+        parser.error("A capacity trace is run by a single flow, per packet, without cross traffic.")
+    if args.train_duration is not None and (args.num_flows > 1 or reverse_paths[0] is not None
+                                            or cross_traffic is not None or args.capacity_trace is not None
+                                            or args.record is not None or args.replay is not None):
+        parser.error("Packet trains are run by a single flow, with immediate feedback, on a live link.")
+    return [original_mode, use_median_filter, jitter_intensity, seed, reverse_paths, cross_traffic,
+            args.output, not args.no_plot, args.stats, args.record, args.replay, args.capacity_trace,
+            args.constant_capacity, args.train_duration]
 
 if __name__ == '__main__':
-    [original_mode, use_median_filter, jitter_intensity] = parse_args()
-    nada_sender = NadaSender(original_mode)
-    nada_receiver = NadaReceiver(use_median_filter)
-    # test_constant_capacity(nada_sender, nada_receiver, 10.0, 1000.0)
-    rmcat_evaluation_1(nada_sender, nada_receiver, jitter_intensity)
+    [original_mode, use_median_filter, jitter_intensity, seed, reverse_paths, cross_traffic,
+     trace_path, plot, stats_path, record_path, replay_path, capacity_trace_path, constant_capacity_kbps,
+     train_duration_ms] = parse_args()
+    if len(reverse_paths) > 1:
+        flows = [(NadaSender(original_mode), NadaReceiver(use_median_filter)) for path in reverse_paths]
+        capacities_kbps = [len(flows) * capacity_kbps for capacity_kbps in RMCAT_EVALUATION_1_CAPACITIES_KBPS]
+        test_competing_flows(flows, RMCAT_EVALUATION_1_TIMES_MS, capacities_kbps, jitter_intensity, seed,
+                             reverse_paths=reverse_paths, cross_traffic=cross_traffic)
+    else:
+        max_bitrate_kbps = None
+        if constant_capacity_kbps is not None:
+            max_bitrate_kbps = max(NadaSender.MAX_BITRATE_KBPS, constant_capacity_kbps)
+        nada_sender = NadaSender(original_mode, max_bitrate_kbps)
+        nada_receiver = NadaReceiver(use_median_filter, summary_=SummaryAccumulator())
+        stats = None
+        if stats_path is not None:
+            from instrumentation import SimulationStats
+            stats = SimulationStats()
+        realization = None
+        if replay_path is not None:
+            from link_realization import load_realization
+            realization = load_realization(replay_path)
+        if constant_capacity_kbps is not None:
+            test_constant_capacity(nada_sender, nada_receiver, 100.0, constant_capacity_kbps, jitter_intensity,
+                                   seed=seed, reverse_path=reverse_paths[0], cross_traffic=cross_traffic,
+                                   trace_path=trace_path, plot=plot, stats=stats, record_path=record_path,
+                                   realization=realization, train_duration_ms=train_duration_ms)
+        elif capacity_trace_path is not None:
+            from capacity_trace import load_capacity_trace
+            test_capacity_trace(nada_sender, nada_receiver, load_capacity_trace(capacity_trace_path),
+                                jitter_intensity, seed=seed, reverse_path=reverse_paths[0], trace_path=trace_path,
+                                plot=plot, stats=stats, record_path=record_path, realization=realization)
+        else:
+            rmcat_evaluation_1(nada_sender, nada_receiver, jitter_intensity, seed=seed, reverse_path=reverse_paths[0],
+                               cross_traffic=cross_traffic, trace_path=trace_path, plot=plot, stats=stats,
+                               record_path=record_path, realization=realization,
+                               train_duration_ms=train_duration_ms)
+        if stats is not None:
+            stats.dump(stats_path)
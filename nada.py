@@ -1,7 +1,8 @@
-from numpy import median
-
 from packet_source import PacketSource
-from bwe_utils import loss_ratio, receiving_rate_kbps
+from bwe_utils import loss_ratio, receiving_rate_kbps, LossRatioEstimator, ReceivingRateEstimator
+from bwe_utils import MedianFilter, MinFilter
+from history import FullHistory
+from controller import Sender, Receiver
 
 """
 Network-Assisted Dynamic Adaptation (NADA) is a congestion control algorithm
@@ -14,6 +15,9 @@ the congestion control algorithm's performance.
 
 class NadaFeedback(object):
 
+    __slots__ = ('est_queuing_delay_ms', 'loss_ratio', 'congestion_signal_ms', 'derivative', 'baseline_delay_ms',
+                 'delta_ms', 'interval_ms', 'receiving_rate_kbps', 'exp_smoothed_delay_ms')
+
     def __init__(self, est_queuing_delay_ms_, loss_ratio_, congestion_signal_ms_, derivative_,
                  baseline_delay_ms_, delta_ms_, interval_ms_, receiving_rate_kbps_, exp_smoothed_delay_ms_):
         self.est_queuing_delay_ms = est_queuing_delay_ms_
@@ -26,7 +30,7 @@ class NadaFeedback(object):
         self.receiving_rate_kbps = receiving_rate_kbps_
         self.exp_smoothed_delay_ms = exp_smoothed_delay_ms_
 
-class NadaSender(object):
+class NadaSender(Sender):
 
     PAYLOAD_SIZE_BYTES = 1200.0
     MIN_BITRATE_KBPS = 50.0
@@ -35,16 +39,30 @@ class NadaSender(object):
     MAX_CONGESTION_SIGNAL_MS = 40.0  # Used only in modified mode.
 
     # NADA modified operation mode is an attempt to improve the original one.
-    def __init__(self, original_mode_):
+    # max_bitrate_kbps_ overrides MAX_BITRATE_KBPS, e.g. for high bitrate links.
+    def __init__(self, original_mode_, max_bitrate_kbps_=None):
+        if max_bitrate_kbps_ is not None:
+            self.MAX_BITRATE_KBPS = max_bitrate_kbps_
         self.bitrate_kbps = 300.0
         self.packet_source = PacketSource(NadaSender.PAYLOAD_SIZE_BYTES)
         self.original_mode = original_mode_
         if not self.original_mode:
             self.min_est_travel_time_ms = float("inf")
 
+    # Switches the operation mode mid run, e.g. in a fork of a simulation, see snapshot.py.
+    # The modified mode then starts without any travel time estimate.
+    def set_original_mode(self, original_mode):
+        if not original_mode and self.original_mode:
+            self.min_est_travel_time_ms = float("inf")
+        self.original_mode = original_mode
+
     def create_packet(self):
         return self.packet_source.create_packet(self.bitrate_kbps)
 
+    # Aggregated mode: packets sent within the next duration_ms, as a single train.
+    def create_train(self, duration_ms):
+        return self.packet_source.create_train(self.bitrate_kbps, duration_ms)
+
     # Use feedback from receiver to update the sender's bitrate.
     def receive_feedback(self, feedback):
         if self.__should_ramp_up(feedback):
@@ -54,7 +72,7 @@ class NadaSender(object):
         else:
             self.__gradual_rate_update(feedback)
         # Bitrate should be kept between MIN and MAX.
-        self.bitrate_kbps = max(NadaSender.MIN_BITRATE_KBPS, min(NadaSender.MAX_BITRATE_KBPS, self.bitrate_kbps))
+        self.bitrate_kbps = max(NadaSender.MIN_BITRATE_KBPS, min(self.MAX_BITRATE_KBPS, self.bitrate_kbps))
 
 
     def __should_ramp_up(self, feedback):
@@ -93,7 +111,7 @@ class NadaSender(object):
         PRIORITY_WEIGHT = 1.0       # Referred as w.
         if self.original_mode:
             x_hat = feedback.congestion_signal_ms + ETA * TAU_O_MS * feedback.derivative
-            theta = PRIORITY_WEIGHT * (NadaSender.MAX_BITRATE_KBPS - NadaSender.MIN_BITRATE_KBPS) * REFERENCE_DELAY_MS
+            theta = PRIORITY_WEIGHT * (self.MAX_BITRATE_KBPS - NadaSender.MIN_BITRATE_KBPS) * REFERENCE_DELAY_MS
             increase_kbps = (theta - x_hat * (self.bitrate_kbps - NadaSender.MIN_BITRATE_KBPS)) \
                           * KAPPA * feedback.delta_ms / (TAU_O_MS ** 2)
             self.bitrate_kbps += increase_kbps
@@ -101,11 +119,11 @@ class NadaSender(object):
             extra_delay_ms = self.__estimate_extra_delay_ms()
             new_congestion_signal_ms = max(0.0, feedback.congestion_signal_ms - extra_delay_ms)
             x_hat = new_congestion_signal_ms + ETA * TAU_O_MS * feedback.derivative
-            theta = PRIORITY_WEIGHT * (NadaSender.MAX_BITRATE_KBPS - NadaSender.MIN_BITRATE_KBPS) * REFERENCE_DELAY_MS
+            theta = PRIORITY_WEIGHT * (self.MAX_BITRATE_KBPS - NadaSender.MIN_BITRATE_KBPS) * REFERENCE_DELAY_MS
             increase_kbps = (theta - x_hat * (self.bitrate_kbps - NadaSender.MIN_BITRATE_KBPS)) \
                           * KAPPA * feedback.delta_ms / (TAU_O_MS ** 2)
             bitrate_reference = 3.0*(self.bitrate_kbps- NadaSender.MIN_BITRATE_KBPS) \
-                              / (NadaSender.MAX_BITRATE_KBPS - NadaSender.MIN_BITRATE_KBPS)
+                              / (self.MAX_BITRATE_KBPS - NadaSender.MIN_BITRATE_KBPS)
             smoothing_factor = min(bitrate_reference ** 2.0, 1.0)
             self.bitrate_kbps += increase_kbps * smoothing_factor
 
@@ -114,31 +132,69 @@ class NadaSender(object):
         self.min_est_travel_time_ms = min(self.min_est_travel_time_ms, est_travel_time_ms)
         return est_travel_time_ms - self.min_est_travel_time_ms
 
-class NadaReceiver(object):
+class NadaReceiver(Receiver):
 
     FEEDBACK_INTERVAL_MS = 100.0
     LOSS_RATIO_TIME_WINDOW_MS = 500.0
     RECEIVING_RATE_TIME_WINDOW_MS = 500.0
     LOSS_PENALTY_MS = 1000.0
+    K_MEDIAN = 5   # Median filter on latest 5 elements.
+    K_MIN = 10     # Min filter on latest 10 elements.
+    ALPHA = 0.9    # Exponential smoothing factor.
+    MIN_DELAY_MS = 50.0    # Non-linear warping threshold, referred as d_th.
+    MAX_DELAY_MS = 400.0   # Referred as d_max.
 
-    def __init__(self, use_median_filter_):
+    # Incremental estimators give the same loss ratio and receiving rate, updated in O(1).
+    # history_ sets which values are kept for the end of the simulation, all of them by default.
+    # summary_, a bwe_utils.SummaryAccumulator, gets all packets, whichever history is kept.
+    def __init__(self, use_median_filter_, incremental_estimators_=True, k_median_=K_MEDIAN, k_min_=K_MIN,
+                 history_=None, summary_=None):
         self.latest_feedback_ms = 0.0
+        self.summary = summary_
         self.baseline_delay_ms = float("inf")
-        self.packets = []
-        # Values are stored to be plotted in the end of a simulation.
-        self.time_ms = []
-        self.delay_signals_ms = []
-        self.median_filtered_delays_ms = []
-        self.exp_smoothed_delays_ms = []
-        self.est_queuing_delays_ms = []
-        self.congestion_signals_ms = []
-        self.loss_ratios = []
-        self.receiving_rates_kbps = []
+        self.history = history_ or FullHistory()
+        self.incremental_estimators = incremental_estimators_
+        if not self.incremental_estimators and not isinstance(self.history, FullHistory):
+            raise ValueError("Non incremental estimators require the full packets history.")
+        # Values are stored to be printed and plotted in the end of a simulation.
+        self.packets = self.history.new_packet_series()
+        self.time_ms = self.history.new_series()
+        self.delay_signals_ms = self.history.new_series()
+        self.median_filtered_delays_ms = self.history.new_series()
+        self.exp_smoothed_delays_ms = self.history.new_series()
+        self.est_queuing_delays_ms = self.history.new_series()
+        self.congestion_signals_ms = self.history.new_series()
+        self.loss_ratios = self.history.new_series()
+        self.receiving_rates_kbps = self.history.new_series()
+        self.__all_series = [self.packets, self.time_ms, self.delay_signals_ms, self.median_filtered_delays_ms,
+                             self.exp_smoothed_delays_ms, self.est_queuing_delays_ms, self.congestion_signals_ms,
+                             self.loss_ratios, self.receiving_rates_kbps]
+        # Latest values, used for feedback regardless of the history.
+        self.__num_packets = 0
+        self.__time_ms = None
+        self.__exp_smoothed_delay_ms = None
+        self.__est_queuing_delay_ms = None
+        self.__loss_ratio = None
+        self.__receiving_rate_kbps = None
+        self.__congestion_signal_ms = None
+        self.__previous_congestion_signal_ms = None
+
         self.use_median_filter = use_median_filter_
+        if self.use_median_filter:
+            self.__delay_filter = MedianFilter(k_median_)
+        else: # Use min element
+            self.__delay_filter = MinFilter(k_min_)
+        self.__loss_ratio_estimator = LossRatioEstimator(NadaReceiver.LOSS_RATIO_TIME_WINDOW_MS)
+        self.__receiving_rate_estimator = ReceivingRateEstimator(NadaReceiver.RECEIVING_RATE_TIME_WINDOW_MS)
 
     def receive_packet(self, packet):
-        self.time_ms.append(packet.arrival_time_ms)
-        self.packets.append(packet)
+        self.__num_packets += 1
+        self.__time_ms = packet.arrival_time_ms
+        record = self.history.should_record(packet.arrival_time_ms)
+        if record:
+            self.packets.append(packet)
+        if self.summary is not None:
+            self.summary.add_packet(packet)
         # Use delay as a signal.
         # 1) Subtract Baseline.
         # 2) Apply Median filter.
@@ -146,54 +202,132 @@ class NadaReceiver(object):
         # 4) Non-linear Estimate queuing delay warping.
         delay_ms = packet.arrival_time_ms - packet.send_time_ms
         self.baseline_delay_ms = min(self.baseline_delay_ms, delay_ms)
-        self.delay_signals_ms.append(delay_ms - self.baseline_delay_ms)
-        self.median_filtered_delays_ms.append(self.__median_filter())
-        self.exp_smoothed_delays_ms.append(self.__exp_smoothing_filter())
-        self.est_queuing_delays_ms.append(self.__non_linear_warping())
-        self.loss_ratios.append(loss_ratio(self.packets, NadaReceiver.LOSS_RATIO_TIME_WINDOW_MS))
-        self.receiving_rates_kbps.append(receiving_rate_kbps(self.packets, NadaReceiver.RECEIVING_RATE_TIME_WINDOW_MS))
-        self.congestion_signals_ms.append(self.est_queuing_delays_ms[-1] + NadaReceiver.LOSS_PENALTY_MS * self.loss_ratios[-1])
+        delay_signal_ms = delay_ms - self.baseline_delay_ms
+        median_filtered_delay_ms = self.__median_filter(delay_signal_ms)
+        self.__exp_smoothed_delay_ms = self.__exp_smoothing_filter(median_filtered_delay_ms)
+        self.__est_queuing_delay_ms = self.__non_linear_warping()
+        self.__loss_ratio = self.__compute_loss_ratio(packet)
+        self.__receiving_rate_kbps = self.__compute_receiving_rate_kbps(packet)
+        self.__previous_congestion_signal_ms = self.__congestion_signal_ms
+        self.__congestion_signal_ms = self.__est_queuing_delay_ms + NadaReceiver.LOSS_PENALTY_MS * self.__loss_ratio
+
+        if record:
+            self.time_ms.append(packet.arrival_time_ms)
+            self.delay_signals_ms.append(delay_signal_ms)
+            self.median_filtered_delays_ms.append(median_filtered_delay_ms)
+            self.exp_smoothed_delays_ms.append(self.__exp_smoothed_delay_ms)
+            self.est_queuing_delays_ms.append(self.__est_queuing_delay_ms)
+            self.loss_ratios.append(self.__loss_ratio)
+            self.receiving_rates_kbps.append(self.__receiving_rate_kbps)
+            self.congestion_signals_ms.append(self.__congestion_signal_ms)
+            self.history.evict(self.time_ms, self.__all_series, packet.arrival_time_ms)
 
 
+    def receive_train(self, train):
+        """
+        Aggregated receive_packet, for the received packets of a packet.PacketTrain, whose delays
+        are assumed to change linearly from the first one to the last one. The delay filter gets the
+        delays of the last packets, exponential smoothing is applied to all of them in closed form,
+        and the estimators get the whole train. Trains aren't kept in the packets history, the
+        summary gets them. Requires incremental estimators.
+        """
+        if not self.incremental_estimators:
+            raise ValueError("Packet trains require incremental estimators.")
+        num_received = train.num_received
+        self.__num_packets += num_received
+        self.__time_ms = train.last_arrival_time_ms
+        record = self.history.should_record(train.last_arrival_time_ms)
+        if self.summary is not None:
+            self.summary.add_train(train)
+        first_delay_ms = train.first_arrival_time_ms - train.first_send_time_ms
+        last_delay_ms = train.last_arrival_time_ms - train.last_send_time_ms
+        self.baseline_delay_ms = min(self.baseline_delay_ms, first_delay_ms, last_delay_ms)
+        delay_step_ms = (last_delay_ms - first_delay_ms) / (num_received - 1) if num_received > 1 else 0.0
+        delay_signal_ms = last_delay_ms - self.baseline_delay_ms
+        for i in range(min(num_received, self.__delay_filter.window_size) - 1, -1, -1):
+            median_filtered_delay_ms = self.__median_filter(delay_signal_ms - i * delay_step_ms)
+        self.__exp_smoothed_delay_ms = self.__exp_smoothing_ramp(median_filtered_delay_ms, delay_step_ms,
+                                                                 num_received)
+        self.__est_queuing_delay_ms = self.__non_linear_warping()
+        self.__loss_ratio_estimator.add_train(train)
+        self.__loss_ratio = self.__loss_ratio_estimator.loss_ratio()
+        self.__receiving_rate_estimator.add_train(train)
+        self.__receiving_rate_kbps = self.__receiving_rate_estimator.receiving_rate_kbps()
+        # The derivative is taken per packet: the previous signal is the one of the train's second to
+        # last packet, interpolated from the previous train's.
+        congestion_signal_ms = self.__est_queuing_delay_ms + NadaReceiver.LOSS_PENALTY_MS * self.__loss_ratio
+        previous_congestion_signal_ms = self.__congestion_signal_ms
+        if previous_congestion_signal_ms is not None:
+            previous_congestion_signal_ms += (congestion_signal_ms - previous_congestion_signal_ms) \
+                                           * (num_received - 1.0) / num_received
+        self.__previous_congestion_signal_ms = previous_congestion_signal_ms
+        self.__congestion_signal_ms = congestion_signal_ms
+
+        if record:
+            self.time_ms.append(train.last_arrival_time_ms)
+            self.delay_signals_ms.append(delay_signal_ms)
+            self.median_filtered_delays_ms.append(median_filtered_delay_ms)
+            self.exp_smoothed_delays_ms.append(self.__exp_smoothed_delay_ms)
+            self.est_queuing_delays_ms.append(self.__est_queuing_delay_ms)
+            self.loss_ratios.append(self.__loss_ratio)
+            self.receiving_rates_kbps.append(self.__receiving_rate_kbps)
+            self.congestion_signals_ms.append(self.__congestion_signal_ms)
+            self.history.evict(self.time_ms, self.__all_series, train.last_arrival_time_ms)
+
     def get_feedback(self):
-        now_ms = self.time_ms[-1]
+        now_ms = self.__time_ms
         if now_ms - self.latest_feedback_ms < NadaReceiver.FEEDBACK_INTERVAL_MS:
             return None
 
         delta_ms = now_ms - self.latest_feedback_ms
         self.latest_feedback_ms = now_ms
         derivative = 0.0
-        if len(self.congestion_signals_ms) > 1:
-            derivative = (self.congestion_signals_ms[-1] - self.congestion_signals_ms[-2]) / delta_ms
+        if self.__num_packets > 1:
+            derivative = (self.__congestion_signal_ms - self.__previous_congestion_signal_ms) / delta_ms
 
-        return NadaFeedback(self.est_queuing_delays_ms[-1], self.loss_ratios[-1], self.congestion_signals_ms[-1], derivative,
-                            self.baseline_delay_ms, delta_ms, NadaReceiver.FEEDBACK_INTERVAL_MS, self.receiving_rates_kbps[-1],
-                            self.exp_smoothed_delays_ms[-1])
+        return NadaFeedback(self.__est_queuing_delay_ms, self.__loss_ratio, self.__congestion_signal_ms, derivative,
+                            self.baseline_delay_ms, delta_ms, NadaReceiver.FEEDBACK_INTERVAL_MS, self.__receiving_rate_kbps,
+                            self.__exp_smoothed_delay_ms)
 
-    def __median_filter(self):
-        if self.use_median_filter:
-            K_MEDIAN = 5   # Filter latest 5 elements
-            elements = self.delay_signals_ms[-K_MEDIAN:]
-            return median(elements)
-        else: # Use min element
-            K_MIN = 10
-            elements = self.delay_signals_ms[-K_MIN:]
-            return min(elements)
+    def __compute_loss_ratio(self, packet):
+        if self.incremental_estimators:
+            self.__loss_ratio_estimator.add_packet(packet)
+            return self.__loss_ratio_estimator.loss_ratio()
+        return loss_ratio(self.packets, NadaReceiver.LOSS_RATIO_TIME_WINDOW_MS)
 
-    def __exp_smoothing_filter(self):
-        ALPHA = 0.9
-        if len(self.exp_smoothed_delays_ms) == 0:
-            return self.median_filtered_delays_ms[-1]
-        return ALPHA * self.exp_smoothed_delays_ms[-1] + (1.0-ALPHA) * self.median_filtered_delays_ms[-1]
+    def __compute_receiving_rate_kbps(self, packet):
+        if self.incremental_estimators:
+            self.__receiving_rate_estimator.add_packet(packet)
+            return self.__receiving_rate_estimator.receiving_rate_kbps()
+        return receiving_rate_kbps(self.packets, NadaReceiver.RECEIVING_RATE_TIME_WINDOW_MS)
+
+    def __median_filter(self, delay_signal_ms):
+        return self.__delay_filter.update(delay_signal_ms)
+
+    def __exp_smoothing_filter(self, median_filtered_delay_ms):
+        ALPHA = NadaReceiver.ALPHA
+        if self.__exp_smoothed_delay_ms is None:
+            return median_filtered_delay_ms
+        return ALPHA * self.__exp_smoothed_delay_ms + (1.0-ALPHA) * median_filtered_delay_ms
+
+    # __exp_smoothing_filter applied to num_values values increasing by step_ms up to last_value_ms:
+    # s_n = ALPHA^n * s_0 + (1 - ALPHA^n) * x_n - step * sum_k<n (1 - ALPHA) * k * ALPHA^k.
+    def __exp_smoothing_ramp(self, last_value_ms, step_ms, num_values):
+        ALPHA = NadaReceiver.ALPHA
+        exp_smoothed_delay_ms = self.__exp_smoothed_delay_ms
+        if exp_smoothed_delay_ms is None:
+            exp_smoothed_delay_ms = last_value_ms - (num_values - 1) * step_ms
+        decay = ALPHA ** num_values
+        lag = ALPHA * (1.0 - num_values * ALPHA ** (num_values - 1) + (num_values - 1) * decay) / (1.0 - ALPHA)
+        return decay * exp_smoothed_delay_ms + (1.0 - decay) * last_value_ms - step_ms * lag
 
     def __non_linear_warping(self):
-        MIN_DELAY_MS = 50.0    # Referred as d_th.
-        MAX_DELAY_MS = 400.0   # Referred as d_max.
-        exp_smoothed_delay_ms = self.exp_smoothed_delays_ms[-1]
+        MIN_DELAY_MS = NadaReceiver.MIN_DELAY_MS
+        MAX_DELAY_MS = NadaReceiver.MAX_DELAY_MS
+        exp_smoothed_delay_ms = self.__exp_smoothed_delay_ms
         if exp_smoothed_delay_ms <= MIN_DELAY_MS:
             return exp_smoothed_delay_ms
         elif exp_smoothed_delay_ms < MAX_DELAY_MS:
             return MIN_DELAY_MS * ((MAX_DELAY_MS - exp_smoothed_delay_ms)/(MAX_DELAY_MS - MIN_DELAY_MS)) ** 4
         else:
             return 0.0
-
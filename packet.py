@@ -1,3 +1,5 @@
+from array import array
+
 """
 Simple Packet class for the Simulation Framework.
 Packets are identified by their id, and simulate send and arrival
@@ -6,8 +8,114 @@ timestamps and a payload size.
 
 class Packet(object):
 
+    __slots__ = ('id', 'send_time_ms', 'arrival_time_ms', 'payload_size_bytes')
+
     def __init__(self, id_, send_time_ms_, payload_size_bytes_):
         self.id = id_
         self.send_time_ms = send_time_ms_
         self.arrival_time_ms = None
         self.payload_size_bytes = payload_size_bytes_
+
+"""
+Aggregated unit of the high bitrate mode: a train of num_packets packets of the same payload
+size, e.g. a video frame, paced evenly from first_send_time_ms to last_send_time_ms.
+The link sets how many of them are received, and the arrival times of the first and last
+received ones: arrivals in between are assumed evenly spaced too.
+"""
+
+class PacketTrain(object):
+
+    __slots__ = ('first_id', 'num_packets', 'payload_size_bytes', 'first_send_time_ms', 'last_send_time_ms',
+                 'num_received', 'first_arrival_time_ms', 'last_arrival_time_ms')
+
+    def __init__(self, first_id_, num_packets_, payload_size_bytes_, first_send_time_ms_, last_send_time_ms_):
+        self.first_id = first_id_
+        self.num_packets = num_packets_
+        self.payload_size_bytes = payload_size_bytes_
+        self.first_send_time_ms = first_send_time_ms_
+        self.last_send_time_ms = last_send_time_ms_
+        self.num_received = 0
+        self.first_arrival_time_ms = None
+        self.last_arrival_time_ms = None
+
+    @property
+    def last_id(self):
+        return self.first_id + self.num_packets - 1
+
+    @property
+    def size_bytes(self):
+        return self.num_packets * self.payload_size_bytes
+
+    @property
+    def received_bytes(self):
+        return self.num_received * self.payload_size_bytes
+
+    @property
+    def gap_ms(self):
+        """
+        Time between consecutive send times.
+        """
+        if self.num_packets == 1:
+            return 0.0
+        return (self.last_send_time_ms - self.first_send_time_ms) / (self.num_packets - 1)
+
+"""
+Compact storage for long simulations: packets are copied into growable typed
+columns, one machine value per field, instead of one Python object each.
+Lost packets, without arrival time, are stored with a NaN arrival time.
+Indexing returns read-only PacketView rows, which behave as Packets.
+"""
+
+class PacketStore(object):
+
+    def __init__(self):
+        self.ids = array('q')
+        self.send_times_ms = array('d')
+        self.arrival_times_ms = array('d')
+        self.payload_sizes_bytes = array('d')
+
+    def append(self, packet):
+        self.ids.append(packet.id)
+        self.send_times_ms.append(packet.send_time_ms)
+        arrival_time_ms = packet.arrival_time_ms
+        self.arrival_times_ms.append(float("nan") if arrival_time_ms is None else arrival_time_ms)
+        self.payload_sizes_bytes.append(packet.payload_size_bytes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.ids)
+        if index < 0 or index >= len(self.ids):
+            raise IndexError("PacketStore index out of range")
+        return PacketView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield PacketView(self, index)
+
+class PacketView(object):
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store_, index_):
+        self.store = store_
+        self.index = index_
+
+    @property
+    def id(self):
+        return self.store.ids[self.index]
+
+    @property
+    def send_time_ms(self):
+        return self.store.send_times_ms[self.index]
+
+    @property
+    def arrival_time_ms(self):
+        arrival_time_ms = self.store.arrival_times_ms[self.index]
+        return None if arrival_time_ms != arrival_time_ms else arrival_time_ms
+
+    @property
+    def payload_size_bytes(self):
+        return self.store.payload_sizes_bytes[self.index]
@@ -0,0 +1,64 @@
+import argparse
+import time
+import tracemalloc
+
+from packet import Packet, PacketStore
+from bwe_utils import global_loss_ratio, average_bitrate_kbps, average_delay_ms
+
+"""
+Memory and throughput comparison of packet representations:
+-- dict: Packet objects with a __dict__, as Packet was before __slots__.
+-- slots: current Packet objects, with __slots__.
+-- columnar: packets copied into a PacketStore.
+For each one, measures building a history of num_packets received packets,
+its traced memory, and computing the whole simulation metrics on it.
+e.g. python packet_benchmark.py -n 1000000
+"""
+
+class DictPacket(object):
+
+    def __init__(self, id_, send_time_ms_, payload_size_bytes_):
+        self.id = id_
+        self.send_time_ms = send_time_ms_
+        self.arrival_time_ms = None
+        self.payload_size_bytes = payload_size_bytes_
+
+def build_history(packet_class, columnar, num_packets):
+    history = PacketStore() if columnar else []
+    for i in range(1, num_packets + 1):
+        packet = packet_class(i, 4.0 * i, 1200.0)
+        packet.arrival_time_ms = packet.send_time_ms + 60.0
+        history.append(packet)
+    return history
+
+def measure(name, packet_class, columnar, num_packets):
+    start_s = time.time()
+    history = build_history(packet_class, columnar, num_packets)
+    build_s = time.time() - start_s
+    # Tracing slows allocations down, memory is measured on a second history.
+    tracemalloc.start()
+    traced_history = build_history(packet_class, columnar, num_packets)
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced_history
+
+    start_s = time.time()
+    global_loss_ratio(history)
+    average_bitrate_kbps(history)
+    average_delay_ms(history)
+    metrics_s = time.time() - start_s
+    print("%-9s %12.0f %16.1f %14.1f" % (name, num_packets / build_s, memory_bytes / float(num_packets),
+                                         1000.0 * metrics_s))
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num_packets", type=int, default=200000,
+                        help="Number of packets in the history")
+    return parser.parse_args().num_packets
+
+if __name__ == '__main__':
+    num_packets = parse_args()
+    print("%-9s %12s %16s %14s" % ("packets", "packets/s", "bytes/packet", "metrics (ms)"))
+    measure("dict", DictPacket, False, num_packets)
+    measure("slots", Packet, False, num_packets)
+    measure("columnar", Packet, True, num_packets)
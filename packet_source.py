@@ -1,4 +1,4 @@
-from packet import Packet
+from packet import Packet, PacketTrain
 
 """
 Packets are not initialized directly in the Simulation Framework.
@@ -16,3 +16,17 @@ class PacketSource(object):
         self.__latest_id += 1
         self.__latest_timestamp_ms += (8 * self.PACKET_SIZE_BYTES) / bitrate_kbps
         return Packet(self.__latest_id, self.__latest_timestamp_ms, self.PACKET_SIZE_BYTES)
+
+    def create_train(self, bitrate_kbps, duration_ms):
+        """
+        Aggregated create_packet: a PacketTrain of the packets sent on a constant bitrate
+        within the next duration_ms, at least one. Their ids and send times follow the latest
+        packet's, as consecutive calls to create_packet would.
+        """
+        gap_ms = (8 * self.PACKET_SIZE_BYTES) / bitrate_kbps
+        num_packets = max(1, int(duration_ms / gap_ms))
+        train = PacketTrain(self.__latest_id + 1, num_packets, self.PACKET_SIZE_BYTES,
+                            self.__latest_timestamp_ms + gap_ms, self.__latest_timestamp_ms + num_packets * gap_ms)
+        self.__latest_id += num_packets
+        self.__latest_timestamp_ms = train.last_send_time_ms
+        return train
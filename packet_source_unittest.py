@@ -36,5 +36,25 @@ class TestPacketSource(unittest.TestCase):
             self.assertNear(time_ms, packet.send_time_ms, 0.001)
 
 
+    def test_create_train(self):
+        packet_size_bytes = 1200.0
+        packet_source = PacketSource(packet_size_bytes)
+        train_packet_source = PacketSource(packet_size_bytes)
+
+        for i in range(10):
+            bitrate_kbps = random.randint(150, 50000)
+            duration_ms = random.uniform(1.0, 50.0)
+            train = train_packet_source.create_train(bitrate_kbps, duration_ms)
+            gap_ms = 8 * packet_size_bytes / bitrate_kbps
+            self.assertEqual(train.num_packets, max(1, int(duration_ms / gap_ms)))
+            if train.num_packets > 1:
+                self.assertNear(train.gap_ms, gap_ms, 1e-6)
+            packets = [packet_source.create_packet(bitrate_kbps) for j in range(train.num_packets)]
+            self.assertEqual(train.first_id, packets[0].id)
+            self.assertEqual(train.last_id, packets[-1].id)
+            self.assertNear(train.first_send_time_ms, packets[0].send_time_ms, 1e-6)
+            self.assertNear(train.last_send_time_ms, packets[-1].send_time_ms, 1e-6)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,39 @@
+import unittest
+import random
+
+from packet import Packet, PacketStore
+
+"""
+Unittests for the Packet and PacketStore classes.
+"""
+
+class TestPacket(unittest.TestCase):
+
+    def test_packet_slots(self):
+        packet = Packet(1, 10.0, 1200.0)
+        with self.assertRaises(AttributeError):
+            packet.unknown_field = 0
+
+    def test_packet_store_rows(self):
+        packets = []
+        store = PacketStore()
+        for i in range(100):
+            packet = Packet(i, random.uniform(0.0, 1000.0), random.choice([0.0, 1200.0]))
+            if random.random() < 0.9:  # Some packets are lost.
+                packet.arrival_time_ms = packet.send_time_ms + random.uniform(50.0, 300.0)
+            packets.append(packet)
+            store.append(packet)
+
+        self.assertEqual(len(packets), len(store))
+        for i in range(-len(packets), len(packets)):
+            self.assertEqual(packets[i].id, store[i].id)
+            self.assertEqual(packets[i].send_time_ms, store[i].send_time_ms)
+            self.assertEqual(packets[i].arrival_time_ms, store[i].arrival_time_ms)
+            self.assertEqual(packets[i].payload_size_bytes, store[i].payload_size_bytes)
+        self.assertEqual([p.id for p in packets], [p.id for p in store])
+        with self.assertRaises(IndexError):
+            store[len(packets)]
+
+
+if __name__ == '__main__':
+    unittest.main()
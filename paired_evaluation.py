@@ -0,0 +1,168 @@
+import argparse
+import heapq
+import multiprocessing
+from collections import OrderedDict
+from functools import partial
+
+import numpy
+
+from controller import Controller
+from nada import NadaSender, NadaReceiver
+from history import NoHistory
+from link_simulator import LinkSimulator, JitterStream
+from bwe_utils import SummaryAccumulator
+from evaluation_tests import feedback_loop
+from sweep import SCENARIOS, SUMMARY_FIELDS, mean_confidence_interval, summary_values, print_table
+
+"""
+Paired evaluation of controllers, on common random numbers: for each seed, all controllers run
+in a single process, each one alone on its own link, all links sharing one realization: the jitter
+samples of a single JitterStream, and the same capacity schedule or capacity trace, loaded once.
+The i-th packet each controller receives then gets the same jitter, hence differences between
+controllers come from the controllers, much less from the seed.
+Results are reported per controller, as means over seeds, and as paired differences with the first
+controller, the baseline, with their 95% confidence intervals. The variance reduction of each
+difference is the variance it would have over independent runs, the sum of both controllers'
+variances over seeds, divided by its variance over paired runs: about how many times more seeds
+independent runs need for the same confidence interval.
+Controllers follow the controller.Controller interface, NADA's variants are in CONTROLLERS.
+e.g. python paired_evaluation.py -c original_median modified_median -n 10
+"""
+
+def nada_controller(original_mode, use_median_filter):
+    name = ('original' if original_mode else 'modified') + ('_median' if use_median_filter else '_min')
+    return Controller(name, partial(NadaSender, original_mode),
+                      partial(NadaReceiver, use_median_filter, history_=NoHistory()))
+
+CONTROLLERS = OrderedDict((controller.name, controller) for controller in
+                          [nada_controller(original_mode, use_median_filter)
+                           for original_mode in [True, False] for use_median_filter in [True, False]])
+
+def simulate_paired_flows(flows, times_ms, capacities_kbps, jitter, seed=None, capacity_trace=None):
+    """
+    Simulates each (sender, receiver) flow of flows alone, per packet, on its own link, all links
+    sharing a JitterStream and the capacity schedule, or capacity_trace. Results are kept by the
+    receivers: for a given seed, each flow's are the same as simulate_single_flow's.
+    Flows run in turns, one feedback at a time, the one with the oldest latest feedback first,
+    so that the stream only keeps the jitter samples of a few feedback intervals.
+    """
+    jitter_stream = JitterStream(jitter, seed)
+    if capacity_trace is not None:
+        times_ms, capacities_kbps = times_ms[-1:], [None]
+    loops = []
+    for sender, receiver in flows:
+        link_simulator = LinkSimulator(None, jitter, capacity_trace_=capacity_trace)
+        link_simulator.share_jitter(jitter_stream)
+        loops.append(feedback_loop(sender, receiver, times_ms, capacities_kbps, link_simulator))
+    turns = [(receiver.latest_feedback_ms, i) for i, (sender, receiver) in enumerate(flows)]
+    heapq.heapify(turns)
+    while turns:
+        i = turns[0][1]
+        if next(loops[i], None) is None:
+            heapq.heappop(turns)
+        else:
+            heapq.heapreplace(turns, (flows[i][1].latest_feedback_ms, i))
+
+def run_paired_seed(controllers, scenario, jitter, seed, root_seed=0, capacity_trace_path=None):
+    """
+    Runs all controllers on seed i of root_seed, as sweep.py does, on a scenario of sweep.SCENARIOS,
+    or on the capacity trace at capacity_trace_path. Returns a summary per controller, as an array('d')
+    following sweep.SUMMARY_FIELDS. Receivers without a summary are given one.
+    """
+    seed_sequence = numpy.random.SeedSequence(root_seed, spawn_key=(seed,))
+    flows = [controller.create() for controller in controllers]
+    for sender, receiver in flows:
+        if receiver.summary is None:
+            receiver.summary = SummaryAccumulator()
+    capacity_trace = None
+    if capacity_trace_path is not None:
+        from capacity_trace import load_capacity_trace
+        capacity_trace = load_capacity_trace(capacity_trace_path)
+        times_ms, capacities_kbps = [capacity_trace.end_time_ms], [None]
+    else:
+        times_ms, capacities_kbps = SCENARIOS[scenario]
+    simulate_paired_flows(flows, times_ms, capacities_kbps, jitter, seed_sequence, capacity_trace)
+    return [summary_values(receiver.summary) for sender, receiver in flows]
+
+def __run_paired_seed(args):
+    return run_paired_seed(*args)
+
+def run_paired_evaluation(controllers, scenario, jitter, num_seeds, root_seed=0, num_processes=None,
+                          capacity_trace_path=None):
+    """
+    Runs seeds on a pool of num_processes, the number of cores by default, each one running all controllers.
+    Returns the summaries of each seed, a list of one array per controller.
+    """
+    pool = multiprocessing.Pool(min(num_processes or multiprocessing.cpu_count(), num_seeds))
+    try:
+        return pool.map(__run_paired_seed,
+                        [(controllers, scenario, jitter, seed, root_seed, capacity_trace_path)
+                         for seed in range(num_seeds)],
+                        chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def __variance(values):
+    mean = sum(values) / len(values)
+    return sum([(value - mean) ** 2 for value in values]) / (len(values) - 1)
+
+def paired_difference(baseline_values, values):
+    """
+    Mean of values - baseline_values, paired by seed, the half width of its 95% confidence interval,
+    and its variance reduction, infinite if the paired differences don't vary.
+    """
+    differences = [value - baseline_value for value, baseline_value in zip(values, baseline_values)]
+    mean, half_width = mean_confidence_interval(differences)
+    if len(differences) == 1:
+        return mean, half_width, float("nan")
+    paired_variance = __variance(differences)
+    independent_variance = __variance(baseline_values) + __variance(values)
+    if paired_variance == 0.0:
+        return mean, half_width, float("inf") if independent_variance > 0.0 else float("nan")
+    return mean, half_width, independent_variance / paired_variance
+
+def aggregate_paired(controllers, summaries):
+    """
+    Returns a row per controller: its name, number of seeds, then per summary field the mean and
+    confidence interval half width, and the paired difference with the first controller, its confidence
+    interval half width and variance reduction.
+    """
+    rows = []
+    for i, controller in enumerate(controllers):
+        row = [controller.name, len(summaries)]
+        for j in range(len(SUMMARY_FIELDS)):
+            baseline_values = [seed_summaries[0][j] for seed_summaries in summaries]
+            values = [seed_summaries[i][j] for seed_summaries in summaries]
+            row.extend(mean_confidence_interval(values))
+            row.extend(paired_difference(baseline_values, values))
+        rows.append(row)
+    return rows
+
+def table_header():
+    header = ['controller', 'num_seeds']
+    for field in SUMMARY_FIELDS:
+        header.extend([field, field + '_ci95', field + '_difference', field + '_difference_ci95',
+                       field + '_variance_reduction'])
+    return header
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--controllers", nargs="+", choices=list(CONTROLLERS.keys()),
+                        default=list(CONTROLLERS.keys()), help="Controllers to compare, the first one is the baseline")
+    parser.add_argument("-s", "--scenario", choices=list(SCENARIOS.keys()), default='rmcat_evaluation_1',
+                        help="Scenario to run")
+    parser.add_argument("-tr", "--capacity_trace", help="Capacity trace to run instead of a scenario")
+    parser.add_argument("-j", "--jitter", type=int, choices=[0, 1, 2], default=1, help="Jitter Intensity")
+    parser.add_argument("-n", "--num_seeds", type=int, default=5, help="Number of seeds")
+    parser.add_argument("--seed", type=int, default=0, help="Root seed, the jitter streams are spawned from it")
+    parser.add_argument("-p", "--num_processes", type=int, help="Number of worker processes, cores by default")
+    parser.add_argument("-o", "--output", help="CSV file for the table")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    controllers = [CONTROLLERS[name] for name in args.controllers]
+    summaries = run_paired_evaluation(controllers, args.scenario, args.jitter, args.num_seeds, args.seed,
+                                      args.num_processes, args.capacity_trace)
+    print_table(aggregate_paired(controllers, summaries), args.output, table_header())
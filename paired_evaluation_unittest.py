@@ -0,0 +1,74 @@
+import unittest
+import random
+
+from controller import Controller
+from bwe_utils import SummaryAccumulator
+from evaluation_tests import simulate_single_flow
+from capacity_trace import from_schedule
+from sweep import SUMMARY_FIELDS, summary_values
+from paired_evaluation import CONTROLLERS, simulate_paired_flows, run_paired_seed, run_paired_evaluation
+from paired_evaluation import paired_difference, aggregate_paired
+
+"""
+Unittests for paired evaluations.
+"""
+
+TIMES_MS = [10000.0, 20000.0]
+CAPACITIES_KBPS = [1500.0, 500.0]
+
+class TestPairedEvaluation(unittest.TestCase):
+
+    def assertNear(self, x, y, precision):
+        self.assertTrue(abs(x-y) < precision)
+
+    def flows(self, controllers):
+        flows = [controller.create() for controller in controllers]
+        for sender, receiver in flows:
+            receiver.summary = SummaryAccumulator()
+        return flows
+
+    def test_same_as_single_flows(self):
+        seed = random.randint(0, 10**6)
+        controllers = list(CONTROLLERS.values())
+        capacity_trace = from_schedule(TIMES_MS, CAPACITIES_KBPS)
+        for trace in [None, capacity_trace]:
+            flows = self.flows(controllers)
+            simulate_paired_flows(flows, TIMES_MS, CAPACITIES_KBPS, 2, seed, trace)
+            for (sender, receiver), (single_sender, single_receiver) in zip(flows, self.flows(controllers)):
+                simulate_single_flow(single_sender, single_receiver, TIMES_MS, CAPACITIES_KBPS, 2, seed=seed,
+                                     capacity_trace=trace)
+                self.assertEqual(sender.bitrate_kbps, single_sender.bitrate_kbps)
+                self.assertEqual(summary_values(receiver.summary), summary_values(single_receiver.summary))
+
+    def test_identical_controllers(self):
+        # Same controller, same link realization: same results, whatever the seed.
+        controllers = [CONTROLLERS['modified_min'], Controller('copy', CONTROLLERS['modified_min'].create_sender,
+                                                               CONTROLLERS['modified_min'].create_receiver)]
+        summaries = [run_paired_seed(controllers, 'constant_capacity', 2, seed) for seed in range(3)]
+        for baseline_summary, summary in summaries:
+            self.assertEqual(baseline_summary, summary)
+        self.assertNotEqual(summaries[0][0], summaries[1][0])
+        rows = aggregate_paired(controllers, summaries)
+        self.assertEqual(len(rows[1]), 2 + 5 * len(SUMMARY_FIELDS))
+        self.assertEqual(rows[1][1], 3)  # Number of seeds.
+        self.assertEqual(rows[1][4:7], [0.0, 0.0, float("inf")])  # Average bitrate difference.
+
+    def test_paired_difference(self):
+        baseline_values = [10.0, 20.0, 30.0]
+        values = [11.0, 22.0, 30.0]
+        mean, half_width, variance_reduction = paired_difference(baseline_values, values)
+        self.assertEqual(mean, 1.0)
+        self.assertNear(half_width, 4.303 / 3.0 ** 0.5, 1e-9)
+        self.assertNear(variance_reduction, (100.0 + 91.0) / 1.0, 1e-9)
+        self.assertEqual(paired_difference([1.0], [2.0])[0], 1.0)
+
+    def test_run_paired_evaluation(self):
+        controllers = [CONTROLLERS['original_median'], CONTROLLERS['modified_median']]
+        summaries = run_paired_evaluation(controllers, 'constant_capacity', 1, 2, num_processes=2)
+        self.assertEqual(len(summaries), 2)
+        for seed, seed_summaries in enumerate(summaries):
+            self.assertEqual(seed_summaries, run_paired_seed(controllers, 'constant_capacity', 1, seed))
+
+
+if __name__ == '__main__':
+    unittest.main()
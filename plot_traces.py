@@ -0,0 +1,55 @@
+import argparse
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from traces import load_traces
+
+"""
+Plots simulation results, either at the end of a simulation or later, from a trace file.
+The following parameters can be specified on the command line:
+trace file, --output
+e.g. python plot_traces.py traces.npz -o traces.png saves the figure instead of showing it.
+"""
+
+def plot_traces(series, times_ms, capacities_kbps, output_path=None):
+    """
+    Plots receiving rate against link capacity, delay signal and loss ratio.
+    series holds the time series as attributes, e.g. a NadaReceiver or loaded Traces.
+    The figure is saved to output_path if given, shown otherwise.
+    """
+    plt.subplot(311)
+    plt.plot([time_ms/1000.0 for time_ms in series.time_ms], series.receiving_rates_kbps, label='receiving rate')
+    plt.plot([time_ms/1000.0 for time_ms in [0.0]+times_ms], capacities_kbps[0:1]+capacities_kbps,
+             label='link capacity', drawstyle='steps')
+    plt.ylabel('bitrate (kbps)', fontsize=16)
+
+    plt.subplot(312)
+    plt.plot([time_ms/1000.0 for time_ms in series.time_ms], series.delay_signals_ms, 0, 350, label='delay signal')
+    plt.ylabel('delay (ms)', fontsize=16)
+
+    plt.subplot(313)
+    plt.plot([time_ms/1000.0 for time_ms in series.time_ms], [100.0*ratio for ratio in series.loss_ratios], 0, 100,
+             label='loss ratio')
+    plt.ylabel('packet loss %', fontsize=16)
+    plt.xlabel('time (s)', fontsize=16)
+    if output_path is None:
+        plt.show()
+    else:
+        plt.savefig(output_path)
+        plt.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace_file", help="Trace file, exported by a simulation")
+    parser.add_argument("-o", "--output", help="Image file to save the figure to, instead of showing it")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.output is not None:
+        matplotlib.use('Agg')  # No display needed.
+    with load_traces(args.trace_file) as traces:
+        for key in sorted(traces.metadata.keys()):
+            print("%-24s= %s" % (key, traces.metadata[key]))
+        plot_traces(traces, traces.capacity_times_ms.tolist(), traces.capacities_kbps.tolist(), args.output)
@@ -0,0 +1,229 @@
+import argparse
+import itertools
+
+import numpy
+
+from packet import PacketStore, Packet
+from nada import NadaReceiver
+from bwe_utils import LossRatioEstimator
+
+"""
+Offline re-analysis of the NADA receiver's delay filters on a recorded arrival trace: the
+baseline, median or min filtered, smoothed, warped and congestion signals of a whole trace are
+computed at once with numpy, for a batch of filter parameter sets, without any simulation.
+With default parameters, signals are exactly those NadaReceiver computes for the same packets.
+Parameters don't change which packets arrive: each set shows what the receiver would have
+signalled, not how a sender would have reacted.
+Filters are computed once per distinct window size, the exponential smoothing once per packet
+for all parameter sets, the remaining stages as whole arrays.
+The following parameters can be specified on the command line:
+trace file, --filters, --k_median, --k_min, --alpha, --min_delay, --max_delay
+e.g. python receiver_analysis.py run.npz -km 3 5 9 -a 0.8 0.9 compares 6 median filter chains,
+on a trace exported by main.py -o run.npz.
+"""
+
+class FilterParameters(object):
+
+    def __init__(self, use_median_filter_=True, k_median_=NadaReceiver.K_MEDIAN, k_min_=NadaReceiver.K_MIN,
+                 alpha_=NadaReceiver.ALPHA, min_delay_ms_=NadaReceiver.MIN_DELAY_MS,
+                 max_delay_ms_=NadaReceiver.MAX_DELAY_MS):
+        self.use_median_filter = use_median_filter_
+        self.k_median = k_median_
+        self.k_min = k_min_
+        self.alpha = alpha_
+        self.min_delay_ms = min_delay_ms_
+        self.max_delay_ms = max_delay_ms_
+
+    # Size of the window of the filter in use.
+    @property
+    def window_size(self):
+        return self.k_median if self.use_median_filter else self.k_min
+
+    def __repr__(self):
+        return "FilterParameters(%s, k=%d, alpha=%g, min_delay_ms=%g, max_delay_ms=%g)" % (
+            'median' if self.use_median_filter else 'min', self.window_size, self.alpha, self.min_delay_ms,
+            self.max_delay_ms)
+
+class ReceiverSignals(object):
+
+    # Series are named as the receiver's. Those depending on the filter parameters hold
+    # one row per parameter set, the others a single row shared by all sets.
+    def __init__(self, parameter_sets_, time_ms_, baseline_delays_ms_, delay_signals_ms_, loss_ratios_,
+                 median_filtered_delays_ms_, exp_smoothed_delays_ms_, est_queuing_delays_ms_,
+                 congestion_signals_ms_):
+        self.parameter_sets = parameter_sets_
+        self.time_ms = time_ms_
+        self.baseline_delays_ms = baseline_delays_ms_
+        self.delay_signals_ms = delay_signals_ms_
+        self.loss_ratios = loss_ratios_
+        self.median_filtered_delays_ms = median_filtered_delays_ms_
+        self.exp_smoothed_delays_ms = exp_smoothed_delays_ms_
+        self.est_queuing_delays_ms = est_queuing_delays_ms_
+        self.congestion_signals_ms = congestion_signals_ms_
+
+def packet_columns(packets):
+    """
+    Ids, send and arrival times of the received packets, as arrays: packets are a list of
+    Packets, a deque or a PacketStore, e.g. a NadaReceiver's.
+    """
+    if isinstance(packets, PacketStore):
+        ids = numpy.frombuffer(packets.ids, dtype=numpy.int64)
+        send_times_ms = numpy.frombuffer(packets.send_times_ms)
+        arrival_times_ms = numpy.frombuffer(packets.arrival_times_ms)
+    else:
+        ids = numpy.array([packet.id for packet in packets], dtype=numpy.int64)
+        send_times_ms = numpy.array([packet.send_time_ms for packet in packets], dtype=float)
+        arrival_times_ms = numpy.array([packet.arrival_time_ms for packet in packets], dtype=float)
+    received = arrival_times_ms == arrival_times_ms  # Lost packets are NaN.
+    return ids[received], send_times_ms[received], arrival_times_ms[received]
+
+def analyze_arrivals(ids, send_times_ms, arrival_times_ms, parameter_sets=None):
+    """
+    Receiver signals of packets, in the order the receiver got them, for each of parameter_sets,
+    a list of FilterParameters, the receiver's defaults if not given.
+    """
+    parameter_sets = parameter_sets or [FilterParameters()]
+    ids = numpy.asarray(ids, dtype=numpy.int64)
+    send_times_ms = numpy.asarray(send_times_ms, dtype=float)
+    arrival_times_ms = numpy.asarray(arrival_times_ms, dtype=float)
+    if len(arrival_times_ms) == 0:
+        raise ValueError("No packets to analyze.")
+
+    delays_ms = arrival_times_ms - send_times_ms
+    baseline_delays_ms = numpy.minimum.accumulate(delays_ms)
+    delay_signals_ms = delays_ms - baseline_delays_ms
+    loss_ratios = __loss_ratios(ids, arrival_times_ms, NadaReceiver.LOSS_RATIO_TIME_WINDOW_MS)
+
+    filtered_delays_ms = {}
+    for parameters in parameter_sets:
+        key = (parameters.use_median_filter, parameters.window_size)
+        if key not in filtered_delays_ms:
+            filtered_delays_ms[key] = __windowed(numpy.median if parameters.use_median_filter else numpy.min,
+                                                 delay_signals_ms, parameters.window_size)
+    median_filtered_delays_ms = numpy.vstack([filtered_delays_ms[(parameters.use_median_filter,
+                                                                  parameters.window_size)]
+                                              for parameters in parameter_sets])
+
+    # A recursive filter, hence a loop over packets, computing all parameter sets at once.
+    alpha = numpy.array([parameters.alpha for parameters in parameter_sets])
+    exp_smoothed_delays_ms = numpy.empty_like(median_filtered_delays_ms)
+    exp_smoothed_delays_ms[:, 0] = median_filtered_delays_ms[:, 0]
+    columns = median_filtered_delays_ms.T
+    smoothed_columns = exp_smoothed_delays_ms.T
+    for i in range(1, len(delays_ms)):
+        smoothed_columns[i] = alpha * smoothed_columns[i - 1] + (1.0-alpha) * columns[i]
+
+    min_delay_ms = numpy.array([[parameters.min_delay_ms] for parameters in parameter_sets])
+    max_delay_ms = numpy.array([[parameters.max_delay_ms] for parameters in parameter_sets])
+    # float_power calls pow, as python does, ** may round differently.
+    with numpy.errstate(invalid='ignore'):
+        warped_delays_ms = min_delay_ms * numpy.float_power(
+            (max_delay_ms - exp_smoothed_delays_ms)/(max_delay_ms - min_delay_ms), 4)
+    est_queuing_delays_ms = numpy.where(exp_smoothed_delays_ms <= min_delay_ms, exp_smoothed_delays_ms,
+                                        numpy.where(exp_smoothed_delays_ms < max_delay_ms, warped_delays_ms, 0.0))
+    congestion_signals_ms = est_queuing_delays_ms + NadaReceiver.LOSS_PENALTY_MS * loss_ratios
+
+    return ReceiverSignals(parameter_sets, arrival_times_ms, baseline_delays_ms, delay_signals_ms, loss_ratios,
+                           median_filtered_delays_ms, exp_smoothed_delays_ms, est_queuing_delays_ms,
+                           congestion_signals_ms)
+
+def analyze_packets(packets, parameter_sets=None):
+    """
+    Same as analyze_arrivals, on packets as given to packet_columns.
+    """
+    return analyze_arrivals(*packet_columns(packets), parameter_sets=parameter_sets)
+
+def parameter_grid(filters, k_medians, k_mins, alphas, min_delays_ms, max_delays_ms):
+    """
+    All combinations of the given values, window sizes following the filter.
+    """
+    parameter_sets = []
+    for use_median_filter in filters:
+        window_sizes = k_medians if use_median_filter else k_mins
+        for k, alpha, min_delay_ms, max_delay_ms in itertools.product(window_sizes, alphas, min_delays_ms,
+                                                                      max_delays_ms):
+            if use_median_filter:
+                parameters = FilterParameters(True, k_median_=k, alpha_=alpha, min_delay_ms_=min_delay_ms,
+                                              max_delay_ms_=max_delay_ms)
+            else:
+                parameters = FilterParameters(False, k_min_=k, alpha_=alpha, min_delay_ms_=min_delay_ms,
+                                              max_delay_ms_=max_delay_ms)
+            parameter_sets.append(parameters)
+    return parameter_sets
+
+# reduce, e.g. numpy.median, of the latest window_size values, or of all of them while there are fewer.
+def __windowed(reduce, values, window_size):
+    filtered_values = numpy.empty(len(values))
+    num_first_values = min(window_size - 1, len(values))
+    for i in range(num_first_values):
+        filtered_values[i] = reduce(values[:i + 1])
+    if len(values) >= window_size:
+        windows = numpy.lib.stride_tricks.sliding_window_view(values, window_size)
+        filtered_values[window_size - 1:] = reduce(windows, axis=1)
+    return filtered_values
+
+# Loss ratio of each packet's time window, as LossRatioEstimator. Windows are found by binary
+# search when arrival times increase, the estimator is run otherwise.
+def __loss_ratios(ids, arrival_times_ms, time_window_ms):
+    if numpy.any(numpy.diff(arrival_times_ms) < 0.0):
+        estimator = LossRatioEstimator(time_window_ms)
+        loss_ratios = numpy.empty(len(ids))
+        for i, (packet_id, arrival_time_ms) in enumerate(zip(ids.tolist(), arrival_times_ms.tolist())):
+            packet = Packet(packet_id, 0.0, 0.0)
+            packet.arrival_time_ms = arrival_time_ms
+            estimator.add_packet(packet)
+            loss_ratios[i] = estimator.loss_ratio()
+        return loss_ratios
+    ends = numpy.arange(len(ids))
+    starts = numpy.searchsorted(arrival_times_ms, arrival_times_ms - time_window_ms, side='left')
+    newest_ids = numpy.maximum(0, __window_extremum(numpy.maximum, ids, starts, ends))
+    oldest_ids = __window_extremum(numpy.minimum, ids, starts, ends)
+    return 1.0 - (ends - starts + 1).astype(float)/(newest_ids - oldest_ids + 1)
+
+# Extremum of values[starts[i]:ends[i]+1] for each i, from a sparse table: extremum
+# is either numpy.minimum or numpy.maximum, levels hold extrema of 2**level values.
+def __window_extremum(extremum, values, starts, ends):
+    levels = [values]
+    while 2 ** len(levels) <= len(values):
+        half = 2 ** (len(levels) - 1)
+        levels.append(extremum(levels[-1][:-half], levels[-1][half:]))
+    lengths = ends - starts + 1
+    level_indices = numpy.floor(numpy.log2(lengths)).astype(int)
+    extrema = numpy.empty(len(starts), dtype=values.dtype)
+    for level in numpy.unique(level_indices).tolist():
+        selected = level_indices == level
+        level_values = levels[level]
+        extrema[selected] = extremum(level_values[starts[selected]], level_values[ends[selected] - 2 ** level + 1])
+    return extrema
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace_file", help="Trace file exported by main.py, holding the received packets")
+    parser.add_argument("-f", "--filters", nargs='+', choices=['median', 'min'], default=['median'],
+                        help="Delay filters to try")
+    parser.add_argument("-km", "--k_median", type=int, nargs='+', default=[NadaReceiver.K_MEDIAN],
+                        help="Median filter window sizes")
+    parser.add_argument("-kn", "--k_min", type=int, nargs='+', default=[NadaReceiver.K_MIN],
+                        help="Min filter window sizes")
+    parser.add_argument("-a", "--alpha", type=float, nargs='+', default=[NadaReceiver.ALPHA],
+                        help="Exponential smoothing factors")
+    parser.add_argument("-dn", "--min_delay", type=float, nargs='+', default=[NadaReceiver.MIN_DELAY_MS],
+                        help="Warping thresholds d_th, in ms")
+    parser.add_argument("-dx", "--max_delay", type=float, nargs='+', default=[NadaReceiver.MAX_DELAY_MS],
+                        help="Warping thresholds d_max, in ms")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    from traces import load_traces
+    parameter_sets = parameter_grid([filter == 'median' for filter in args.filters], args.k_median, args.k_min,
+                                    args.alpha, args.min_delay, args.max_delay)
+    with load_traces(args.trace_file) as traces:
+        if 'packet_ids' not in traces.fields:
+            raise SystemExit("%s holds no packets, export it with main.py -o." % args.trace_file)
+        signals = analyze_arrivals(traces.packet_ids, traces.send_times_ms, traces.arrival_times_ms, parameter_sets)
+    print("%-76s %14s %14s %15s" % ("parameters", "smoothed (ms)", "queuing (ms)", "congestion (ms)"))
+    for i, parameters in enumerate(parameter_sets):
+        print("%-76s %14.3f %14.3f %15.3f" % (parameters, signals.exp_smoothed_delays_ms[i].mean(),
+                                              signals.est_queuing_delays_ms[i].mean(),
+                                              signals.congestion_signals_ms[i].mean()))
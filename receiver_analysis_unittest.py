@@ -0,0 +1,87 @@
+import unittest
+import random
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import numpy
+
+from nada import NadaSender, NadaReceiver
+from packet import Packet
+from bwe_utils import LossRatioEstimator
+from evaluation_tests import simulate_single_flow
+from receiver_analysis import FilterParameters, analyze_arrivals, analyze_packets, parameter_grid
+
+"""
+Unittests for the offline re-analysis of receiver filters.
+"""
+
+# Capacity drops, for losses.
+TIMES_MS = [3000.0, 6000.0]
+CAPACITIES_KBPS = [2000.0, 200.0]
+SIGNALS = ['delay_signals_ms', 'median_filtered_delays_ms', 'exp_smoothed_delays_ms', 'est_queuing_delays_ms',
+           'loss_ratios', 'congestion_signals_ms']
+
+class TestReceiverAnalysis(unittest.TestCase):
+
+    def simulate(self, use_median_filter):
+        receiver = NadaReceiver(use_median_filter)
+        simulate_single_flow(NadaSender(True), receiver, TIMES_MS, CAPACITIES_KBPS, 2,
+                             seed=random.randint(0, 10**6))
+        return receiver
+
+    # Signals of a receiver with the given parameters, on the given packets.
+    def receive(self, packets, parameters):
+        with mock.patch.object(NadaReceiver, 'ALPHA', parameters.alpha), \
+             mock.patch.object(NadaReceiver, 'MIN_DELAY_MS', parameters.min_delay_ms), \
+             mock.patch.object(NadaReceiver, 'MAX_DELAY_MS', parameters.max_delay_ms):
+            receiver = NadaReceiver(parameters.use_median_filter, k_median_=parameters.k_median,
+                                    k_min_=parameters.k_min)
+            for packet in packets:
+                receiver.receive_packet(packet)
+        return receiver
+
+    def test_default_parameters(self):
+        for use_median_filter in [True, False]:
+            receiver = self.simulate(use_median_filter)
+            self.assertGreater(max(receiver.loss_ratios), 0.0)
+            signals = analyze_packets(receiver.packets, [FilterParameters(use_median_filter)])
+            for signal in SIGNALS:
+                values = getattr(signals, signal)
+                values = values if values.ndim == 1 else values[0]
+                self.assertEqual(values.tolist(), list(getattr(receiver, signal)))
+            self.assertEqual(signals.baseline_delays_ms[-1], receiver.baseline_delay_ms)
+
+    def test_parameter_batch(self):
+        receiver = self.simulate(True)
+        parameter_sets = parameter_grid([True, False], [1, 4, 7], [3, 16], [0.7, 0.95], [20.0, 50.0], [400.0])
+        self.assertEqual(len(parameter_sets), 20)
+        signals = analyze_packets(receiver.packets, parameter_sets)
+        for i in random.sample(range(len(parameter_sets)), 6):
+            expected_receiver = self.receive(receiver.packets, parameter_sets[i])
+            for signal in SIGNALS[1:]:
+                values = getattr(signals, signal)
+                values = values if values.ndim == 1 else values[i]
+                self.assertEqual(values.tolist(), list(getattr(expected_receiver, signal)))
+
+    def test_loss_ratios(self):
+        # Lost, then reordered ids, at increasing, then shuffled arrival times.
+        ids = [i for i in range(3000) if random.random() > 0.1]
+        for i in range(0, len(ids) - 3, 7):
+            ids[i], ids[i + 2] = ids[i + 2], ids[i]
+        arrival_times_ms = numpy.cumsum(numpy.random.uniform(0.0, 10.0, len(ids))).tolist()
+        for times_ms in [arrival_times_ms, random.sample(arrival_times_ms, len(arrival_times_ms))]:
+            estimator = LossRatioEstimator(NadaReceiver.LOSS_RATIO_TIME_WINDOW_MS)
+            expected_loss_ratios = []
+            for packet_id, time_ms in zip(ids, times_ms):
+                packet = Packet(packet_id, 0.0, 0.0)
+                packet.arrival_time_ms = time_ms
+                estimator.add_packet(packet)
+                expected_loss_ratios.append(estimator.loss_ratio())
+            signals = analyze_arrivals(ids, numpy.zeros(len(ids)), times_ms)
+            self.assertEqual(signals.loss_ratios.tolist(), expected_loss_ratios)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+"""
+On-disk cache of simulation results, shared by sweeps, notebooks and CI jobs running on a machine.
+Results are keyed by a hash of the full configuration and of a fingerprint of the simulator
+sources: editing them invalidates the whole cache.
+Each result is a file, named by its key, holding its summary and optionally its traces.
+Files are written to a temporary file, then renamed: pool workers and concurrent processes
+read whole results or nothing. Reading a result touches it, and once the cache exceeds its size,
+the least recently used results are removed.
+"""
+
+# Sources a simulation result depends on, relative to this directory: all the modules sweep.py imports.
+SIMULATOR_SOURCES = ['nada.py', 'controller.py', 'history.py', 'link_simulator.py', 'bwe_utils.py', 'packet_source.py',
+                     'packet.py', 'event_simulator.py', 'evaluation_tests.py', 'traces.py', 'sweep.py']
+DEFAULT_MAX_SIZE_BYTES = 1 << 30
+RESULT_EXTENSION = '.result'
+
+def source_fingerprint(paths=None):
+    """
+    Hash of the contents of the given source files, SIMULATOR_SOURCES by default.
+    """
+    if paths is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        paths = [os.path.join(directory, source) for source in SIMULATOR_SOURCES]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as source_file:
+            digest.update(hashlib.sha256(source_file.read()).digest())
+    return digest.hexdigest()
+
+class ResultCache(object):
+
+    # Caches are pickled to pool workers, with the fingerprint computed once.
+    def __init__(self, directory_, max_size_bytes_=DEFAULT_MAX_SIZE_BYTES, fingerprint_=None):
+        self.directory = directory_
+        self.max_size_bytes = max_size_bytes_
+        self.fingerprint = fingerprint_ or source_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory_):
+            try:
+                os.makedirs(directory_)
+            except OSError:  # Created by a concurrent process.
+                if not os.path.isdir(directory_):
+                    raise
+
+    def key(self, configuration):
+        """
+        Key of a configuration: any JSON serializable value describing the whole simulation.
+        """
+        description = json.dumps([self.fingerprint, configuration], sort_keys=True, default=str)
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def get(self, key, with_traces=False):
+        """
+        Returns the (summary, traces) result of key, or None if it isn't cached, or has no
+        traces while with_traces is set.
+        """
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as result_file:
+                summary, traces = pickle.load(result_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):  # Missing, or just evicted.
+            self.misses += 1
+            return None
+        if with_traces and traces is None:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return summary, traces
+
+    def put(self, key, summary, traces=None):
+        """
+        Caches the result of key, then evicts results if the cache is too large.
+        """
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as result_file:
+                pickle.dump((summary, traces), result_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.__path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used results until the cache fits in max_size_bytes.
+        """
+        entries = []
+        size_bytes = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(RESULT_EXTENSION):
+                continue
+            try:
+                status = os.stat(os.path.join(self.directory, name))
+            except OSError:  # Removed by a concurrent process.
+                continue
+            entries.append((status.st_mtime_ns, name, status.st_size))
+            size_bytes += status.st_size
+        entries.sort()
+        for _, name, entry_size_bytes in entries:
+            if size_bytes <= self.max_size_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            size_bytes -= entry_size_bytes
+
+    def size_bytes(self):
+        return sum([os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)
+                    if name.endswith(RESULT_EXTENSION)])
+
+    def __len__(self):
+        return len([name for name in os.listdir(self.directory) if name.endswith(RESULT_EXTENSION)])
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + RESULT_EXTENSION)
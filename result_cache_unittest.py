@@ -0,0 +1,103 @@
+import unittest
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from result_cache import ResultCache, source_fingerprint, SIMULATOR_SOURCES
+
+"""
+Unittests for the on-disk result cache.
+"""
+
+RESULT_BYTES = 10000
+# Prints the local modules a sweep imports, run in a fresh interpreter.
+LOCAL_IMPORTS_SCRIPT = '''
+import os, sys, sweep
+for module in list(sys.modules.values()):
+    path = getattr(module, '__file__', None)
+    if path is not None and os.path.dirname(os.path.abspath(path)) == os.getcwd():
+        print(os.path.basename(path))
+'''
+
+def use_cache(args):
+    cache, worker = args
+    for i in range(50):
+        key = cache.key(['configuration', (worker + i) % 8])
+        result = cache.get(key)
+        if result is not None and result[0] != b'%d' % ((worker + i) % 8) * RESULT_BYTES:
+            return False
+        cache.put(key, b'%d' % ((worker + i) % 8) * RESULT_BYTES)
+    return True
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_and_put(self):
+        cache = ResultCache(os.path.join(self.directory, 'cache'))
+        key = cache.key({'jitter': 1, 'seed': 3})
+        self.assertEqual(key, cache.key({'seed': 3, 'jitter': 1}))
+        self.assertNotEqual(key, cache.key({'jitter': 1, 'seed': 4}))
+        self.assertIsNone(cache.get(key))
+        cache.put(key, b'summary')
+        self.assertEqual(cache.get(key), (b'summary', None))
+        self.assertIsNone(cache.get(key, with_traces=True))
+        cache.put(key, b'summary', [b'trace'])
+        self.assertEqual(cache.get(key, with_traces=True), (b'summary', [b'trace']))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        # Another simulator version misses.
+        other_cache = ResultCache(cache.directory, fingerprint_='other')
+        self.assertIsNone(other_cache.get(other_cache.key({'jitter': 1, 'seed': 3})))
+        self.assertEqual(len(cache), 1)
+
+    def test_lru_eviction(self):
+        cache = ResultCache(self.directory)
+        keys = [cache.key(i) for i in range(4)]
+        for key in keys[:3]:
+            cache.put(key, b'0' * RESULT_BYTES)
+        for i, key in enumerate(keys[:3]):
+            os.utime(os.path.join(self.directory, key + '.result'), (i, i))
+        result_size_bytes = cache.size_bytes() // 3
+        cache.max_size_bytes = 3 * result_size_bytes
+        self.assertIsNotNone(cache.get(keys[0]))  # Most recently used.
+        cache.put(keys[3], b'0' * RESULT_BYTES)
+        self.assertEqual([cache.get(key) is not None for key in keys], [True, False, True, True])
+        self.assertLessEqual(cache.size_bytes(), cache.max_size_bytes)
+
+    def test_concurrent_access(self):
+        cache = ResultCache(self.directory, 5 * RESULT_BYTES)
+        pool = multiprocessing.Pool(4)
+        try:
+            self.assertTrue(all(pool.map(use_cache, [(cache, worker) for worker in range(8)])))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertLessEqual(cache.size_bytes(), 5 * RESULT_BYTES)
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith('.tmp')], [])
+
+    def test_source_fingerprint(self):
+        path = os.path.join(self.directory, 'source.py')
+        with open(path, 'w') as source_file:
+            source_file.write('x = 1\n')
+        fingerprint = source_fingerprint([path])
+        self.assertEqual(fingerprint, source_fingerprint([path]))
+        with open(path, 'w') as source_file:
+            source_file.write('x = 2\n')
+        self.assertNotEqual(fingerprint, source_fingerprint([path]))
+        self.assertEqual(len(source_fingerprint()), 64)
+
+    def test_simulator_sources(self):
+        directory = os.path.dirname(os.path.abspath(__file__))
+        modules = subprocess.check_output([sys.executable, '-c', LOCAL_IMPORTS_SCRIPT], cwd=directory).decode().split()
+        self.assertEqual(sorted(modules), sorted(SIMULATOR_SOURCES))
+
+
+if __name__ == '__main__':
+    unittest.main()
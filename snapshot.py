@@ -0,0 +1,158 @@
+import argparse
+import copy
+import multiprocessing
+import pickle
+import time
+import zlib
+
+from nada import NadaSender, NadaReceiver
+from history import NoHistory
+from link_simulator import LinkSimulator
+from bwe_utils import SummaryAccumulator
+from evaluation_tests import RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS
+
+"""
+Snapshots and forks of single flow simulations, to simulate a prefix shared by many experiments once,
+e.g. the first 60 s of RMCAT Evaluation test 5.1, then branches differing only afterwards, such as
+the sender switching modes at the 2500 to 600 kbps drop.
+A Simulation holds the whole state of a run: the PacketSource counters of its sender and the
+sender's rate control state, the link's queue, jitter timestamps, unconsumed jitter samples and
+generator state, the receiver's estimator windows, filters and history, and the loop's position.
+It can be stopped at any time, then resumed, without changing its results.
+-- fork() deep copies a simulation, in process. Read only inputs, capacity traces and link
+   realizations, are shared by the copies.
+-- snapshot() pickles a simulation, compressed, e.g. to send it to workers, and restore() loads it.
+   Receivers keeping no history, with a summary, make snapshots of a few tens of kB.
+run_branches forks a simulation once per branch, a function changing the fork, e.g. switch_sender_mode,
+and runs the forks to their end, in process, or on a process pool.
+Instrumented senders, receivers and links, see instrumentation.py, and recording links can't be forked
+nor snapshot: both raise a ValueError.
+The following parameters can be specified on the command line:
+--fork_time, --jitter, --seed, --num_processes
+e.g. python snapshot.py -ft 60 -j 2 runs RMCAT 5.1 once until 60 s, then forks it into both sender modes.
+"""
+
+class Simulation(object):
+    """
+    Per packet simulation of a single flow, as simulate_single_flow's: capacities_kbps[i] is used until
+    times_ms[i]. The same seed gives the same results, whether the simulation is stopped, resumed,
+    forked or restored on the way. link_simulator_ replaces the seeded link if given, e.g. on a trace.
+    """
+
+    def __init__(self, sender_, receiver_, times_ms_, capacities_kbps_, jitter, seed=None, link_simulator_=None):
+        self.sender = sender_
+        self.receiver = receiver_
+        self.times_ms = times_ms_
+        self.capacities_kbps = capacities_kbps_
+        self.link_simulator = link_simulator_ or LinkSimulator(None, jitter, seed)
+        self.now_ms = 0.0  # Send time of the latest packet.
+        self.__step = 0  # Index of the current capacity.
+
+    @property
+    def done(self):
+        return self.__step == len(self.capacities_kbps)
+
+    # Same loop as evaluation_tests.feedback_loop, stopping once the latest packet is sent at or after time_ms.
+    def run_until(self, time_ms):
+        sender, receiver, link_simulator = self.sender, self.receiver, self.link_simulator
+        while self.__step < len(self.capacities_kbps):
+            link_simulator.capacity_kbps = self.capacities_kbps[self.__step]
+            end_time_ms = self.times_ms[self.__step]
+            while self.now_ms < end_time_ms:
+                if self.now_ms >= time_ms:
+                    return
+                packet = sender.create_packet()
+                link_simulator.send_packet(packet)
+                if packet.arrival_time_ms is not None:
+                    receiver.receive_packet(packet)
+                feedback = receiver.get_feedback()
+                if feedback is not None:
+                    sender.receive_feedback(feedback)
+                self.now_ms = packet.send_time_ms
+            self.__step += 1
+
+    def run(self):
+        self.run_until(float("inf"))
+
+    def fork(self):
+        return copy.deepcopy(self)
+
+    # Used by fork and snapshot. Methods overridden on an instance, e.g. by instrumentation.instrument,
+    # would be shared by the copies, or can't be pickled. The link's own replay methods are restored on load.
+    def __getstate__(self):
+        for name, instance in [('sender', self.sender), ('receiver', self.receiver),
+                               ('link', self.link_simulator)]:
+            overrides = sorted([attribute for attribute, value in vars(instance).items()
+                                if callable(value) and hasattr(type(instance), attribute)
+                                and getattr(value, '__self__', None) is not instance])
+            if overrides:
+                raise ValueError("A simulation whose %s overrides %s can't be copied." % (name, ", ".join(overrides)))
+        return self.__dict__
+
+def snapshot(simulation):
+    """
+    Returns simulation's state, as compressed bytes.
+    """
+    return zlib.compress(pickle.dumps(simulation, pickle.HIGHEST_PROTOCOL))
+
+def restore(snapshot_bytes):
+    return pickle.loads(zlib.decompress(snapshot_bytes))
+
+def switch_sender_mode(simulation, original_mode=False):
+    """
+    Branch switching a NadaSender's operation mode, e.g. functools.partial(switch_sender_mode, original_mode=True).
+    """
+    simulation.sender.set_original_mode(original_mode)
+
+def run_branches(simulation, branches, num_processes=None):
+    """
+    Forks simulation once per branch, calls the branch on its fork, unless it is None, then runs the fork
+    until its end. Returns the forks, in branches order. simulation itself isn't changed.
+    If num_processes is given, forks are restored from a snapshot by a pool of workers: branches must
+    then be picklable, e.g. module level functions or functools.partial of them.
+    """
+    if num_processes is None:
+        return [__run_branch(simulation.fork(), branch) for branch in branches]
+    snapshot_bytes = snapshot(simulation)
+    pool = multiprocessing.Pool(min(num_processes, len(branches)))
+    try:
+        return pool.map(__run_restored_branch, [(snapshot_bytes, branch) for branch in branches], chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def __run_branch(simulation, branch):
+    if branch is not None:
+        branch(simulation)
+    simulation.run()
+    return simulation
+
+def __run_restored_branch(args):
+    snapshot_bytes, branch = args
+    return __run_branch(restore(snapshot_bytes), branch)
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-ft", "--fork_time", type=float, default=60.0, help="Time of the fork, in s")
+    parser.add_argument("-j", "--jitter", type=int, choices=[0, 1, 2], default=1, help="Jitter Intensity")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed for the link's jitter")
+    parser.add_argument("-p", "--num_processes", type=int, help="Run the branches on a pool of workers")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    simulation = Simulation(NadaSender(True), NadaReceiver(True, history_=NoHistory(), summary_=SummaryAccumulator()),
+                            RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS, args.jitter, args.seed)
+    start_s = time.perf_counter()
+    simulation.run_until(1000.0 * args.fork_time)
+    prefix_s = time.perf_counter() - start_s
+    print("Prefix (s)              =", prefix_s)
+    print("Snapshot size (bytes)   =", len(snapshot(simulation)))
+    start_s = time.perf_counter()
+    branches = run_branches(simulation, [None, switch_sender_mode], args.num_processes)
+    print("Branches (s)            =", time.perf_counter() - start_s)
+    for name, branch in zip(['original mode', 'modified mode after fork'], branches):
+        summary = branch.receiver.summary
+        print("%-24s: bitrate %.1f kbps, delay %.1f ms, loss %.4f, p95 delay %.1f ms"
+              % (name, summary.average_bitrate_kbps(), summary.average_delay_ms(), summary.global_loss_ratio(),
+                 summary.delay_quantile_ms(0.95)))
@@ -0,0 +1,142 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+from functools import partial
+
+from nada import NadaSender, NadaReceiver
+from history import NoHistory
+from link_simulator import LinkSimulator
+from link_realization import load_realization
+from bwe_utils import SummaryAccumulator
+from capacity_trace import from_schedule
+from evaluation_tests import simulate_single_flow
+from sweep import summary_values
+from instrumentation import SimulationStats, instrument
+from snapshot import Simulation, snapshot, restore, switch_sender_mode, run_branches
+
+"""
+Unittests for simulation snapshots and forks.
+"""
+
+TIMES_MS = [10000.0, 20000.0, 30000.0]
+CAPACITIES_KBPS = [1000.0, 2500.0, 600.0]
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.seed = random.randint(0, 10**6)
+
+    def simulation(self, original_mode=True, history=None, link_simulator=None):
+        return Simulation(NadaSender(original_mode), NadaReceiver(True, history_=history, summary_=SummaryAccumulator()),
+                          TIMES_MS, CAPACITIES_KBPS, 2, self.seed, link_simulator)
+
+    def assertSameRun(self, simulation, other):
+        self.assertEqual(simulation.sender.bitrate_kbps, other.sender.bitrate_kbps)
+        self.assertEqual(summary_values(simulation.receiver.summary), summary_values(other.receiver.summary))
+        self.assertEqual([(packet.id, packet.arrival_time_ms) for packet in simulation.receiver.packets],
+                         [(packet.id, packet.arrival_time_ms) for packet in other.receiver.packets])
+
+    def test_resume(self):
+        simulation = self.simulation()
+        for time_ms in [0.0, 5000.0, 5000.0, 10000.0, 17777.7]:
+            simulation.run_until(time_ms)
+            self.assertFalse(simulation.done)
+            self.assertGreaterEqual(simulation.now_ms, time_ms)
+        simulation.run()
+        self.assertTrue(simulation.done)
+        sender, receiver = NadaSender(True), NadaReceiver(True, summary_=SummaryAccumulator())
+        simulate_single_flow(sender, receiver, TIMES_MS, CAPACITIES_KBPS, 2, seed=self.seed)
+        self.assertEqual(simulation.sender.bitrate_kbps, sender.bitrate_kbps)
+        self.assertEqual(summary_values(simulation.receiver.summary), summary_values(receiver.summary))
+        self.assertEqual(len(simulation.receiver.packets), len(receiver.packets))
+
+    def test_fork_and_restore(self):
+        straight = self.simulation()
+        straight.run()
+        simulation = self.simulation()
+        simulation.run_until(12345.0)
+        now_ms = simulation.now_ms
+        num_packets = len(simulation.receiver.packets)
+        fork = simulation.fork()
+        restored = restore(snapshot(simulation))
+        fork.run()
+        restored.run()
+        # Running the copies leaves the simulation as it was.
+        self.assertEqual(simulation.now_ms, now_ms)
+        self.assertEqual(len(simulation.receiver.packets), num_packets)
+        simulation.run()
+        for other in [fork, restored, simulation]:
+            self.assertSameRun(straight, other)
+
+    def test_compact_snapshot(self):
+        simulation = self.simulation(history=NoHistory())
+        simulation.run_until(25000.0)
+        self.assertLess(len(snapshot(simulation)), 50000)
+        restored = restore(snapshot(simulation))
+        simulation.run()
+        restored.run()
+        self.assertSameRun(simulation, restored)
+
+    def test_shared_inputs(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'link.bin')
+            recorded = self.simulation()
+            recorded.link_simulator.record(path)
+            recorded.run_until(5000.0)
+            with self.assertRaises(ValueError):
+                recorded.fork()
+            recorded.run()
+            recorded.link_simulator.stop_recording()
+            realization = load_realization(path)
+            link_simulator = LinkSimulator(None, 0)
+            link_simulator.replay(realization)
+            simulation = self.simulation(link_simulator=link_simulator)
+            simulation.run_until(15000.0)
+            fork = simulation.fork()
+            self.assertIs(fork.link_simulator._LinkSimulator__realization, realization)
+            restored = restore(snapshot(simulation))
+            for other in [simulation, fork, restored]:
+                other.run()
+                self.assertSameRun(recorded, other)
+        finally:
+            shutil.rmtree(directory)
+        capacity_trace = from_schedule(TIMES_MS, CAPACITIES_KBPS)
+        simulation = Simulation(NadaSender(True), NadaReceiver(True), TIMES_MS[-1:], [None], 2, self.seed,
+                                LinkSimulator(None, 2, self.seed, capacity_trace_=capacity_trace))
+        simulation.run_until(15000.0)
+        self.assertIs(simulation.fork().link_simulator.capacity_trace, capacity_trace)
+
+    def test_no_instrumented_copies(self):
+        for instances in [lambda simulation: (simulation.sender, None, None),
+                          lambda simulation: (None, simulation.receiver, None),
+                          lambda simulation: (None, None, simulation.link_simulator)]:
+            simulation = self.simulation()
+            instrument(SimulationStats(), *instances(simulation))
+            simulation.run_until(5000.0)
+            num_packets = len(simulation.receiver.packets)
+            with self.assertRaises(ValueError):
+                simulation.fork()
+            with self.assertRaises(ValueError):
+                snapshot(simulation)
+            self.assertEqual(len(simulation.receiver.packets), num_packets)
+
+    def test_run_branches(self):
+        simulation = self.simulation()
+        simulation.run_until(20000.0)
+        branches = [None, switch_sender_mode, partial(switch_sender_mode, original_mode=True)]
+        forks = run_branches(simulation, branches)
+        self.assertFalse(simulation.done)
+        self.assertTrue(all([fork.done for fork in forks]))
+        self.assertTrue(forks[0].sender.original_mode)
+        self.assertFalse(forks[1].sender.original_mode)
+        self.assertSameRun(forks[0], forks[2])
+        self.assertNotEqual(summary_values(forks[0].receiver.summary), summary_values(forks[1].receiver.summary))
+        for fork, pool_fork in zip(forks, run_branches(simulation, branches, 2)):
+            self.assertSameRun(fork, pool_fork)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import subprocess
+import sys
+
+"""
+Startup benchmark: import cost of the simulation modules, measured by python -X importtime
+in fresh interpreters, and the heavy dependencies each of them loads.
+Results can be saved, then used as a baseline to track import cost over time:
+the benchmark fails if a module gets slower than the threshold, or loads a new heavy dependency.
+e.g. python startup_benchmark.py -o startup.json, later python startup_benchmark.py -b startup.json
+"""
+
+MODULES = ['nada', 'link_simulator', 'evaluation_tests', 'main', 'sweep']
+HEAVY_MODULES = ['numpy', 'matplotlib']
+
+def import_time_us(module):
+    """
+    Imports module in a fresh interpreter. Returns its cumulative import time, in us,
+    and the heavy modules it loaded.
+    """
+    code = "import sys, %s; print(','.join([m for m in %r if m in sys.modules]))" % (module, HEAVY_MODULES)
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', code],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    output, importtime_output = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(importtime_output)
+    # Lines are "import time: self [us] | cumulative | imported package", nested ones indented.
+    for line in importtime_output.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].rstrip() == ' ' + module:
+            loaded_modules = [name for name in output.strip().split(',') if name]
+            return int(fields[1]), loaded_modules
+    raise RuntimeError("No import time for %s" % module)
+
+def run_benchmark(modules, num_runs):
+    """
+    Returns, per module, the median import time over num_runs, in us, and the heavy modules it loads.
+    """
+    results = {}
+    for module in modules:
+        times_us = []
+        for i in range(num_runs):
+            time_us, loaded_modules = import_time_us(module)
+            times_us.append(time_us)
+        results[module] = {'import_time_us': sorted(times_us)[num_runs // 2], 'heavy_modules': loaded_modules}
+    return results
+
+def regressions(results, baseline, threshold):
+    """
+    Modules slower than baseline by more than threshold, as a ratio, or loading new heavy modules.
+    """
+    messages = []
+    for module in sorted(results.keys()):
+        if module not in baseline:
+            continue
+        ratio = float(results[module]['import_time_us']) / baseline[module]['import_time_us']
+        if ratio > 1.0 + threshold:
+            messages.append("%s imports %.2fx slower than baseline" % (module, ratio))
+        new_modules = set(results[module]['heavy_modules']) - set(baseline[module]['heavy_modules'])
+        if new_modules:
+            messages.append("%s now loads %s" % (module, ", ".join(sorted(new_modules))))
+    return messages
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--modules", nargs="+", default=MODULES, help="Modules to import")
+    parser.add_argument("-n", "--num_runs", type=int, default=5, help="Runs per module, the median is kept")
+    parser.add_argument("-o", "--output", help="JSON file to save the results to, e.g. as a baseline")
+    parser.add_argument("-b", "--baseline", help="JSON file of previous results, to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=0.5,
+                        help="Tolerated slowdown against the baseline, as a ratio")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run_benchmark(args.modules, args.num_runs)
+    print("%20s %16s   %s" % ("module", "import time (ms)", "heavy modules"))
+    for module in args.modules:
+        print("%20s %16.1f   %s" % (module, results[module]['import_time_us'] / 1000.0,
+                                    ", ".join(results[module]['heavy_modules'])))
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            messages = regressions(results, json.load(baseline_file), args.threshold)
+        for message in messages:
+            print(message)
+        sys.exit(1 if messages else 0)
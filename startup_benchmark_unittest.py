@@ -0,0 +1,31 @@
+import unittest
+
+from startup_benchmark import import_time_us, regressions
+
+"""
+Unittests for the startup benchmark, and the lazy imports it tracks.
+"""
+
+class TestStartupBenchmark(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        # The scalar simulation path needs neither numpy nor matplotlib.
+        for module in ['nada', 'evaluation_tests', 'main']:
+            time_us, loaded_modules = import_time_us(module)
+            self.assertTrue(time_us > 0)
+            self.assertEqual(loaded_modules, [])
+        self.assertEqual(import_time_us('plot_traces')[1], ['numpy', 'matplotlib'])
+
+    def test_regressions(self):
+        baseline = {'nada': {'import_time_us': 1000, 'heavy_modules': []},
+                    'main': {'import_time_us': 1000, 'heavy_modules': ['numpy']}}
+        results = {'nada': {'import_time_us': 1400, 'heavy_modules': []},
+                   'main': {'import_time_us': 1000, 'heavy_modules': ['numpy']}}
+        self.assertEqual(regressions(results, baseline, 0.5), [])
+        results['nada']['import_time_us'] = 1600
+        results['main']['heavy_modules'] = ['numpy', 'matplotlib']
+        self.assertEqual(len(regressions(results, baseline, 0.5)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
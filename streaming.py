@@ -0,0 +1,243 @@
+import argparse
+import csv
+from collections import OrderedDict
+
+from nada import NadaSender, NadaReceiver
+from link_simulator import LinkSimulator
+from history import NoHistory
+from bwe_utils import SummaryAccumulator
+from evaluation_tests import feedback_loop, DELAY_PERCENTILES, RMCAT_EVALUATION_1_TIMES_MS
+from evaluation_tests import RMCAT_EVALUATION_1_CAPACITIES_KBPS
+
+"""
+Constant memory simulations, e.g. hours of simulated time to catch slow drifts, such as
+a stale baseline delay, or the modified sender's min_est_travel_time_ms.
+A streaming simulation is a generator of one FeedbackRecord per feedback interval.
+Receivers should keep no history, see history.NoHistory, and whole run averages and delay
+percentiles come from a bwe_utils.SummaryAccumulator. Records go to sinks:
+-- CsvSink writes records to a CSV file, as they come.
+-- SummarySink aggregates records online: mean, min and max of each field.
+-- DecimatingSink keeps at most max_points evenly spaced records, e.g. to be plotted.
+Sinks have write(record) and close() methods, memory of all of them is bounded.
+The following parameters can be specified on the command line:
+--duration, --capacity, --capacity_trace, --jitter, --seed, --modified_sender, --modified_filter,
+--output, --plot
+e.g. python streaming.py -d 36000 -ms -o records.csv -p records.png runs 10 hours of modified NADA.
+"""
+
+class FeedbackRecord(object):
+
+    FIELDS = ('time_ms', 'bitrate_kbps', 'receiving_rate_kbps', 'exp_smoothed_delay_ms', 'est_queuing_delay_ms',
+              'loss_ratio', 'capacity_kbps', 'baseline_delay_ms', 'min_est_travel_time_ms')
+
+    __slots__ = FIELDS
+
+    def __init__(self, time_ms_, bitrate_kbps_, receiving_rate_kbps_, exp_smoothed_delay_ms_, est_queuing_delay_ms_,
+                 loss_ratio_, capacity_kbps_, baseline_delay_ms_, min_est_travel_time_ms_):
+        self.time_ms = time_ms_
+        self.bitrate_kbps = bitrate_kbps_
+        self.receiving_rate_kbps = receiving_rate_kbps_
+        self.exp_smoothed_delay_ms = exp_smoothed_delay_ms_
+        self.est_queuing_delay_ms = est_queuing_delay_ms_
+        self.loss_ratio = loss_ratio_
+        self.capacity_kbps = capacity_kbps_
+        self.baseline_delay_ms = baseline_delay_ms_
+        self.min_est_travel_time_ms = min_est_travel_time_ms_
+
+    def values(self):
+        return [getattr(self, field) for field in FeedbackRecord.FIELDS]
+
+def stream_single_flow(sender, receiver, times_ms, capacities_kbps, jitter, seed=None, cross_traffic=None,
+                       capacity_trace=None):
+    """
+    Simulates a RMCAT single flow, as simulate_single_flow does per packet, yielding a FeedbackRecord
+    once the sender received each feedback: the sender's new bitrate, the feedback's signals and the
+    link capacity at the feedback time. min_est_travel_time_ms is nan for the original sender mode.
+    """
+    from capacity_trace import from_schedule
+    link_simulator = LinkSimulator(None, jitter, seed, cross_traffic_=cross_traffic, capacity_trace_=capacity_trace)
+    if capacity_trace is not None:
+        cursor = capacity_trace.cursor()
+        times_ms, capacities_kbps = times_ms[-1:], [None]
+    else:
+        cursor = from_schedule(times_ms, capacities_kbps).cursor()
+    for feedback in feedback_loop(sender, receiver, times_ms, capacities_kbps, link_simulator):
+        time_ms = receiver.latest_feedback_ms
+        capacity_kbps = cursor.capacity_kbps(time_ms)
+        yield FeedbackRecord(time_ms, sender.bitrate_kbps, feedback.receiving_rate_kbps,
+                             feedback.exp_smoothed_delay_ms, feedback.est_queuing_delay_ms, feedback.loss_ratio,
+                             capacity_kbps, feedback.baseline_delay_ms,
+                             getattr(sender, 'min_est_travel_time_ms', float("nan")))
+
+def run_stream(records, sinks):
+    """
+    Writes each record to all sinks, then closes them. Returns the number of records.
+    """
+    num_records = 0
+    try:
+        for record in records:
+            for sink in sinks:
+                sink.write(record)
+            num_records += 1
+    finally:
+        for sink in sinks:
+            sink.close()
+    return num_records
+
+class CsvSink(object):
+
+    def __init__(self, path_):
+        self.path = path_
+        self.__file = open(path_, 'w')
+        self.__writer = csv.writer(self.__file)
+        self.__writer.writerow(FeedbackRecord.FIELDS)
+
+    def write(self, record):
+        self.__writer.writerow([repr(value) for value in record.values()])
+
+    def close(self):
+        self.__file.close()
+
+class SummarySink(object):
+
+    # Running means, in a single pass. Non finite values, e.g. an infinite min_est_travel_time_ms
+    # before the first rate update, are skipped.
+    def __init__(self):
+        self.counts = OrderedDict((field, 0) for field in FeedbackRecord.FIELDS)
+        self.means = OrderedDict((field, float("nan")) for field in FeedbackRecord.FIELDS)
+        self.minima = OrderedDict((field, float("inf")) for field in FeedbackRecord.FIELDS)
+        self.maxima = OrderedDict((field, float("-inf")) for field in FeedbackRecord.FIELDS)
+
+    def write(self, record):
+        for field in FeedbackRecord.FIELDS:
+            value = getattr(record, field)
+            if value is None or value - value != 0.0:
+                continue
+            count = self.counts[field] + 1
+            self.counts[field] = count
+            self.means[field] = value if count == 1 else self.means[field] + (value - self.means[field]) / count
+            if value < self.minima[field]:
+                self.minima[field] = value
+            if value > self.maxima[field]:
+                self.maxima[field] = value
+
+    def close(self):
+        pass
+
+    def print_summary(self):
+        print("%24s %10s %14s %14s %14s" % ("field", "count", "mean", "min", "max"))
+        for field in FeedbackRecord.FIELDS:
+            print("%24s %10d %14.3f %14.3f %14.3f" % (field, self.counts[field], self.means[field],
+                                                      self.minima[field], self.maxima[field]))
+
+# Keeps one record every stride: once max_points records are kept, every other one is dropped
+# and the stride doubles. Exposes the series plot_traces.plot_traces needs.
+class DecimatingSink(object):
+
+    def __init__(self, max_points_=2000):
+        if max_points_ < 2:
+            raise ValueError("A decimating sink keeps at least 2 points.")
+        self.max_points = max_points_
+        self.stride = 1
+        self.records = []
+        self.__num_records = 0
+
+    def write(self, record):
+        if self.__num_records % self.stride == 0:
+            self.records.append(record)
+            if len(self.records) >= self.max_points:
+                del self.records[1::2]
+                self.stride *= 2
+        self.__num_records += 1
+
+    def close(self):
+        pass
+
+    def series(self, field):
+        return [getattr(record, field) for record in self.records]
+
+    @property
+    def time_ms(self):
+        return self.series('time_ms')
+
+    @property
+    def receiving_rates_kbps(self):
+        return self.series('receiving_rate_kbps')
+
+    @property
+    def delay_signals_ms(self):
+        return self.series('exp_smoothed_delay_ms')
+
+    @property
+    def loss_ratios(self):
+        return self.series('loss_ratio')
+
+    @property
+    def capacities_kbps(self):
+        return self.series('capacity_kbps')
+
+def repeated_schedule(times_ms, capacities_kbps, duration_ms):
+    """
+    A capacity schedule repeated until duration_ms.
+    """
+    period_ms = times_ms[-1]
+    repeated_times_ms, repeated_capacities_kbps = [], []
+    start_ms = 0.0
+    while start_ms < duration_ms:
+        for time_ms, capacity_kbps in zip(times_ms, capacities_kbps):
+            repeated_times_ms.append(min(duration_ms, start_ms + time_ms))
+            repeated_capacities_kbps.append(capacity_kbps)
+            if start_ms + time_ms >= duration_ms:
+                return repeated_times_ms, repeated_capacities_kbps
+        start_ms += period_ms
+    return repeated_times_ms, repeated_capacities_kbps
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--duration", type=float, default=3600.0, help="Simulated duration, in s")
+    parser.add_argument("-c", "--capacity", type=float,
+                        help="Constant link capacity, in kbps. RMCAT Evaluation test 5.1 is repeated if not specified")
+    parser.add_argument("-tr", "--capacity_trace", help="Capacity trace, CSV or .npy, see capacity_trace.py")
+    parser.add_argument("-j", "--jitter", type=int, choices=[0, 1, 2], default=1, help="Jitter Intensity")
+    parser.add_argument("-s", "--seed", type=int, help="Seed for the link's jitter")
+    parser.add_argument("-ms", "--modified_sender", action="store_true", help="Modified NADA sender mode")
+    parser.add_argument("-mf", "--modified_filter", action="store_true", help="Min filter on NADA receiver")
+    parser.add_argument("-o", "--output", help="CSV file to write the records to")
+    parser.add_argument("-p", "--plot", help="Image file to save the plot of the decimated records to")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    capacity_trace = None
+    if args.capacity_trace is not None:
+        from capacity_trace import load_capacity_trace
+        capacity_trace = load_capacity_trace(args.capacity_trace)
+        times_ms, capacities_kbps = [capacity_trace.end_time_ms], [None]
+    elif args.capacity is not None:
+        times_ms, capacities_kbps = [1000.0 * args.duration], [args.capacity]
+    else:
+        times_ms, capacities_kbps = repeated_schedule(RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS,
+                                                      1000.0 * args.duration)
+    summary = SummarySink()
+    sinks = [summary]
+    if args.output is not None:
+        sinks.append(CsvSink(args.output))
+    if args.plot is not None:
+        plot_buffer = DecimatingSink()
+        sinks.append(plot_buffer)
+    sender = NadaSender(not args.modified_sender)
+    receiver = NadaReceiver(not args.modified_filter, history_=NoHistory(), summary_=SummaryAccumulator())
+    num_records = run_stream(stream_single_flow(sender, receiver, times_ms, capacities_kbps, args.jitter, args.seed,
+                                                capacity_trace=capacity_trace), sinks)
+    print("Feedback records        =", num_records)
+    print("Average bitrate (kbps)  =", receiver.summary.average_bitrate_kbps())
+    print("Average delay (ms)      =", receiver.summary.average_delay_ms())
+    print("Global packet loss      =", receiver.summary.global_loss_ratio())
+    for percentile in DELAY_PERCENTILES:
+        print("%-24s=" % ("p%d delay (ms)" % percentile), receiver.summary.delay_quantile_ms(percentile / 100.0))
+    summary.print_summary()
+    if args.plot is not None:
+        import matplotlib
+        matplotlib.use('Agg')  # No display needed.
+        from plot_traces import plot_traces
+        plot_traces(plot_buffer, plot_buffer.time_ms, plot_buffer.capacities_kbps, args.plot)
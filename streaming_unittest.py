@@ -0,0 +1,115 @@
+import unittest
+import csv
+import os
+import random
+import shutil
+import tempfile
+import tracemalloc
+
+from nada import NadaSender, NadaReceiver
+from history import NoHistory
+from bwe_utils import SummaryAccumulator, average_bitrate_kbps, average_delay_ms, global_loss_ratio
+from evaluation_tests import simulate_single_flow
+from capacity_trace import from_schedule
+from streaming import FeedbackRecord, stream_single_flow, run_stream, repeated_schedule
+from streaming import CsvSink, SummarySink, DecimatingSink
+
+"""
+Unittests for streaming simulations.
+"""
+
+TIMES_MS = [4000.0, 8000.0]
+CAPACITIES_KBPS = [1500.0, 500.0]
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def records(self, num_records):
+        return [FeedbackRecord(*[100.0 * i + j for j in range(len(FeedbackRecord.FIELDS))])
+                for i in range(num_records)]
+
+    def test_same_results(self):
+        seed = random.randint(0, 10**6)
+        sender, receiver = NadaSender(False), NadaReceiver(True)
+        simulate_single_flow(sender, receiver, TIMES_MS, CAPACITIES_KBPS, 1, seed=seed)
+        streamed_sender = NadaSender(False)
+        streamed_receiver = NadaReceiver(True, history_=NoHistory(), summary_=SummaryAccumulator())
+        records = list(stream_single_flow(streamed_sender, streamed_receiver, TIMES_MS, CAPACITIES_KBPS, 1, seed))
+        self.assertEqual(streamed_sender.bitrate_kbps, sender.bitrate_kbps)
+        self.assertEqual(len(streamed_receiver.packets), 0)
+        # Whole run averages, without the packets.
+        summary = streamed_receiver.summary
+        self.assertEqual(summary.average_bitrate_kbps(), average_bitrate_kbps(receiver.packets))
+        self.assertAlmostEqual(summary.average_delay_ms(), average_delay_ms(receiver.packets))
+        self.assertEqual(summary.global_loss_ratio(), global_loss_ratio(receiver.packets))
+        # Records hold the receiver's values at feedback times.
+        # Packets may arrive at once, feedback is sent on the first one.
+        indices = {}
+        for i, time_ms in enumerate(receiver.time_ms):
+            indices.setdefault(time_ms, i)
+        for record in records:
+            i = indices[record.time_ms]
+            self.assertEqual(record.receiving_rate_kbps, receiver.receiving_rates_kbps[i])
+            self.assertEqual(record.exp_smoothed_delay_ms, receiver.exp_smoothed_delays_ms[i])
+            self.assertEqual(record.loss_ratio, receiver.loss_ratios[i])
+            self.assertEqual(record.capacity_kbps, 1500.0 if record.time_ms < 4000.0 else 500.0)
+        self.assertEqual(records[-1].bitrate_kbps, sender.bitrate_kbps)
+        # Capacity of a trace, on the bottleneck's clock.
+        capacity_trace = from_schedule(TIMES_MS, CAPACITIES_KBPS)
+        traced_records = list(stream_single_flow(NadaSender(False), NadaReceiver(True, history_=NoHistory()),
+                                                 TIMES_MS, None, 1, seed, capacity_trace=capacity_trace))
+        self.assertEqual([record.capacity_kbps for record in traced_records],
+                         [capacity_trace.capacity_kbps(record.time_ms) for record in traced_records])
+
+    def test_flat_memory(self):
+        peaks_bytes = []
+        # The first run imports modules lazily, the others draw several jitter blocks.
+        for duration_ms in [1000.0, 100000.0, 500000.0]:
+            tracemalloc.start()
+            receiver = NadaReceiver(True, history_=NoHistory())
+            run_stream(stream_single_flow(NadaSender(True), receiver, [duration_ms], [1000.0], 1, 0),
+                       [SummarySink(), DecimatingSink(100)])
+            peaks_bytes.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        self.assertLess(peaks_bytes[2], peaks_bytes[1] + 100000)
+
+    def test_decimating_sink(self):
+        sink = DecimatingSink(16)
+        records = self.records(1000)
+        for record in records:
+            sink.write(record)
+            self.assertLess(len(sink.records), 16)
+        self.assertEqual(sink.records, records[::sink.stride])
+        self.assertEqual(sink.time_ms, [record.time_ms for record in records[::sink.stride]])
+        with self.assertRaises(ValueError):
+            DecimatingSink(1)
+
+    def test_csv_and_summary_sinks(self):
+        path = os.path.join(self.directory, 'records.csv')
+        records = self.records(100)
+        records[0].min_est_travel_time_ms = float("inf")
+        summary = SummarySink()
+        self.assertEqual(run_stream(iter(records), [CsvSink(path), summary]), len(records))
+        with open(path) as records_file:
+            rows = list(csv.reader(records_file))
+        self.assertEqual(tuple(rows[0]), FeedbackRecord.FIELDS)
+        self.assertEqual([[float(value) for value in row] for row in rows[1:]],
+                         [record.values() for record in records])
+        self.assertAlmostEqual(summary.means['time_ms'], sum([record.time_ms for record in records]) / 100.0)
+        self.assertEqual(summary.minima['loss_ratio'], 5.0)
+        self.assertEqual(summary.maxima['loss_ratio'], 9905.0)
+        self.assertEqual(summary.counts['min_est_travel_time_ms'], 99)
+
+    def test_repeated_schedule(self):
+        times_ms, capacities_kbps = repeated_schedule([40.0, 60.0, 100.0], [1.0, 2.0, 3.0], 250.0)
+        self.assertEqual(times_ms, [40.0, 60.0, 100.0, 140.0, 160.0, 200.0, 240.0, 250.0])
+        self.assertEqual(capacities_kbps, [1.0, 2.0, 3.0, 1.0, 2.0, 3.0, 1.0, 2.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import argparse
+import math
+import multiprocessing
+import os
+from array import array
+from collections import OrderedDict
+
+import numpy
+
+from nada import NadaSender, NadaReceiver
+from history import FullHistory, NoHistory
+from bwe_utils import SummaryAccumulator
+from evaluation_tests import simulate_single_flow, RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS
+from traces import save_series
+
+"""
+Parameter sweep for NADA variants: runs the full grid of
+scenarios x sender modes x receiver filters x jitter intensities x seeds
+on a process pool, headless, and aggregates the per-run summaries into a
+table with means and 95% confidence intervals over seeds.
+Workers return summaries, and optionally traces, as raw array('d') bytes.
+Traces can be exported to a directory, one trace file per run, see plot_traces.py.
+Seed i of a sweep is the i-th stream spawned from its root seed, shared by all
+configurations, so variants are compared on the same jitter realizations.
+Results can be cached on disk, see result_cache.py: cached configurations aren't run again,
+by later sweeps either, until the simulator sources change.
+e.g. python sweep.py -s rmcat_evaluation_1 -n 10 -o sweep.csv
+"""
+
+# Capacity schedules, as (times_ms, capacities_kbps).
+SCENARIOS = OrderedDict([
+    ('rmcat_evaluation_1', (RMCAT_EVALUATION_1_TIMES_MS, RMCAT_EVALUATION_1_CAPACITIES_KBPS)),
+    ('constant_capacity', ([10000.0], [1000.0])),
+])
+
+CONFIGURATION_FIELDS = ['scenario', 'original_mode', 'use_median_filter', 'jitter', 'seed']
+SUMMARY_FIELDS = ['average_bitrate_kbps', 'average_delay_ms', 'global_loss_ratio', 'p95_delay_ms', 'p99_delay_ms']
+TRACE_FIELDS = ['time_ms', 'receiving_rates_kbps', 'delay_signals_ms', 'loss_ratios']
+
+# Two-sided 95% Student t quantiles, by degrees of freedom.
+T_QUANTILES_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                  2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                  2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+def sweep_configurations(scenarios, modes, filters, jitters, num_seeds, first_seed=0):
+    """
+    Full grid of configurations, as tuples following CONFIGURATION_FIELDS.
+    """
+    return [(scenario, original_mode, use_median_filter, jitter, first_seed + i)
+            for scenario in scenarios
+            for original_mode in modes
+            for use_median_filter in filters
+            for jitter in jitters
+            for i in range(num_seeds)]
+
+def cache_key(cache, configuration, root_seed=0):
+    """
+    Key of a configuration's result in cache, a result_cache.ResultCache.
+    """
+    times_ms, capacities_kbps = SCENARIOS[configuration[0]]
+    return cache.key({'configuration': list(configuration), 'root_seed': root_seed,
+                      'times_ms': times_ms, 'capacities_kbps': capacities_kbps,
+                      'summary_fields': SUMMARY_FIELDS, 'trace_fields': TRACE_FIELDS})
+
+def run_configuration(configuration, with_traces=False, root_seed=0, cache=None, lookup=True):
+    """
+    Runs a single configuration. Returns its summary as array('d') bytes, following
+    SUMMARY_FIELDS, and its traces as a list of array('d') bytes following TRACE_FIELDS, or None.
+    The result is read from cache, a result_cache.ResultCache, if there, and written to it otherwise.
+    lookup is False when the result is known to be missing, e.g. run_sweep already looked it up.
+    """
+    if cache is not None:
+        key = cache_key(cache, configuration, root_seed)
+        result = cache.get(key, with_traces) if lookup else None
+        if result is not None:
+            summary_bytes, traces = result
+            return summary_bytes, traces if with_traces else None
+    scenario, original_mode, use_median_filter, jitter, seed = configuration
+    # Same as link_simulator.spawn_seeds(root_seed, num_seeds)[seed].
+    seed_sequence = numpy.random.SeedSequence(root_seed, spawn_key=(seed,))
+    sender = NadaSender(original_mode)
+    # Summaries are accumulated online, packets are only kept for traces.
+    history = FullHistory(columnar=True) if with_traces else NoHistory()
+    receiver = NadaReceiver(use_median_filter, history_=history, summary_=SummaryAccumulator())
+    times_ms, capacities_kbps = SCENARIOS[scenario]
+    simulate_single_flow(sender, receiver, times_ms, capacities_kbps, jitter, seed=seed_sequence)
+
+    summary = summary_values(receiver.summary)
+    traces = None
+    if with_traces:
+        traces = [getattr(receiver, field).tobytes() for field in TRACE_FIELDS]
+    if cache is not None:
+        cache.put(key, summary.tobytes(), traces)
+    return summary.tobytes(), traces
+
+def summary_values(summary):
+    """
+    Values of SUMMARY_FIELDS, from a bwe_utils.SummaryAccumulator, as an array('d').
+    """
+    return array('d', [summary.average_bitrate_kbps(), summary.average_delay_ms(), summary.global_loss_ratio(),
+                       summary.delay_quantile_ms(0.95), summary.delay_quantile_ms(0.99)])
+
+def __run_configuration(args):
+    return run_configuration(*args)
+
+def run_sweep(configurations, num_processes=None, with_traces=False, root_seed=0, cache=None):
+    """
+    Runs all configurations on a pool of num_processes, the number of cores by default.
+    Returns summaries as arrays, and traces as lists of arrays or None, in configurations order.
+    Configurations cached in cache, a result_cache.ResultCache, are not run, the others are
+    cached by the workers.
+    """
+    results = [None] * len(configurations)
+    if cache is not None:
+        for i, configuration in enumerate(configurations):
+            result = cache.get(cache_key(cache, configuration, root_seed), with_traces)
+            if result is not None:
+                results[i] = (result[0], result[1] if with_traces else None)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        pool = multiprocessing.Pool(min(num_processes or multiprocessing.cpu_count(), len(missing)))
+        try:
+            missing_results = pool.map(__run_configuration,
+                                       [(configurations[i], with_traces, root_seed, cache, False)
+                                        for i in missing],
+                                       chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        for i, result in zip(missing, missing_results):
+            results[i] = result
+
+    summaries = []
+    traces = []
+    for summary_bytes, traces_bytes in results:
+        summaries.append(__to_array(summary_bytes))
+        traces.append(None if traces_bytes is None else [__to_array(b) for b in traces_bytes])
+    return summaries, traces
+
+def __to_array(buffer_bytes):
+    values = array('d')
+    values.frombytes(buffer_bytes)
+    return values
+
+def mean_confidence_interval(values):
+    """
+    Returns the mean and the half width of its 95% confidence interval.
+    """
+    num_values = len(values)
+    mean = sum(values) / num_values
+    if num_values == 1:
+        return mean, float("nan")
+    variance = sum([(value - mean) ** 2 for value in values]) / (num_values - 1)
+    return mean, t_quantile_95(num_values - 1) * math.sqrt(variance / num_values)
+
+def t_quantile_95(degrees_of_freedom):
+    return T_QUANTILES_95[degrees_of_freedom - 1] if degrees_of_freedom <= len(T_QUANTILES_95) else 1.96
+
+def aggregate(configurations, summaries):
+    """
+    Groups runs differing only by their seed.
+    Returns rows of configuration fields (but seed), number of seeds, then mean and
+    confidence interval half width of each summary field.
+    """
+    groups = OrderedDict()
+    for configuration, summary in zip(configurations, summaries):
+        groups.setdefault(configuration[:-1], []).append(summary)
+
+    rows = []
+    for key, group_summaries in groups.items():
+        row = list(key) + [len(group_summaries)]
+        for i in range(len(SUMMARY_FIELDS)):
+            row.extend(mean_confidence_interval([summary[i] for summary in group_summaries]))
+        rows.append(row)
+    return rows
+
+def table_header():
+    header = CONFIGURATION_FIELDS[:-1] + ['num_seeds']
+    for field in SUMMARY_FIELDS:
+        header.extend([field, field + '_ci95'])
+    return header
+
+def print_table(rows, output_path=None, header=None):
+    header = header or table_header()
+    print(" ".join(["%20s" % field for field in header]))
+    for row in rows:
+        print(" ".join(["%20.4f" % value if isinstance(value, float) else "%20s" % value for value in row]))
+    if output_path is not None:
+        with open(output_path, 'w') as output_file:
+            output_file.write(",".join(header) + "\n")
+            for row in rows:
+                output_file.write(",".join([str(value) for value in row]) + "\n")
+
+def save_sweep_traces(directory, configurations, summaries, traces):
+    """
+    Exports each run's traces to directory, as <configuration fields joined by _>.npz.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for configuration, summary, run_traces in zip(configurations, summaries, traces):
+        save_run_traces(directory, configuration, summary, run_traces)
+
+def save_run_traces(directory, configuration, summary, run_traces):
+    """
+    Exports a run's traces to an existing directory, returns the trace file's path.
+    """
+    times_ms, capacities_kbps = SCENARIOS[configuration[0]]
+    metadata = dict(zip(CONFIGURATION_FIELDS + SUMMARY_FIELDS, list(configuration) + list(summary)))
+    path = os.path.join(directory, "_".join([str(value) for value in configuration]) + ".npz")
+    save_series(path, dict(zip(TRACE_FIELDS, run_traces)), times_ms, capacities_kbps, metadata)
+    return path
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--scenarios", nargs="+", choices=list(SCENARIOS.keys()),
+                        default=list(SCENARIOS.keys()), help="Scenarios to run")
+    parser.add_argument("-j", "--jitters", nargs="+", type=int, choices=[0, 1, 2], default=[0, 1, 2],
+                        help="Jitter intensities to run")
+    parser.add_argument("-n", "--num_seeds", type=int, default=5, help="Number of seeds per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="Root seed, the jitter streams are spawned from it")
+    parser.add_argument("-p", "--num_processes", type=int, help="Number of worker processes, cores by default")
+    parser.add_argument("-o", "--output", help="CSV file for the aggregated table")
+    parser.add_argument("-t", "--traces", help="Directory to export each run's traces to")
+    parser.add_argument("-c", "--cache", help="Directory of the result cache, shared by sweeps")
+    parser.add_argument("--cache_size", type=float, default=1024.0,
+                        help="Size of the result cache in MB, least recently used results are evicted")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    configurations = sweep_configurations(args.scenarios, [True, False], [True, False], args.jitters, args.num_seeds)
+    cache = None
+    if args.cache is not None:
+        from result_cache import ResultCache
+        cache = ResultCache(args.cache, int(args.cache_size * (1 << 20)))
+    summaries, traces = run_sweep(configurations, args.num_processes, args.traces is not None, args.seed, cache)
+    if cache is not None:
+        print("Cached runs             = %d / %d" % (cache.hits, len(configurations)))
+    print_table(aggregate(configurations, summaries), args.output)
+    if args.traces is not None:
+        save_sweep_traces(args.traces, configurations, summaries, traces)
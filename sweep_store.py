@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import math
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from array import array
+
+from sweep import SCENARIOS, CONFIGURATION_FIELDS, SUMMARY_FIELDS, sweep_configurations, run_configuration
+from sweep import save_run_traces, t_quantile_95
+
+"""
+Resumable sweeps: a SQLite database holds the job manifest, one row per run, and the results.
+Runs are grouped in shards, which workers claim atomically, in a single write transaction:
+several worker processes, or hosts sharing the database's directory, run a sweep together.
+A worker writes each run's summary, and the path of its trace file if traces are exported, as
+soon as it is done. Claims are leases, renewed by each completed run: shards of a crashed worker
+are claimed again once their lease expires, without their completed runs. Hence completed runs
+are never repeated, and a sweep resumes by starting workers again. A worker too slow to renew its lease
+has its completions rejected once its shard is claimed again, and moves on to another shard.
+Configuration columns are indexed, aggregates such as the mean delay by sender mode and jitter are
+computed by SQLite, within milliseconds for thousands of runs.
+Sharing the database between hosts requires a file system with working locks, e.g. NFSv4.
+The following commands can be specified on the command line:
+-- create, --scenarios, --jitters, --num_seeds, --seed, --shard_size: adds runs to the manifest.
+-- work, --num_processes, --traces, --cache, --lease: runs pending shards until none is left.
+-- status: counts runs by status.
+-- query, --group_by, --field, --scenario: mean and 95% confidence interval of a summary field.
+e.g. python sweep_store.py sweep.db create -n 50, then python sweep_store.py sweep.db work on each host,
+then python sweep_store.py sweep.db query -g original_mode jitter -f average_delay_ms
+"""
+
+DEFAULT_SHARD_SIZE = 16
+DEFAULT_LEASE_S = 600.0
+PENDING, CLAIMED, DONE = 'pending', 'claimed', 'done'
+# Columns of a run besides its configuration.
+RUN_FIELDS = ['root_seed']
+GROUP_FIELDS = CONFIGURATION_FIELDS + RUN_FIELDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    scenario TEXT NOT NULL, original_mode INTEGER NOT NULL, use_median_filter INTEGER NOT NULL,
+    jitter INTEGER NOT NULL, seed INTEGER NOT NULL, root_seed INTEGER NOT NULL,
+    shard INTEGER NOT NULL, status TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_expiry REAL,
+    finish_time REAL, trace_path TEXT,
+    %s,
+    UNIQUE (scenario, original_mode, use_median_filter, jitter, seed, root_seed)
+);
+CREATE INDEX IF NOT EXISTS runs_configuration ON runs (scenario, original_mode, use_median_filter, jitter);
+CREATE INDEX IF NOT EXISTS runs_jitter ON runs (jitter, original_mode);
+CREATE INDEX IF NOT EXISTS runs_shard ON runs (status, shard);
+""" % ", ".join(["%s REAL" % field for field in SUMMARY_FIELDS])
+
+class SweepStore(object):
+
+    # Each process opens its own store. Writes wait up to timeout_s_ for the database lock.
+    def __init__(self, path_, timeout_s_=60.0):
+        self.path = path_
+        # Transactions are explicit, see __transaction.
+        self.connection = sqlite3.connect(path_, timeout=timeout_s_, isolation_level=None)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_configurations(self, configurations, root_seed=0, shard_size=DEFAULT_SHARD_SIZE):
+        """
+        Adds runs of configurations, following sweep.CONFIGURATION_FIELDS, in new shards of shard_size runs.
+        Runs already in the manifest are skipped. Returns the number of added runs.
+        """
+        with self.__transaction() as cursor:
+            first_shard = cursor.execute("SELECT COALESCE(MAX(shard) + 1, 0) FROM runs").fetchone()[0]
+            num_runs = cursor.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            cursor.executemany(
+                "INSERT OR IGNORE INTO runs (%s, shard) VALUES (%s)" % (", ".join(GROUP_FIELDS),
+                                                                       ", ".join(["?"] * (len(GROUP_FIELDS) + 1))),
+                [list(configuration) + [root_seed, first_shard + i // shard_size]
+                 for i, configuration in enumerate(configurations)])
+            return cursor.execute("SELECT COUNT(*) FROM runs").fetchone()[0] - num_runs
+
+    def claim_shard(self, worker, lease_s=DEFAULT_LEASE_S):
+        """
+        Claims the first shard with pending runs, or runs whose lease expired, for lease_s.
+        Returns the claimed runs, as (id, configuration, root_seed), none if the sweep is over.
+        """
+        now_s = time.time()
+        with self.__transaction() as cursor:
+            row = cursor.execute("SELECT shard FROM runs WHERE status = ? OR (status = ? AND lease_expiry < ?) "
+                                 "ORDER BY shard LIMIT 1", (PENDING, CLAIMED, now_s)).fetchone()
+            if row is None:
+                return []
+            shard = row[0]
+            cursor.execute("UPDATE runs SET status = ?, worker = ?, lease_expiry = ? WHERE shard = ? AND status != ?",
+                           (CLAIMED, worker, now_s + lease_s, shard, DONE))
+            rows = cursor.execute("SELECT id, %s FROM runs WHERE shard = ? AND status = ? AND worker = ? ORDER BY id"
+                                  % ", ".join(GROUP_FIELDS), (shard, CLAIMED, worker)).fetchall()
+        return [(row[0], self.__configuration(row[1:6]), row[6]) for row in rows]
+
+    def complete_run(self, run_id, worker, summary, trace_path=None, lease_s=DEFAULT_LEASE_S):
+        """
+        Writes the summary of a run, following sweep.SUMMARY_FIELDS, and its trace file path, and renews
+        the lease of the worker's other claimed runs. Returns False, writing nothing, if the worker no longer
+        holds the run: its lease expired and another worker claimed it.
+        """
+        now_s = time.time()
+        with self.__transaction() as cursor:
+            cursor.execute("UPDATE runs SET status = ?, finish_time = ?, trace_path = ?, %s "
+                           "WHERE id = ? AND worker = ? AND status = ?"
+                           % ", ".join(["%s = ?" % field for field in SUMMARY_FIELDS]),
+                           [DONE, now_s, trace_path] + list(summary) + [run_id, worker, CLAIMED])
+            if cursor.rowcount == 0:
+                return False
+            cursor.execute("UPDATE runs SET lease_expiry = ? WHERE status = ? AND worker = ?",
+                           (now_s + lease_s, CLAIMED, worker))
+        return True
+
+    def release(self, worker):
+        """
+        Releases the runs worker claimed and didn't complete, e.g. when it is interrupted.
+        """
+        with self.__transaction() as cursor:
+            cursor.execute("UPDATE runs SET status = ?, worker = NULL, lease_expiry = NULL "
+                           "WHERE status = ? AND worker = ?", (PENDING, CLAIMED, worker))
+
+    def status_counts(self):
+        counts = dict((status, 0) for status in [PENDING, CLAIMED, DONE])
+        counts.update(self.connection.execute("SELECT status, COUNT(*) FROM runs GROUP BY status").fetchall())
+        return counts
+
+    def mean_by(self, group_by, field, **filters):
+        """
+        Mean of a summary field over completed runs, grouped by configuration columns, e.g.
+        mean_by(['original_mode', 'jitter'], 'average_delay_ms', scenario='rmcat_evaluation_1').
+        Returns rows of group_by values, number of runs, mean and the half width of its 95% confidence interval.
+        """
+        if field not in SUMMARY_FIELDS or any([column not in GROUP_FIELDS for column in list(group_by) + list(filters)]):
+            raise ValueError("Unknown summary field or configuration column.")
+        conditions = ["status = ?"] + ["%s = ?" % column for column in filters]
+        columns = ", ".join(group_by)
+        query = "SELECT %s COUNT(*), AVG(%s), AVG(%s * %s) FROM runs WHERE %s" \
+                % (columns + "," if group_by else "", field, field, field, " AND ".join(conditions))
+        if group_by:
+            query += " GROUP BY %s ORDER BY %s" % (columns, columns)
+        rows = []
+        for row in self.connection.execute(query, [DONE] + list(filters.values())):
+            num_runs, mean, mean_square = row[-3:]
+            if num_runs == 0:
+                continue
+            half_width = float("nan")
+            if num_runs > 1:
+                variance = max(0.0, (mean_square - mean * mean) * num_runs / (num_runs - 1))
+                half_width = t_quantile_95(num_runs - 1) * math.sqrt(variance / num_runs)
+            rows.append(list(row[:-3]) + [num_runs, mean, half_width])
+        return rows
+
+    # BEGIN IMMEDIATE takes the write lock at once: claims of concurrent workers are serialized.
+    @contextlib.contextmanager
+    def __transaction(self):
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+
+    # Booleans are stored as integers, configurations are keys of the result cache too.
+    def __configuration(self, row):
+        scenario, original_mode, use_median_filter, jitter, seed = row
+        return (scenario, bool(original_mode), bool(use_median_filter), jitter, seed)
+
+def run_worker(path, worker=None, traces_directory=None, cache_directory=None, lease_s=DEFAULT_LEASE_S):
+    """
+    Runs the shards of the sweep store at path until none is left, exporting traces to traces_directory
+    if given, and caching results in cache_directory, see result_cache.py. Returns the number of runs done.
+    """
+    worker = worker or "%s:%d" % (socket.gethostname(), os.getpid())
+    store = SweepStore(path)
+    cache = None
+    if cache_directory is not None:
+        from result_cache import ResultCache
+        cache = ResultCache(cache_directory)
+    if traces_directory is not None and not os.path.isdir(traces_directory):
+        try:
+            os.makedirs(traces_directory)
+        except OSError:  # Created by a concurrent worker.
+            pass
+    num_runs = 0
+    try:
+        runs = store.claim_shard(worker, lease_s)
+        while runs:
+            for run_id, configuration, root_seed in runs:
+                summary_bytes, traces_bytes = run_configuration(configuration, traces_directory is not None, root_seed,
+                                                                cache)
+                summary = __to_array(summary_bytes)
+                trace_path = None
+                if traces_bytes is not None:
+                    trace_path = save_run_traces(traces_directory, configuration, summary,
+                                                 [__to_array(trace) for trace in traces_bytes])
+                if not store.complete_run(run_id, worker, summary, trace_path, lease_s):
+                    break  # The shard was claimed again, by another worker.
+                num_runs += 1
+            runs = store.claim_shard(worker, lease_s)
+    except BaseException:
+        store.release(worker)
+        raise
+    finally:
+        store.close()
+    return num_runs
+
+def __to_array(buffer_bytes):
+    values = array('d')
+    values.frombytes(buffer_bytes)
+    return values
+
+def run_workers(path, num_processes=None, traces_directory=None, cache_directory=None, lease_s=DEFAULT_LEASE_S):
+    """
+    Runs num_processes workers, the number of cores by default, until the sweep is over.
+    """
+    processes = [multiprocessing.Process(target=run_worker, args=(path, None, traces_directory, cache_directory,
+                                                                  lease_s))
+                 for i in range(num_processes or multiprocessing.cpu_count())]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("store", help="SQLite database of the sweep")
+    commands = parser.add_subparsers(dest="command")
+    create = commands.add_parser("create", help="Add runs to the sweep")
+    create.add_argument("-s", "--scenarios", nargs="+", choices=list(SCENARIOS.keys()),
+                        default=list(SCENARIOS.keys()), help="Scenarios to run")
+    create.add_argument("-j", "--jitters", nargs="+", type=int, choices=[0, 1, 2], default=[0, 1, 2],
+                        help="Jitter intensities to run")
+    create.add_argument("-n", "--num_seeds", type=int, default=5, help="Number of seeds per configuration")
+    create.add_argument("--seed", type=int, default=0, help="Root seed, the jitter streams are spawned from it")
+    create.add_argument("--shard_size", type=int, default=DEFAULT_SHARD_SIZE, help="Runs per shard")
+    work = commands.add_parser("work", help="Run pending shards")
+    work.add_argument("-p", "--num_processes", type=int, help="Number of worker processes, cores by default")
+    work.add_argument("-t", "--traces", help="Directory to export each run's traces to")
+    work.add_argument("-c", "--cache", help="Directory of the result cache, shared by sweeps")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_S,
+                      help="Lease of a claimed shard, in s, renewed by each completed run")
+    commands.add_parser("status", help="Count runs by status")
+    query = commands.add_parser("query", help="Mean of a summary field by configuration columns")
+    query.add_argument("-g", "--group_by", nargs="*", choices=GROUP_FIELDS, default=['original_mode', 'jitter'],
+                       help="Configuration columns")
+    query.add_argument("-f", "--field", choices=SUMMARY_FIELDS, default='average_delay_ms', help="Summary field")
+    query.add_argument("-s", "--scenario", choices=list(SCENARIOS.keys()), help="Only runs of a scenario")
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error("A command is required.")
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'work':
+        run_workers(args.store, args.num_processes, args.traces, args.cache, args.lease)
+    store = SweepStore(args.store)
+    if args.command == 'create':
+        configurations = sweep_configurations(args.scenarios, [True, False], [True, False], args.jitters,
+                                              args.num_seeds)
+        print("Added runs              =", store.add_configurations(configurations, args.seed,
+                                                                   shard_size=args.shard_size))
+    elif args.command == 'query':
+        filters = {} if args.scenario is None else {'scenario': args.scenario}
+        start_s = time.perf_counter()
+        rows = store.mean_by(args.group_by, args.field, **filters)
+        query_ms = 1000.0 * (time.perf_counter() - start_s)
+        print(" ".join(["%20s" % field for field in args.group_by + ['num_runs', args.field, args.field + '_ci95']]))
+        for row in rows:
+            print(" ".join(["%20.4f" % value if isinstance(value, float) else "%20s" % value for value in row]))
+        print("Query time (ms)         =", query_ms)
+    for status, count in sorted(store.status_counts().items()):
+        print("%-24s= %d" % ("Runs " + status, count))
+    store.close()
@@ -0,0 +1,140 @@
+import unittest
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from array import array
+
+from sweep import sweep_configurations, run_configuration, mean_confidence_interval, SUMMARY_FIELDS
+from sweep_store import SweepStore, run_worker, run_workers, PENDING, CLAIMED, DONE
+
+"""
+Unittests for resumable sweeps.
+"""
+
+# Claims shards until the sweep is over, completing runs with dummy summaries, returns the claimed run ids.
+def claim_all(path):
+    store = SweepStore(path)
+    worker = str(os.getpid())
+    run_ids = []
+    runs = store.claim_shard(worker)
+    while runs:
+        for run_id, configuration, root_seed in runs:
+            store.complete_run(run_id, worker, [float(run_id)] * len(SUMMARY_FIELDS))
+            run_ids.append(run_id)
+        runs = store.claim_shard(worker)
+    store.close()
+    return run_ids
+
+class TestSweepStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sweep.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertNear(self, x, y, precision):
+        self.assertTrue(abs(x-y) < precision)
+
+    def test_manifest(self):
+        store = SweepStore(self.path)
+        configurations = sweep_configurations(['constant_capacity'], [True, False], [True, False], [0, 1], 5)
+        self.assertEqual(store.add_configurations(configurations, shard_size=8), 40)
+        self.assertEqual(store.add_configurations(configurations[:10], shard_size=8), 0)
+        self.assertEqual(store.add_configurations(configurations[:10], root_seed=1, shard_size=8), 10)
+        self.assertEqual(store.status_counts(), {PENDING: 50, CLAIMED: 0, DONE: 0})
+        runs = store.claim_shard('worker')
+        self.assertEqual(len(runs), 8)
+        self.assertEqual([run[1] for run in runs], configurations[:8])
+        self.assertEqual(store.status_counts()[CLAIMED], 8)
+        # Other workers claim other shards.
+        self.assertEqual([run[1] for run in store.claim_shard('other')], configurations[8:16])
+        store.release('worker')
+        self.assertEqual([run[1] for run in store.claim_shard('third')], configurations[:8])
+        store.close()
+
+    def test_resume_after_crash(self):
+        configurations = sweep_configurations(['constant_capacity'], [True, False], [True], [1], 2)
+        store = SweepStore(self.path)
+        store.add_configurations(configurations, shard_size=4)
+        # A worker completes a run, then dies: its lease expires.
+        runs = store.claim_shard('crashed', lease_s=0.0)
+        summary = array('d')
+        summary.frombytes(run_configuration(runs[0][1])[0])
+        store.complete_run(runs[0][0], 'crashed', summary, lease_s=0.0)
+        finish_time = store.connection.execute("SELECT finish_time FROM runs WHERE id = ?", (runs[0][0],)).fetchone()[0]
+        time.sleep(0.01)
+        self.assertEqual(run_worker(self.path, 'resumed', os.path.join(self.directory, 'traces')), 3)
+        self.assertEqual(store.status_counts(), {PENDING: 0, CLAIMED: 0, DONE: 4})
+        rows = store.connection.execute("SELECT id, worker, finish_time, trace_path FROM runs ORDER BY id").fetchall()
+        self.assertEqual(rows[0][1:3], ('crashed', finish_time))
+        self.assertEqual([row[1] for row in rows[1:]], ['resumed'] * 3)
+        for row in rows[1:]:
+            self.assertTrue(os.path.isfile(row[3]))
+        self.assertEqual(run_worker(self.path, 'late'), 0)
+        store.close()
+
+    def test_stale_worker(self):
+        configurations = sweep_configurations(['constant_capacity'], [True, False], [True], [1], 2)
+        store = SweepStore(self.path)
+        store.add_configurations(configurations, shard_size=4)
+        summary = [1.0] * len(SUMMARY_FIELDS)
+        runs = store.claim_shard('slow', lease_s=0.0)
+        self.assertTrue(store.complete_run(runs[0][0], 'slow', summary, lease_s=0.0))
+        time.sleep(0.01)
+        self.assertEqual([run[0] for run in store.claim_shard('fast')], [run[0] for run in runs[1:]])
+        # The slow worker's lease expired, its later completions are rejected.
+        self.assertFalse(store.complete_run(runs[1][0], 'slow', [2.0] * len(SUMMARY_FIELDS)))
+        self.assertFalse(store.complete_run(runs[0][0], 'fast', summary))
+        self.assertTrue(store.complete_run(runs[1][0], 'fast', summary))
+        rows = store.connection.execute("SELECT worker, %s FROM runs WHERE id <= ? ORDER BY id"
+                                        % SUMMARY_FIELDS[0], (runs[1][0],)).fetchall()
+        self.assertEqual(rows, [('slow', 1.0), ('fast', 1.0)])
+        self.assertEqual(store.status_counts(), {PENDING: 0, CLAIMED: 2, DONE: 2})
+        store.close()
+
+    def test_concurrent_claims(self):
+        store = SweepStore(self.path)
+        configurations = sweep_configurations(['constant_capacity'], [True, False], [True, False], [0, 1, 2], 10)
+        store.add_configurations(configurations, shard_size=3)
+        pool = multiprocessing.Pool(4)
+        try:
+            claimed_ids = pool.map(claim_all, [self.path] * 4)
+        finally:
+            pool.close()
+            pool.join()
+        all_ids = sum(claimed_ids, [])
+        self.assertEqual(len(all_ids), len(configurations))
+        self.assertEqual(len(set(all_ids)), len(configurations))
+        store.close()
+
+    def test_workers_and_queries(self):
+        configurations = sweep_configurations(['constant_capacity'], [True, False], [True], [0, 2], 2)
+        store = SweepStore(self.path)
+        store.add_configurations(configurations, shard_size=2)
+        run_workers(self.path, 2)
+        summaries = dict((configuration, run_configuration(configuration)[0]) for configuration in configurations)
+        rows = store.connection.execute("SELECT scenario, original_mode, use_median_filter, jitter, seed, %s FROM runs"
+                                        % ", ".join(SUMMARY_FIELDS)).fetchall()
+        self.assertEqual(len(rows), len(configurations))
+        for row in rows:
+            configuration = (row[0], bool(row[1]), bool(row[2]), row[3], row[4])
+            self.assertEqual(array('d', row[5:]).tobytes(), summaries[configuration])
+        for original_mode, jitter, num_runs, mean, half_width in store.mean_by(['original_mode', 'jitter'],
+                                                                               'average_delay_ms'):
+            values = [row[6] for row in rows if row[1] == original_mode and row[3] == jitter]
+            expected_mean, expected_half_width = mean_confidence_interval(values)
+            self.assertEqual(num_runs, 2)
+            self.assertNear(mean, expected_mean, 1e-9)
+            self.assertNear(half_width, expected_half_width, 1e-6)
+        self.assertEqual(store.mean_by([], 'global_loss_ratio', jitter=0, original_mode=1)[0][0], 2)
+        with self.assertRaises(ValueError):
+            store.mean_by(['status'], 'average_delay_ms')
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import shutil
+import tempfile
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from result_cache import ResultCache
+from sweep import sweep_configurations, run_configuration, run_sweep, mean_confidence_interval, aggregate
+from sweep import SUMMARY_FIELDS, TRACE_FIELDS
+
+"""
+Unittests for the parameter sweep.
+"""
+
+class TestSweep(unittest.TestCase):
+
+    def assertNear(self, x, y, precision):
+        self.assertTrue(abs(x-y) < precision)
+
+    def test_sweep_configurations(self):
+        configurations = sweep_configurations(['constant_capacity'], [True, False], [True], [0, 2], 3)
+        self.assertEqual(len(configurations), 12)
+        self.assertEqual(len(set(configurations)), 12)
+
+    def test_mean_confidence_interval(self):
+        mean, half_width = mean_confidence_interval([1.0, 2.0, 3.0])
+        self.assertEqual(mean, 2.0)
+        self.assertNear(half_width, 4.303 / 3.0 ** 0.5, 1e-9)
+        self.assertEqual(mean_confidence_interval([5.0, 5.0])[1], 0.0)
+
+    def test_run_sweep_matches_single_runs(self):
+        configurations = sweep_configurations(['constant_capacity'], [True, False], [True], [2], 2)
+        summaries, traces = run_sweep(configurations, 2, with_traces=True)
+        for configuration, summary, trace in zip(configurations, summaries, traces):
+            summary_bytes, _ = run_configuration(configuration)
+            self.assertEqual(summary.tobytes(), summary_bytes)
+            self.assertEqual(len(trace), len(TRACE_FIELDS))
+            self.assertTrue(len(trace[0]) > 0)
+
+        rows = aggregate(configurations, summaries)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0][4], 2)  # Number of seeds.
+        self.assertEqual(rows[0][5], (summaries[0][0] + summaries[1][0]) / 2)
+        self.assertEqual(len(rows[0]), 5 + 2 * len(SUMMARY_FIELDS))
+
+    def test_cached_sweep(self):
+        directory = tempfile.mkdtemp()
+        try:
+            configurations = sweep_configurations(['constant_capacity'], [True, False], [True], [1], 2)
+            cache = ResultCache(directory)
+            summaries, traces = run_sweep(configurations, 2, with_traces=True, cache=cache)
+            self.assertEqual(len(cache), len(configurations))
+            # Cache hits run nothing, no pool is created.
+            with mock.patch('multiprocessing.Pool', side_effect=AssertionError):
+                cached_summaries, cached_traces = run_sweep(configurations, 2, with_traces=True, cache=cache)
+                self.assertEqual(run_configuration(configurations[0], cache=cache)[0], summaries[0].tobytes())
+            self.assertEqual(cached_summaries, summaries)
+            self.assertEqual(cached_traces, traces)
+            self.assertEqual(cache.hits, len(configurations) + 1)
+            # Another root seed is another configuration.
+            run_sweep(configurations[:1], 1, root_seed=1, cache=cache)
+            self.assertEqual(len(cache), len(configurations) + 1)
+            # Known misses aren't looked up again, only cached.
+            with mock.patch.object(cache, 'get', side_effect=AssertionError):
+                run_configuration(configurations[0], root_seed=2, cache=cache, lookup=False)
+            self.assertEqual(len(cache), len(configurations) + 2)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+
+import numpy
+
+"""
+Simulation traces, exported to files so that they can be plotted later, on another machine.
+A trace file is an uncompressed NPZ archive holding one float64 array per receiver time
+series, the link capacity schedule, and the configuration as JSON metadata.
+Arrays are read from the archive only when accessed.
+e.g. python plot_traces.py traces.npz -o traces.png
+"""
+
+# Receiver time series, all recorded once per received packet.
+SERIES_FIELDS = ['time_ms', 'receiving_rates_kbps', 'delay_signals_ms', 'median_filtered_delays_ms',
+                 'exp_smoothed_delays_ms', 'est_queuing_delays_ms', 'congestion_signals_ms', 'loss_ratios']
+# Received packets, to re-analyze the receiver's filters offline, see receiver_analysis.py.
+PACKET_FIELDS = ['packet_ids', 'send_times_ms', 'arrival_times_ms']
+SCHEDULE_FIELDS = ['capacity_times_ms', 'capacities_kbps']
+METADATA_FIELD = 'metadata'
+
+def save_traces(path, receiver, times_ms, capacities_kbps, metadata=None):
+    """
+    Exports the receiver's time series and received packets, whichever history it keeps, and the
+    capacity schedule: capacities_kbps[i] until times_ms[i]. metadata is a dict, non JSON values
+    are saved as strings.
+    """
+    from receiver_analysis import packet_columns
+    series = dict([(field, getattr(receiver, field)) for field in SERIES_FIELDS])
+    series.update(zip(PACKET_FIELDS, packet_columns(receiver.packets)))
+    save_series(path, series, times_ms, capacities_kbps, metadata)
+
+def save_series(path, series, times_ms, capacities_kbps, metadata=None):
+    """
+    Same as save_traces, for time series given as a dict of sequences, e.g. sweep traces.
+    """
+    arrays = dict([(field, numpy.asarray(values, dtype=float)) for field, values in series.items()])
+    arrays['capacity_times_ms'] = numpy.asarray(times_ms, dtype=float)
+    arrays['capacities_kbps'] = numpy.asarray(capacities_kbps, dtype=float)
+    arrays[METADATA_FIELD] = numpy.array(json.dumps(metadata or {}, sort_keys=True, default=str))
+    # The path is used as is, numpy.savez would append .npz to it otherwise.
+    with open(path, 'wb') as trace_file:
+        numpy.savez(trace_file, **arrays)
+
+class Traces(object):
+
+    # Arrays are available as attributes, named as the receiver's time series.
+    def __init__(self, archive_):
+        self.__archive = archive_
+        self.metadata = json.loads(str(archive_[METADATA_FIELD]))
+
+    @property
+    def fields(self):
+        return [field for field in self.__archive.files if field != METADATA_FIELD]
+
+    def __getattr__(self, field):
+        if field.startswith('_') or field not in self.__archive.files:
+            raise AttributeError(field)
+        return self.__archive[field]
+
+    def close(self):
+        self.__archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def load_traces(path):
+    """
+    Opens a trace file, to be closed, e.g. used as a context manager.
+    """
+    return Traces(numpy.load(path))
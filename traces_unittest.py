@@ -0,0 +1,68 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+
+import numpy
+
+from nada import NadaSender, NadaReceiver
+from history import RecentHistory
+import evaluation_tests
+from evaluation_tests import simulate_single_flow
+from traces import SERIES_FIELDS, PACKET_FIELDS, save_traces, load_traces
+
+"""
+Unittests for trace files export and loading.
+"""
+
+class TestTraces(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def simulate(self, history=None):
+        receiver = NadaReceiver(True, history_=history)
+        simulate_single_flow(NadaSender(True), receiver, [2000.0, 4000.0], [1500.0, 500.0], 1,
+                             seed=random.randint(0, 10**6))
+        return receiver
+
+    def test_save_and_load(self):
+        for history in [None, RecentHistory(1.0)]:
+            receiver = self.simulate(history)
+            path = os.path.join(self.directory, 'traces')
+            save_traces(path, receiver, [2000.0, 4000.0], [1500.0, 500.0], {'jitter': 1, 'seed': numpy.int64(7)})
+            # Saved as is, without extension.
+            self.assertTrue(os.path.isfile(path))
+            with load_traces(path) as traces:
+                self.assertEqual(traces.metadata, {'jitter': 1, 'seed': '7'})
+                for field in SERIES_FIELDS:
+                    self.assertEqual(getattr(traces, field).tolist(), list(getattr(receiver, field)))
+                self.assertEqual(traces.capacity_times_ms.tolist(), [2000.0, 4000.0])
+                self.assertEqual(traces.capacities_kbps.tolist(), [1500.0, 500.0])
+                self.assertEqual(traces.packet_ids.tolist(), [packet.id for packet in receiver.packets])
+                self.assertEqual(traces.arrival_times_ms.tolist(), list(receiver.time_ms))
+                self.assertEqual(sorted(traces.fields),
+                                 sorted(SERIES_FIELDS + PACKET_FIELDS + ['capacity_times_ms', 'capacities_kbps']))
+                with self.assertRaises(AttributeError):
+                    traces.unknown_field
+
+    def test_headless_evaluation_test(self):
+        path = os.path.join(self.directory, 'constant_capacity.npz')
+        seed = random.randint(0, 10**6)
+        receiver = NadaReceiver(False)
+        evaluation_tests.test_constant_capacity(NadaSender(False), receiver, 2.0, 1000.0, 2, seed=seed,
+                                                trace_path=path, plot=False)
+        with load_traces(path) as traces:
+            self.assertEqual(traces.metadata['test'], 'constant_capacity')
+            self.assertEqual(traces.metadata['seed'], seed)
+            self.assertEqual(traces.metadata['original_mode'], False)
+            self.assertEqual(traces.metadata['use_median_filter'], False)
+            self.assertEqual(traces.receiving_rates_kbps.tolist(), list(receiver.receiving_rates_kbps))
+
+
+if __name__ == '__main__':
+    unittest.main()
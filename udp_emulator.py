@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import socket
+import struct
+from collections import deque
+
+from packet import Packet
+from packet_source import PacketSource
+from controller import Sender
+from nada import NadaSender, NadaReceiver, NadaFeedback
+from link_simulator import LinkSimulator
+from bwe_utils import QuantileSketch, SummaryAccumulator
+from history import NoHistory
+
+"""
+Live emulation of the simulated link, on localhost: a LinkRelay receives UDP datagrams, runs
+each one through a LinkSimulator, in wall clock time, and forwards it to its destination once
+the link delivers it: after the path delay, the bottleneck queue and the jitter. Datagrams the
+queue drops are not forwarded. Any UDP media sender can be pointed at a relay, e.g. a RTP stack.
+NadaSender and NadaReceiver run as endpoints: the sender's packets are paced on their send times,
+and carry their id and send time, the receiver sends feedback back to the sender over a socket.
+Times are in ms since a shared epoch, on the event loop's monotonic clock: the relay's link
+starts at time 0, as in a simulation, so that capacity traces apply as is.
+Releases, of forwarded datagrams and of paced packets, are scheduled by a ReleaseScheduler.
+asyncio timers are only accurate to about 1 ms, hence the scheduler wakes up SPIN_MS early, then
+polls the event loop, still serving sockets, until the release time. Release lateness, the
+scheduling error, is measured on each release and reported. Packets the emulator itself loses, when
+overloaded, are reported apart from the link's drops.
+The following parameters can be specified on the command line:
+--duration, --capacity, --jitter, --seed, --max_bitrate, --constant_bitrate, --modified_sender,
+--modified_filter, --listen, --forward
+e.g. python udp_emulator.py -d 20 -c 20000 -mb 30000 runs NADA at up to 30 Mbps through the relay.
+e.g. python udp_emulator.py -c 400000 -cb 200000 loads the relay with 20000 packets/s, about the most a single
+     core serves with a sub-ms median lateness.
+e.g. python udp_emulator.py -c 2000 -l 5000 -f 127.0.0.1:5004 relays a media sender sending to port 5000.
+"""
+
+SPIN_MS = 1.0
+DRAIN_S = 0.01
+SOCKET_BUFFER_BYTES = 1 << 22
+# Media packets start with their id and send time, feedback is the NadaFeedback fields.
+PACKET_HEADER = struct.Struct('!qd')
+FEEDBACK_FORMAT = struct.Struct('!9d')
+
+def encode_packet(packet):
+    """
+    Datagram of a packet: its header, padded to its payload size.
+    """
+    header = PACKET_HEADER.pack(packet.id, packet.send_time_ms)
+    return header + bytes(max(0, int(packet.payload_size_bytes) - len(header)))
+
+def decode_packet(data):
+    id_, send_time_ms = PACKET_HEADER.unpack_from(data)
+    return Packet(id_, send_time_ms, float(len(data)))
+
+def encode_feedback(feedback):
+    return FEEDBACK_FORMAT.pack(*[getattr(feedback, field) for field in NadaFeedback.__slots__])
+
+def decode_feedback(data):
+    return NadaFeedback(*FEEDBACK_FORMAT.unpack(data))
+
+class SchedulingStats(object):
+
+    # Lateness of releases, in ms, from their scheduled time.
+    def __init__(self):
+        self.count = 0
+        self.max_ms = 0.0
+        self.lateness_sketch = QuantileSketch()
+        self.__sum_ms = 0.0
+
+    def add(self, lateness_ms):
+        self.count += 1
+        self.__sum_ms += lateness_ms
+        if lateness_ms > self.max_ms:
+            self.max_ms = lateness_ms
+        self.lateness_sketch.add(lateness_ms)
+
+    def mean_ms(self):
+        return self.__sum_ms / self.count if self.count > 0 else 0.0
+
+    def quantile_ms(self, q):
+        return self.lateness_sketch.quantile(q)
+
+    def print_stats(self, name):
+        print("%-24s= %d releases, lateness mean %.3f ms, p50 %.3f ms, p99 %.3f ms, max %.3f ms"
+              % (name, self.count, self.mean_ms(), self.quantile_ms(0.5), self.quantile_ms(0.99), self.max_ms))
+
+class ReleaseScheduler(object):
+    """
+    Calls release(item) at each item's release time, in ms since epoch_s, on the event loop's clock.
+    Release times must not decrease, as the arrival times of a link and the send times of a
+    sender: items are kept in a FIFO queue, and a single timer is pending, for the first one.
+    """
+
+    def __init__(self, loop_, epoch_s_, release_):
+        self.loop = loop_
+        self.epoch_s = epoch_s_
+        self.release = release_
+        self.stats = SchedulingStats()
+        self.__items = deque()
+        self.__handle = None
+
+    def now_ms(self):
+        return (self.loop.time() - self.epoch_s) * 1000.0
+
+    def schedule(self, release_time_ms, item):
+        self.__items.append((release_time_ms, item))
+        if self.__handle is None:
+            self.__wake(release_time_ms)
+
+    def cancel(self):
+        if self.__handle is not None:
+            self.__handle.cancel()
+            self.__handle = None
+        self.__items.clear()
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __wake(self, release_time_ms):
+        wake_time_ms = release_time_ms - SPIN_MS
+        if wake_time_ms <= self.now_ms():
+            self.__handle = self.loop.call_soon(self.__release)
+        else:
+            self.__handle = self.loop.call_at(self.epoch_s + wake_time_ms / 1000.0, self.__release)
+
+    def __release(self):
+        self.__handle = None
+        items = self.__items
+        while items:
+            now_ms = self.now_ms()
+            if items[0][0] > now_ms:
+                break
+            release_time_ms, item = items.popleft()
+            self.stats.add(now_ms - release_time_ms)
+            self.release(item)
+        if items and self.__handle is None:
+            self.__wake(items[0][0])
+
+class DatagramEndpoint(object):
+    """
+    Non blocking localhost UDP socket, read by the event loop: once it is readable, pending datagrams
+    are drained, up to MAX_READS, where asyncio's datagram transports read one per loop iteration.
+    Subclasses implement datagram_received(data, address), and may implement opened().
+    Datagrams which don't fit in the socket's send buffer are counted, and dropped, as UDP would.
+    """
+
+    MAX_READS = 256
+    MAX_DATAGRAM_BYTES = 65536
+
+    def open(self, loop, port=0):
+        self.loop = loop
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Bursts of datagrams wait in the kernel while the loop is busy.
+        for option in [socket.SO_RCVBUF, socket.SO_SNDBUF]:
+            try:
+                self.socket.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER_BYTES)
+            except OSError:
+                pass
+        self.socket.setblocking(False)
+        self.socket.bind(('127.0.0.1', port))
+        self.address = self.socket.getsockname()
+        self.num_send_errors = 0
+        loop.add_reader(self.socket.fileno(), self.__read)
+        self.opened()
+        return self.address
+
+    def opened(self):
+        pass
+
+    def sendto(self, data, address):
+        try:
+            self.socket.sendto(data, address)
+        except (BlockingIOError, InterruptedError):
+            self.num_send_errors += 1
+
+    def close(self):
+        self.loop.remove_reader(self.socket.fileno())
+        self.socket.close()
+
+    def __read(self):
+        recvfrom = self.socket.recvfrom
+        for i in range(DatagramEndpoint.MAX_READS):
+            try:
+                data, address = recvfrom(DatagramEndpoint.MAX_DATAGRAM_BYTES)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.datagram_received(data, address)
+
+class LinkRelay(DatagramEndpoint):
+    """
+    Forwards the datagrams it receives to destination_, through link_simulator_, sized as the
+    datagrams. Times of the link are in ms since epoch_s_, the loop time at which the relay opens by default.
+    """
+
+    def __init__(self, link_simulator_, destination_, epoch_s_=None):
+        self.link_simulator = link_simulator_
+        self.destination = destination_
+        self.epoch_s = epoch_s_
+        self.scheduler = None
+        self.num_received = 0
+        self.num_dropped = 0
+        self.num_forwarded = 0
+        self.num_cancelled = 0  # Not forwarded yet when the relay closes.
+
+    def opened(self):
+        if self.epoch_s is None:
+            self.epoch_s = self.loop.time()
+        self.scheduler = ReleaseScheduler(self.loop, self.epoch_s, self.__forward)
+
+    def datagram_received(self, data, address):
+        self.num_received += 1
+        packet = Packet(self.num_received, self.scheduler.now_ms(), float(len(data)))
+        self.link_simulator.send_packet(packet)
+        if packet.arrival_time_ms is None:  # Dropped by the bottleneck queue.
+            self.num_dropped += 1
+            return
+        self.scheduler.schedule(packet.arrival_time_ms, data)
+
+    def close(self):
+        self.num_cancelled += len(self.scheduler)
+        self.scheduler.cancel()
+        DatagramEndpoint.close(self)
+
+    def __forward(self, data):
+        self.sendto(data, self.destination)
+        self.num_forwarded += 1
+
+class ConstantBitrateSender(Sender):
+    """
+    Sender of packets on a constant bitrate, ignoring feedback, e.g. to load a relay.
+    """
+
+    def __init__(self, bitrate_kbps_, payload_size_bytes_=NadaSender.PAYLOAD_SIZE_BYTES):
+        self.bitrate_kbps = bitrate_kbps_
+        self.packet_source = PacketSource(payload_size_bytes_)
+
+    def create_packet(self):
+        return self.packet_source.create_packet(self.bitrate_kbps)
+
+    def receive_feedback(self, feedback):
+        pass
+
+class SenderEndpoint(DatagramEndpoint):
+    """
+    Sends the packets of sender_, e.g. a NadaSender, to destination_, each one at its send time,
+    in ms since epoch_s_, stamped with the actual send time. Feedback datagrams it receives are given
+    to the sender.
+    """
+
+    def __init__(self, sender_, destination_, epoch_s_):
+        self.sender = sender_
+        self.destination = destination_
+        self.epoch_s = epoch_s_
+        self.scheduler = None
+        self.num_sent = 0
+        self.num_feedbacks = 0
+
+    def opened(self):
+        self.scheduler = ReleaseScheduler(self.loop, self.epoch_s, self.__send)
+        packet = self.sender.create_packet()
+        self.scheduler.schedule(packet.send_time_ms, packet)
+
+    def datagram_received(self, data, address):
+        self.sender.receive_feedback(decode_feedback(data))
+        self.num_feedbacks += 1
+
+    def close(self):
+        self.scheduler.cancel()
+        DatagramEndpoint.close(self)
+
+    # The next packet is created once this one is sent, at the sender's current bitrate.
+    def __send(self, packet):
+        packet.send_time_ms = self.scheduler.now_ms()
+        self.sendto(encode_packet(packet), self.destination)
+        self.num_sent += 1
+        next_packet = self.sender.create_packet()
+        self.scheduler.schedule(next_packet.send_time_ms, next_packet)
+
+class ReceiverEndpoint(DatagramEndpoint):
+    """
+    Gives the packets it receives to receiver_, e.g. a NadaReceiver, at their arrival time, in ms
+    since epoch_s_, and sends its feedback to feedback_destination.
+    """
+
+    def __init__(self, receiver_, epoch_s_, feedback_destination_=None):
+        self.receiver = receiver_
+        self.epoch_s = epoch_s_
+        self.feedback_destination = feedback_destination_
+        self.num_received = 0
+
+    def datagram_received(self, data, address):
+        packet = decode_packet(data)
+        packet.arrival_time_ms = (self.loop.time() - self.epoch_s) * 1000.0
+        self.num_received += 1
+        self.receiver.receive_packet(packet)
+        feedback = self.receiver.get_feedback()
+        if feedback is not None and self.feedback_destination is not None:
+            self.sendto(encode_feedback(feedback), self.feedback_destination)
+
+async def emulate_single_flow(sender, receiver, link_simulator, duration_s):
+    """
+    Runs sender and receiver endpoints, e.g. NADA's, through a LinkRelay on localhost for duration_s.
+    Returns the sender endpoint, the relay and the receiver endpoint, once their sockets are closed.
+    """
+    if link_simulator.JITTER_SIGMA_MS > 0.0:
+        import numpy  # Loaded by the link's first jitter samples, before the clock starts.
+    loop = asyncio.get_event_loop()
+    epoch_s = loop.time()
+    receiver_endpoint = ReceiverEndpoint(receiver, epoch_s)
+    relay = LinkRelay(link_simulator, receiver_endpoint.open(loop), epoch_s)
+    sender_endpoint = SenderEndpoint(sender, relay.open(loop), epoch_s)
+    receiver_endpoint.feedback_destination = sender_endpoint.open(loop)
+    endpoints = [sender_endpoint, relay, receiver_endpoint]
+    try:
+        await asyncio.sleep(duration_s)
+        # Endpoints close in turn, once the datagrams in flight to the next one are read.
+        while len(endpoints) > 1:
+            endpoints.pop(0).close()
+            await asyncio.sleep(DRAIN_S)
+    finally:
+        for endpoint in endpoints:
+            endpoint.close()
+    return sender_endpoint, relay, receiver_endpoint
+
+async def relay_forever(link_simulator, port, destination):
+    relay = LinkRelay(link_simulator, destination)
+    address = relay.open(asyncio.get_event_loop(), port)
+    print("Relaying %s:%d to %s:%d" % (address + destination))
+    try:
+        while True:
+            await asyncio.sleep(10.0)
+            relay.scheduler.stats.print_stats("relay")
+            print("%-24s= %d received, %d dropped" % ("relay", relay.num_received, relay.num_dropped))
+    finally:
+        relay.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="Emulated duration, in s")
+    parser.add_argument("-c", "--capacity", type=float, default=1000.0, help="Link capacity, in kbps")
+    parser.add_argument("-j", "--jitter", type=int, choices=[0, 1, 2], default=1, help="Jitter Intensity")
+    parser.add_argument("-s", "--seed", type=int, help="Seed for the link's jitter")
+    parser.add_argument("-mb", "--max_bitrate", type=float, help="NADA sender's max bitrate, in kbps")
+    parser.add_argument("-cb", "--constant_bitrate", type=float,
+                        help="Bitrate, in kbps, of a constant bitrate sender instead of NADA's, e.g. to load the relay")
+    parser.add_argument("-ms", "--modified_sender", action="store_true", help="Modified NADA sender mode")
+    parser.add_argument("-mf", "--modified_filter", action="store_true", help="Min filter on NADA receiver")
+    parser.add_argument("-l", "--listen", type=int, help="Port to relay, instead of running NADA endpoints")
+    parser.add_argument("-f", "--forward", help="host:port the relayed datagrams are forwarded to")
+    args = parser.parse_args()
+    if (args.listen is None) != (args.forward is None):
+        parser.error("A relay needs both a port to listen to and an address to forward to.")
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    link_simulator = LinkSimulator(args.capacity, args.jitter, args.seed)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    if args.listen is not None:
+        host, port = args.forward.rsplit(':', 1)
+        try:
+            loop.run_until_complete(relay_forever(link_simulator, args.listen, (host, int(port))))
+        except KeyboardInterrupt:
+            pass
+    else:
+        if args.constant_bitrate is not None:
+            sender = ConstantBitrateSender(args.constant_bitrate)
+        else:
+            sender = NadaSender(not args.modified_sender, args.max_bitrate)
+        receiver = NadaReceiver(not args.modified_filter, history_=NoHistory(), summary_=SummaryAccumulator())
+        sender_endpoint, relay, receiver_endpoint = loop.run_until_complete(
+            emulate_single_flow(sender, receiver, link_simulator, args.duration))
+        # Packets the link drops are its loss. Packets missing at the relay or at the receiver were lost by the
+        # emulator, overloaded: socket buffers overflowed, or its sends failed.
+        num_lost = sender_endpoint.num_sent - relay.num_received + relay.num_forwarded - receiver_endpoint.num_received
+        print("Packets sent            =", sender_endpoint.num_sent)
+        print("Packets relayed         =", relay.num_received)
+        print("Packets dropped by link =", relay.num_dropped)
+        print("Packets forwarded       =", relay.num_forwarded)
+        print("Packets received        =", receiver_endpoint.num_received)
+        print("Packets lost, emulator  =", num_lost)
+        print("Send errors             = %d sender, %d relay, %d receiver"
+              % (sender_endpoint.num_send_errors, relay.num_send_errors, receiver_endpoint.num_send_errors))
+        print("Feedbacks received      =", sender_endpoint.num_feedbacks)
+        print("Packet rate (packets/s) =", receiver_endpoint.num_received / args.duration)
+        print("Average bitrate (kbps)  =", receiver.summary.average_bitrate_kbps())
+        print("Average delay (ms)      =", receiver.summary.average_delay_ms())
+        print("Link packet loss        =", relay.num_dropped / float(max(1, relay.num_received)))
+        print("Emulator packet loss    =", num_lost / float(max(1, sender_endpoint.num_sent - relay.num_cancelled)))
+        print("Global packet loss      =", receiver.summary.global_loss_ratio())
+        sender_endpoint.scheduler.stats.print_stats("sender pacing")
+        relay.scheduler.stats.print_stats("relay")
+    loop.close()
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+
+from packet import Packet
+from nada import NadaSender, NadaReceiver, NadaFeedback
+from link_simulator import LinkSimulator
+from history import NoHistory
+from bwe_utils import SummaryAccumulator
+from udp_emulator import encode_packet, decode_packet, encode_feedback, decode_feedback
+from udp_emulator import ReleaseScheduler, ConstantBitrateSender, emulate_single_flow
+
+"""
+Unittests for the loopback UDP emulator. Runs are short, their timing bounds are loose, as
+the event loop shares the CPU with other processes.
+"""
+
+class TestUdpEmulator(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def emulate(self, sender, receiver, link_simulator, duration_s):
+        return self.loop.run_until_complete(emulate_single_flow(sender, receiver, link_simulator, duration_s))
+
+    def test_codecs(self):
+        packet = decode_packet(encode_packet(Packet(12345, 678.25, 1000.0)))
+        self.assertEqual((packet.id, packet.send_time_ms, packet.payload_size_bytes), (12345, 678.25, 1000.0))
+        feedback = NadaFeedback(*[0.5 * i for i in range(len(NadaFeedback.__slots__))])
+        decoded = decode_feedback(encode_feedback(feedback))
+        for field in NadaFeedback.__slots__:
+            self.assertEqual(getattr(decoded, field), getattr(feedback, field))
+
+    def test_release_scheduler(self):
+        released = []
+        epoch_s = self.loop.time()
+        scheduler = ReleaseScheduler(self.loop, epoch_s, released.append)
+        release_times_ms = [5.0 * i for i in range(1, 21)]
+        for i, release_time_ms in enumerate(release_times_ms):
+            scheduler.schedule(release_time_ms, i)
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        self.assertEqual(released, list(range(20)))
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(scheduler.stats.count, 20)
+        self.assertGreaterEqual(scheduler.stats.quantile_ms(0.0), 0.0)
+        self.assertLess(scheduler.stats.mean_ms(), 20.0)
+        scheduler.schedule(1000.0, 'cancelled')
+        scheduler.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(len(released), 20)
+
+    def test_relay(self):
+        # 2000 packets/s, through a link with no jitter. Half of them overflow the queue.
+        receiver = NadaReceiver(True, history_=NoHistory(), summary_=SummaryAccumulator())
+        link_simulator = LinkSimulator(8000.0, 0)
+        sender_endpoint, relay, receiver_endpoint = self.emulate(ConstantBitrateSender(16000.0), receiver,
+                                                                 link_simulator, 1.0)
+        self.assertGreater(sender_endpoint.num_sent, 1500)
+        self.assertGreater(relay.num_dropped, 0)
+        self.assertGreater(receiver_endpoint.num_received, 0)
+        self.assertEqual(relay.num_forwarded + relay.num_cancelled, relay.num_received - relay.num_dropped)
+        # Datagrams in flight are read before the next endpoint closes, light loads lose none.
+        self.assertEqual(relay.num_received, sender_endpoint.num_sent)
+        self.assertEqual(receiver_endpoint.num_received, relay.num_forwarded)
+        self.assertEqual(sender_endpoint.num_send_errors + relay.num_send_errors, 0)
+        # Delays are those of the link, plus the scheduling error.
+        self.assertGreaterEqual(receiver.summary.delay_quantile_ms(0.0), link_simulator.ONE_WAY_PATH_DELAY_MS)
+        self.assertGreater(receiver.summary.average_delay_ms(), 100.0)
+        self.assertLess(receiver.summary.average_bitrate_kbps(), 9000.0)
+        self.assertEqual(relay.scheduler.stats.count, relay.num_forwarded)
+        self.assertLess(relay.scheduler.stats.quantile_ms(0.5), 10.0)
+
+    def test_nada(self):
+        receiver = NadaReceiver(True, history_=NoHistory(), summary_=SummaryAccumulator())
+        sender = NadaSender(True)
+        link_simulator = LinkSimulator(1000.0, 1, 0)
+        sender_endpoint, relay, receiver_endpoint = self.emulate(sender, receiver, link_simulator, 1.5)
+        self.assertGreater(receiver_endpoint.num_received, 0)
+        self.assertGreater(sender_endpoint.num_feedbacks, 5)
+        self.assertNotEqual(sender.bitrate_kbps, 300.0)  # The initial bitrate.
+        self.assertGreaterEqual(receiver.summary.delay_quantile_ms(0.0), link_simulator.ONE_WAY_PATH_DELAY_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()